@@ -21,6 +21,7 @@ os.chdir(base_dname)  # change to code directory
 from simple_dispatch import generatorData
 from simple_dispatch import bidStack
 from simple_dispatch import dispatch
+from simple_dispatch import periodCalendar
 
 if __name__ == '__main__':
     
@@ -43,6 +44,11 @@ if __name__ == '__main__':
     
     ## specify run year
     run_year = 2008 
+    period_resolution = 'week' # time periods of the generator data and merit orders: 'week', 'day', or 'month'
+    ## streaming output (optional)
+    stream_dir = None # e.g. './Stream'. If not None, each time period of the dispatch results is written to a parquet dataset in this folder (relative to the output folder) 
+                      # as soon as it is final, instead of holding the whole year of results in memory (see dispatch.calcDispatchAll)
+    stream_to_csv = True # when streaming, also append each time period to the usual dispatch results csv file
     ## define states to subset
     states_to_subset_all = [['GA'], # SERC
                             ['GA', 'AL', 'TN'], # SERC
@@ -101,11 +107,12 @@ if __name__ == '__main__':
                                fuel_commodity_prices_excel_dir=fuel_commodity_prices_xlsx, 
                                hist_downtime=False, # should always be true if trying to exactly match historical data
                                coal_min_downtime = 12, 
-                               cems_validation_run=True) # makes sure only CEMS boilers are included in eGRID. We only need CEMS plants
+                               cems_validation_run=True, # makes sure only CEMS boilers are included in eGRID. We only need CEMS plants
+                               period_resolution=period_resolution)
             
             # pickle the trimmed version of the generator data object
             gd_short = {'year': gd.year, 'nerc': gd.nerc, 'hist_dispatch': gd.hist_dispatch, 'demand_data': gd.demand_data, 
-                        'mdt_coal_events': gd.mdt_coal_events, 'df': gd.df}
+                        'mdt_coal_events': gd.mdt_coal_events, 'df': gd.df, 'period_resolution': gd.calendar.resolution}
             # change path to simple dispatch output data folder
             os.chdir(base_dname)
             os.chdir(output_rel_path+'/Generator Data') # where to access output data relative to code folder
@@ -119,22 +126,27 @@ if __name__ == '__main__':
         states_to_subset = states_to_subset_all[i]
         ## create bidStack object and save merit order figures
         #run the bidStack object - use information about the generators (from gd_short) to create a merit order (bid stack) of the nerc region's generators
-        week = 30 # week that bid stack is calculated
-        bs = bidStack(gd_short, time=week, dropNucHydroGeo=True, include_min_output=True, 
+        calendar = periodCalendar(run_year, gd_short.get('period_resolution', periodCalendar.inferResolution(gd_short['df'].columns))) # time periods of the generator data
+        period = calendar.periodOf([run_year*10000 + 723])[0] # time period that bid stack is calculated (the one of July 23, e.g. week 30 or month 7)
+        bs = bidStack(gd_short, time=period, dropNucHydroGeo=True, include_min_output=True, 
                       states_to_subset=states_to_subset, mdt_weight=0.5) 
         
         ## run and save the dispatch object - use the nerc region's merit order (bs), a demand timeseries (gd.demand_data), 
-        #  and a time array (default is array([ 1,  2, ... , 51, 52]) for 52 weeks to run a whole year)
+        #  and a time array (bs.calendar.periods, e.g. array([ 1,  2, ... , 51, 52]) for 52 weeks, to run a whole year)
         dp = dispatch(bs, gd_short["demand_data"], states_to_subset = states_to_subset, 
-                      time_array=np.arange(52)+1) #set up the dispatch object         
-        dp.calcDispatchAll() #function that solves the dispatch for each time period in time_array (default for each week of the year)
-        
-        #save dispatch results 
+                      time_array=bs.calendar.periods) #set up the dispatch object         
         # change path to simple dispatch output data folder
         os.chdir(base_dname)
         os.chdir(output_rel_path)
         fn = 'simple_dispatch_'+nerc_region+'_'+'_'.join(nerc_to_state_names[i])+'_'+str(run_year)+'.csv' # unique file name for particular NERC region
-        dp.df.to_csv(fn, index=False) # save larger dispatch results
-        # save subset results
-        if states_to_subset != []:
-            dp.df_subset.to_csv('simple_dispatch_'+nerc_region+'_' + '_'.join(states_to_subset)+'_'+str(run_year)+'.csv', index=False)
\ No newline at end of file
+        fn_subset = 'simple_dispatch_'+nerc_region+'_' + '_'.join(states_to_subset)+'_'+str(run_year)+'.csv' # subset results
+        if stream_dir is None:
+            dp.calcDispatchAll() #function that solves the dispatch for each time period in time_array (default for each week of the year)
+            #save dispatch results 
+            dp.df.to_csv(fn, index=False) # save larger dispatch results
+            # save subset results
+            if states_to_subset != []:
+                dp.df_subset.to_csv(fn_subset, index=False)
+        else:
+            # stream the dispatch results (and the subset results) of each time period to stream_dir/dispatch (and stream_dir/subset), and optionally append them to the same csv files
+            dp.calcDispatchAll(stream_dir=stream_dir, stream_region=nerc_region, stream_csv={'dispatch': fn, 'subset': fn_subset} if stream_to_csv else None)
\ No newline at end of file
@@ -37,66 +37,49 @@ CPI['DATE'] = pandas.to_datetime(CPI['DATE']) # cast date column into datetime
 CPI['year'] = CPI['DATE'].dt.year
 CPI['month'] = CPI['DATE'].dt.month 
 
-# function adjusts nominal dollars of a certain month and year to real 2006/1 dolalrs
-def adjust_to_2006_1_real_dollars(nominal_dollars, year, month):
-    CPI_2006 = CPI.loc[((CPI['year'] == 2006) & (CPI['month'] == 1)), 'CPIAUCSL'].values[0]
-    CPI_current = CPI.loc[((CPI['year'] == year) & (CPI['month'] == month)), 'CPIAUCSL'].values[0]
-    real_dollars = nominal_dollars * CPI_current/CPI_2006
-    return real_dollars
+## build the (year, month) deflator lookup once for the whole run; rows are years and columns are months 1 to 12
+CPI_2006 = CPI.loc[((CPI['year'] == 2006) & (CPI['month'] == 1)), 'CPIAUCSL'].values[0]
+CPI_deflator = CPI.pivot(index='year', columns='month', values='CPIAUCSL') / CPI_2006
 
-def mask_outliers(data):
-    """
-    Returns a boolean mask indicating which elements of the input array
-    are outliers according to the modified Z-score method only applied to the upper bound.
-    Note: the minimum value for the upper threshold is 30 $/MWh
-    
-    Parameters
-    ----------
-    data : numpy.ndarray or pandas.Series
-        The input array of data to test for outliers.
-    threshold : float, optional
-        The number of scaled MADs above the median at which to define an
-        outlier. Default is 3.
-    
-    Returns
-    -------
-    mask : numpy.ndarray or pandas.Series
-        A boolean mask indicating which elements of the input array are
-        outliers.
-    upper_threshold : float
-        The upper threshold used to define outliers.
-    """
-    
-    # Calculate median and MAD
-    median = numpy.nanmedian(data)
-    mad = numpy.nanmedian(numpy.abs(data - median))
-
-    # Calculate the threshold for outliers (3 scaled MAD)
-    threshold = 3 * 1.4826 * mad
-
-    # Mask the non-outlier elements
-    # lower_threshold = median - threshold
-    upper_threshold = max(30, median + threshold)
-    mask = (data < 0) | (data > upper_threshold)
+# function adjusts a block of monthly (columns 1 to 12) nominal dollars of a certain year to real 2006/1 dollars
+def adjust_to_2006_1_real_dollars(nominal_dollars, year):
+    return nominal_dollars * CPI_deflator.loc[year, list(range(1, 13))].values # broadcasts each month's CPI ratio down its column
 
-    return mask
-
-def outlier_threshold(data):
+def outlier_metrics(prices):
     """
-    Returns upper threshold for data
-    Note: the minimum value for the upper threshold is 10 $/MWh
+    Calculates the monthly and total fuel price metrics of a (units x 12 months) price matrix before and after removing outliers.
+    Outliers are found column by column with the modified Z-score method only applied to the upper bound 
+    (3 scaled MADs above the median), and prices that are negative are also removed
+    Note: the minimum value for the upper threshold is 30 $/MWh
+    ---
+    prices : numpy array of monthly real fuel prices, one row per unit
+    returns : dictionary keyed by metric name (same names as the fuel_price_metrics columns); monthly metrics are 12-element arrays 
+              without the month suffix and total metrics are floats
     """
-
-    # Calculate median and MAD
-    median = numpy.nanmedian(data)
-    mad = numpy.nanmedian(numpy.abs(data - median))
-
-    # Calculate the threshold for outliers (3 scaled MAD)
-    threshold = 3 * 1.4826 * mad
-    
-    # calculate the upper threshold
-    upper_threshold = max(30, median + threshold)
-    return upper_threshold
+    n_units = prices.shape[0]
+    with warnings.catch_warnings():
+        warnings.filterwarnings(action='ignore', category=RuntimeWarning) # all-nan months and empty blocks return nan
+        ## metrics for all units
+        metrics = {'average': numpy.nanmean(prices, axis=0),
+                   'standard_deviation': numpy.nanstd(prices, axis=0, ddof=1),
+                   'min': numpy.nanmin(prices, axis=0) if n_units else numpy.full(12, numpy.nan),
+                   'max': numpy.nanmax(prices, axis=0) if n_units else numpy.full(12, numpy.nan),
+                   'total_average': numpy.nanmean(prices),
+                   'total_standard_deviation': numpy.nanstd(prices, ddof=1)}
+        ## metrics while removing outliers
+        median = numpy.nanmedian(prices, axis=0) # median of each month
+        mad = numpy.nanmedian(numpy.abs(prices - median), axis=0) # MAD of each month
+        upper_threshold = numpy.fmax(30, median + 3 * 1.4826 * mad) # 3 scaled MAD, but at least 30 (also if median is nan)
+        outlier_mask = (prices < 0) | (prices > upper_threshold)
+        prices_no_outliers = numpy.where(outlier_mask, numpy.nan, prices) # change outlier values to nan
+        metrics['upper_threshold_outliers'] = upper_threshold
+        metrics['excluded_units'] = outlier_mask.sum(axis=0)
+        metrics['excluded_units_fraction'] = metrics['excluded_units']/n_units if n_units else numpy.full(12, numpy.nan)
+        metrics['average_no_outliers'] = numpy.nanmean(prices_no_outliers, axis=0)
+        metrics['standard_deviation_no_outliers'] = numpy.nanstd(prices_no_outliers, axis=0, ddof=1)
+        metrics['total_average_no_outliers'] = numpy.nanmean(prices_no_outliers)
+        metrics['total_standard_deviation_no_outliers'] = numpy.nanstd(prices_no_outliers, ddof=1)
+    return metrics
 
 # run for all years and NERC regions
 for year in years:
@@ -275,134 +258,45 @@ for year in years:
         ### calculate fuel averages
         ## adjust for inflation
         temp_orispl_prices = orispl_prices.copy(deep=True)
-        temp_orispl_prices[[i for i in range(1, 13)]] = orispl_prices[range(1, 13)].apply(
-            lambda x: adjust_to_2006_1_real_dollars(x, year, x.name)) # adjusts based on year and month
+        temp_orispl_prices[[i for i in range(1, 13)]] = adjust_to_2006_1_real_dollars(orispl_prices[list(range(1, 13))], year) # adjusts based on year and month
         
-        ## create a dataframe to hold fuel_price_metrics: number of units, average, min, max, standard deviation
+        ## columns of fuel_price_metrics: number of units, average, min, max, standard deviation
         unique_fuel_types = list(orispl_prices.fuel.unique()) # all types of unique fuels during this period
-        fuel_price_metrics = pandas.DataFrame({'fuel': unique_fuel_types})
         
         # Repeat the 'average', 'standard deviation', 'min', and 'max' columns with suffixes from 1 to 12
         suffixes = [str(i) for i in range(1, 13)]
         cols_to_repeat = ['average', 'standard_deviation', 'min', 'max', 'upper_threshold_outliers', 
                           'excluded_units', 'excluded_units_fraction', 'average_no_outliers', 'standard_deviation_no_outliers']
+        total_cols = ['total_average', 'total_standard_deviation', 'total_average_no_outliers', 'total_standard_deviation_no_outliers']
         new_cols = [f"{col}{suffix}" for col in cols_to_repeat for suffix in suffixes]
-        new_cols = ['purchase_type', 'number_of_units', 'total_average', 'total_standard_deviation', 
-                    'total_average_no_outliers', 'total_standard_deviation_no_outliers'] + new_cols # also append 'number of units' to the list
-        fuel_price_metrics = pandas.concat([fuel_price_metrics, pandas.DataFrame(columns=new_cols)]) # append new empty columns
+        new_cols = ['purchase_type', 'number_of_units'] + total_cols + new_cols # also append 'number of units' to the list
         
-        # add purchase type to natural gas
-        fuel_price_metrics.drop(fuel_price_metrics[fuel_price_metrics['fuel'] == 'ng'].index, inplace=True) # remove natrual gas from dataframe
+        ## blocks of units to calculate metrics for: every fuel except natural gas, then natural gas by purchase type
         purchase_types = ['T', 'S', 'C', 'other', 'all'] # types of ng contracts
-        rows_to_add = pandas.DataFrame({'fuel': ['ng', 'ng', 'ng', 'ng', 'ng'], # make new rows
-                                        'purchase_type': purchase_types})
-        fuel_price_metrics = pandas.concat([fuel_price_metrics, rows_to_add], axis=0) # append new rows
+        blocks = [(fuel_type, numpy.nan, temp_orispl_prices["fuel"] == fuel_type) for fuel_type in unique_fuel_types if fuel_type != 'ng']
+        for purchase_type in purchase_types:
+            # mask for units that have matching fuel type
+            mask = (temp_orispl_prices["fuel"] == 'ng') & (temp_orispl_prices["purchase_type"] == purchase_type)
+            if purchase_type == 'other': # if other, retrieve all ng that are not the three purchase types
+                mask = ((temp_orispl_prices["fuel"] == 'ng') & (temp_orispl_prices["purchase_type"] != 'T') 
+                        & (temp_orispl_prices["purchase_type"] != 'S')  & (temp_orispl_prices["purchase_type"] != 'C'))
+            if purchase_type == 'all': # if all, retrieve all ng
+                mask = temp_orispl_prices["fuel"] == 'ng'
+            blocks.append(('ng', purchase_type, mask))
         
-        ## iterate over all unique generator fuel types, adjusting the fuel prices if they exist in the avg_price_fuel_type dictionary
-        #  and populating the fuel_price_metrics dataframe
-        for fuel_type in unique_fuel_types:
-            if fuel_type == 'ng':
-                for purchase_type in purchase_types: # iterate over all contract types, same method as in last 'else' statement (that one is more readable)
-                    # mask for units that have matching fuel type
-                    mask = (temp_orispl_prices["fuel"] == fuel_type) & (temp_orispl_prices["purchase_type"] == purchase_type)
-                    if purchase_type == 'other': # if other, retrieve all ng that are not the three purchase types
-                        mask = ((temp_orispl_prices["fuel"] == fuel_type) & (temp_orispl_prices["purchase_type"] != 'T') 
-                                & (temp_orispl_prices["purchase_type"] != 'S')  & (temp_orispl_prices["purchase_type"] != 'C'))
-                    if purchase_type == 'all': # if all, retrieve all ng
-                        mask = temp_orispl_prices["fuel"] == fuel_type
-                    
-                    # mask for fuel price metrics index
-                    fuel_price_metrics_row = (fuel_price_metrics['fuel'] == fuel_type) & (fuel_price_metrics['purchase_type'] == purchase_type)
-                    
-                    ## calculate metrics (number of units, average, min, max, standard deviation) for all units
-                    fuel_price_metrics.loc[fuel_price_metrics_row, 'number_of_units'] = mask.sum() # number of units
-                    temp = temp_orispl_prices.loc[mask, range(1, 13)] # retrieve all price data to manipulate
-                    
-                    
-                    # average each month
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"average{suffix}" for suffix in suffixes]] = temp.mean(axis=0, skipna=True).values
-                    # total average
-                    fuel_price_metrics.loc[fuel_price_metrics_row, 'total_average'] = temp.stack().mean(axis=0, skipna=True)
-                    # min before
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"min{suffix}" for suffix in suffixes]] = temp.min(axis=0, skipna=True).values
-                    # max before
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"max{suffix}" for suffix in suffixes]] = temp.max(axis=0, skipna=True).values
-                    # standard deviation 
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"standard_deviation{suffix}" for suffix in suffixes]] = temp.std(axis=0, skipna=True).values 
-                    # total standard devation
-                    fuel_price_metrics.loc[fuel_price_metrics_row, 'total_standard_deviation'] = temp.stack().std(axis=0, skipna=True)
-                    
-                    ## calculate metrics while removing outliers   
-                    with warnings.catch_warnings():
-                        warnings.filterwarnings(action='ignore', category=RuntimeWarning)
-                        # calculate upper threshold for outliers
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"upper_threshold_outliers{suffix}" for suffix in suffixes]] = temp.apply(outlier_threshold,
-                                                                                                                                                  axis=0).values
-                        # mask for outliers
-                        mask = temp.apply(mask_outliers)
-                        temp = temp.where(~mask, numpy.nan) # change outlier values to nan
-                        # calculate number of units excluded from average
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"excluded_units{suffix}" for suffix in suffixes]] = mask.sum().values
-                        # calculate fraction of units excluded from average
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"excluded_units_fraction{suffix}" 
-                                                                        for suffix in suffixes]] = mask.sum().values/temp.shape[0] if temp.shape[0] else numpy.nan
-                        # average each month
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"average_no_outliers{suffix}" for suffix in suffixes]] = temp.mean(
-                            axis=0, skipna=True).values
-                        # total average
-                        fuel_price_metrics.loc[fuel_price_metrics_row, 'total_average_no_outliers'] = temp.stack().mean(axis=0, skipna=True)
-                        # standard deviation 
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"standard_deviation_no_outliers{suffix}" for suffix in suffixes]] = temp.std(
-                            axis=0, skipna=True).values
-                        # total standard devation
-                        fuel_price_metrics.loc[fuel_price_metrics_row, 'total_standard_deviation_no_outliers'] = temp.stack().std(axis=0, skipna=True)
-                    
-            else:
-                # mask for units that have matching fuel type
-                mask = temp_orispl_prices["fuel"] == fuel_type
-                # mask for fuel price metrics index
-                fuel_price_metrics_row = fuel_price_metrics['fuel'] == fuel_type
-                
-                ## calculate metrics (number of units, average, min, max, standard deviation)
-                fuel_price_metrics.loc[fuel_price_metrics_row, 'number_of_units'] = mask.sum() # number of units
-                temp = temp_orispl_prices.loc[mask, range(1, 13)] # retrieve all price data to manipulate
-                # average each month
-                fuel_price_metrics.loc[fuel_price_metrics_row, [f"average{suffix}" for suffix in suffixes]] = temp.mean(axis=0, skipna=True).values
-                # total average
-                fuel_price_metrics.loc[fuel_price_metrics_row, 'total_average'] = temp.stack().mean(axis=0, skipna=True)
-                # min before
-                fuel_price_metrics.loc[fuel_price_metrics_row, [f"min{suffix}" for suffix in suffixes]] = temp.min(axis=0, skipna=True).values
-                # max before
-                fuel_price_metrics.loc[fuel_price_metrics_row, [f"max{suffix}" for suffix in suffixes]] = temp.max(axis=0, skipna=True).values
-                # standard deviation 
-                fuel_price_metrics.loc[fuel_price_metrics_row, [f"standard_deviation{suffix}" for suffix in suffixes]] = temp.std(axis=0, skipna=True).values 
-                # total standard devation
-                fuel_price_metrics.loc[fuel_price_metrics_row, 'total_standard_deviation'] = temp.stack().std(axis=0, skipna=True)
-                
-                ## calculate metrics while removing outliers
-                with warnings.catch_warnings():
-                    warnings.filterwarnings(action='ignore', category=RuntimeWarning)
-                    # calculate upper threshold for outliers
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"upper_threshold_outliers{suffix}" for suffix in suffixes]] = temp.apply(outlier_threshold,
-                                                                                                                                              axis=0).values
-                    # mask for outliers
-                    mask = temp.apply(mask_outliers)
-                    temp = temp.where(~mask, numpy.nan) # change outlier values to nan
-                    # calculate number of units excluded from average
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"excluded_units{suffix}" for suffix in suffixes]] = mask.sum().values
-                    # calculate fraction of units excluded from average
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"excluded_units_fraction{suffix}" 
-                                                                    for suffix in suffixes]] = mask.sum().values/temp.shape[0] if temp.shape[0] else numpy.nan
-                    # average each month
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"average_no_outliers{suffix}" for suffix in suffixes]] = temp.mean(
-                        axis=0, skipna=True).values
-                    # total average
-                    fuel_price_metrics.loc[fuel_price_metrics_row, 'total_average_no_outliers'] = temp.stack().mean(axis=0, skipna=True)
-                    # standard deviation 
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"standard_deviation_no_outliers{suffix}" for suffix in suffixes]] = temp.std(
-                        axis=0, skipna=True).values
-                    # total standard devation
-                    fuel_price_metrics.loc[fuel_price_metrics_row, 'total_standard_deviation_no_outliers'] = temp.stack().std(axis=0, skipna=True)
+        ## calculate the metrics of every block, then assemble fuel_price_metrics in one go
+        rows = []
+        for fuel_type, purchase_type, mask in blocks:
+            row = {'fuel': fuel_type, 'purchase_type': purchase_type}
+            if fuel_type not in unique_fuel_types: # natural gas rows stay empty if there is no natural gas this period
+                rows.append(row)
+                continue
+            metrics = outlier_metrics(temp_orispl_prices.loc[mask, list(range(1, 13))].values.astype(float))
+            row['number_of_units'] = mask.sum() # number of units
+            row.update({col: metrics[col] for col in total_cols})
+            row.update({f"{col}{suffix}": metrics[col][i] for col in cols_to_repeat for i, suffix in enumerate(suffixes)})
+            rows.append(row)
+        fuel_price_metrics = pandas.DataFrame(rows, columns=['fuel'] + new_cols)
                 
         ## write fuel_price_metrics to file
         os.chdir(base_dname)  # change to code directory
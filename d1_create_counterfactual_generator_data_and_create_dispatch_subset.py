@@ -22,6 +22,7 @@ os.chdir(base_dname)  # change to code directory
 from simple_dispatch import generatorData
 from simple_dispatch import bidStack
 from simple_dispatch import dispatch
+from simple_dispatch import periodCalendar
 
 if __name__ == '__main__':
     
@@ -45,6 +46,11 @@ if __name__ == '__main__':
     
     ## specify run year
     run_year = 2018
+    period_resolution = 'week' # time periods of the generator data and merit orders: 'week', 'day', or 'month'
+    ## streaming output (optional)
+    stream_dir = None # e.g. './Stream'. If not None, each time period of the dispatch results is written to a parquet dataset in this folder (relative to the output folder) 
+                      # as soon as it is final, instead of holding the whole year of results in memory (see dispatch.calcDispatchAll)
+    stream_to_csv = True # when streaming, also append each time period to the usual dispatch results csv file
     ## define states to subset
     # states_to_subset_all = [['GA'], # SERC
     #                         ['GA', 'AL', 'TN'], # SERC
@@ -74,6 +80,10 @@ if __name__ == '__main__':
                                    'bit': 1.443140316,
                                    'sub': 1.293032933}}
     
+    ## counterfactual fuel price scenarios to run: output file name suffix : dictionary of regions and their avg_price_fuel_type (e.g. add '_2010': {...} for 2010 prices). 
+    # All of the scenarios of a region are applied to one generatorData with calcCounterfactualFuelPrices. A region with an empty dictionary runs the actual fuel prices
+    counterfactual_scenarios = {'': avg_price_fuel_type} # 2006 average prices
+    
     ## these file paths will change with every year (automatically when run_year is set)
     eia923_schedule5_xlsx = 'EIA923_Schedules_2_3_4_5_M_12_'+str(run_year)+'_Final_Revision.xlsx' # EIA 923
     # different run years will have different eGRIDs
@@ -99,14 +109,17 @@ if __name__ == '__main__':
     
     for i, nerc_region in enumerate(nerc_region_all):
         
-        ## create/retrieve simple generator dispatch object
-        try: # get shortened pickeled dictionary if generatorData has already been run for the particular year and region
+        ## create/retrieve the simple generator dispatch object once, and the fuel prices of each counterfactual scenario
+        scenario_prices = {} # scenario name : (fuel price columns, fuel price metrics)
+        try: # get shortened pickeled dictionary and fuel prices if generatorData has already been run for the particular year and region
             # change path to simple dispatch output data folder
             os.chdir(base_dname) 
             os.chdir(output_rel_path) # where to access output data relative to code folder
             gd_short = pickle.load(open('counterfactual_generator_data_short_%s_%s.obj'%(nerc_region, str(run_year)), 'rb')) # load generatordata object
+            for name in counterfactual_scenarios:
+                scenario_prices[name] = pickle.load(open('counterfactual_fuel_prices_%s_%s%s.obj'%(nerc_region, str(run_year), name), 'rb')) # load the scenario's fuel prices
         except:
-            # run the generator data object
+            # run the generator data object once, with the actual fuel prices (the CPI data is needed for the counterfactual real dollar adjustment)
             gd = generatorData(nerc_region, 
                                input_folder_rel_path=input_folder_rel_path,
                                egrid_fname=egrid_data_xlsx, 
@@ -121,43 +134,57 @@ if __name__ == '__main__':
                                hist_downtime=True, # should always be true
                                coal_min_downtime = 12, 
                                cems_validation_run=True, # makes sure only CEMS boilers are included in eGRID. We only need CEMS plants
-                               avg_price_fuel_type=avg_price_fuel_type[nerc_region],
-                               CPI=CPI_path) 
+                               CPI=CPI_path,
+                               period_resolution=period_resolution) 
+            # scale the fuel prices of the generator data by every counterfactual scenario, without re-reading eGRID, EIA923, and CEMS
+            counterfactuals = gd.calcCounterfactualFuelPrices([prices[nerc_region] for prices in counterfactual_scenarios.values()])
             
-            # pickle the trimmed version of the generator data object
-            gd_short = {'year': gd.year, 'nerc': gd.nerc, 'hist_dispatch': gd.hist_dispatch, 'demand_data': gd.demand_data, 
-                        'mdt_coal_events': gd.mdt_coal_events, 'df': gd.df, 'fuel_price_metrics': gd.fuel_price_metrics}
+            # pickle the trimmed version of the generator data object once, and only the fuel price columns of each scenario
             # change path to simple dispatch output data folder
             os.chdir(base_dname)
             os.chdir(output_rel_path) # where to access output data relative to code folder
             os.chdir('./Generator Data')
+            gd_short = {'year': gd.year, 'nerc': gd.nerc, 'hist_dispatch': gd.hist_dispatch, 'demand_data': gd.demand_data, 
+                        'mdt_coal_events': gd.mdt_coal_events, 'df': gd.df, 'period_resolution': gd.calendar.resolution}
             pickle.dump(gd_short, open('counterfactual_generator_data_short_%s_%s.obj'%(nerc_region, str(run_year)), 'wb'))
+            for name, prices in zip(counterfactual_scenarios, counterfactuals):
+                scenario_prices[name] = prices
+                pickle.dump(prices, open('counterfactual_fuel_prices_%s_%s%s.obj'%(nerc_region, str(run_year), name), 'wb'))
         
-        # save fuel price metrics
-        os.chdir(base_dname)
-        os.chdir(output_rel_path)
-        os.chdir('./Fuel Price Metrics')
-        gd_short['fuel_price_metrics'].to_csv('counterfactual_fuel_price_metrics_'+nerc_region+'_'+str(run_year)+'.csv', index=False)
-        
-        states_to_subset = states_to_subset_all[i]
-        ## create bidStack object and save merit order figures
-        #run the bidStack object - use information about the generators (from gd_short) to create a merit order (bid stack) of the nerc region's generators
-        week = 30 # week that bid stack is calculated
-        bs = bidStack(gd_short, time=week, dropNucHydroGeo=True, include_min_output=True, 
-                      states_to_subset=states_to_subset, mdt_weight=0.5) 
-        
-        ## run and save the dispatch object - use the nerc region's merit order (bs), a demand timeseries (gd.demand_data), 
-        #  and a time array (default is array([ 1,  2, ... , 51, 52]) for 52 weeks to run a whole year)
-        dp = dispatch(bs, gd_short["demand_data"], states_to_subset = states_to_subset, 
-                      time_array=np.arange(52)+1) #set up the dispatch object         
-        dp.calcDispatchAll() #function that solves the dispatch for each time period in time_array (default for each week of the year)
-        
-        #save dispatch results 
-        # change path to simple dispatch output data folder
-        os.chdir(base_dname)
-        os.chdir(output_rel_path)
-        fn = 'simple_dispatch_'+nerc_region+'_'+'_'.join(nerc_to_state_names[i])+'_'+str(run_year)+'.csv' # unique file name for particular NERC region
-        dp.df.to_csv(fn, index=False) # save larger dispatch results
-        # save subset results
-        if states_to_subset != []:
-            dp.df_subset.to_parquet('simple_dispatch_'+nerc_region+'_' + '_'.join(states_to_subset)+'_'+str(run_year)+'.parquet', index=False)
\ No newline at end of file
+        for name, (fuel_prices, fuel_price_metrics) in scenario_prices.items():
+            # save fuel price metrics (None for a scenario with the actual fuel prices)
+            if fuel_price_metrics is not None:
+                os.chdir(base_dname)
+                os.chdir(output_rel_path)
+                os.chdir('./Fuel Price Metrics')
+                fuel_price_metrics.to_csv('counterfactual_fuel_price_metrics_'+nerc_region+'_'+str(run_year)+name+'.csv', index=False)
+            
+            states_to_subset = states_to_subset_all[i]
+            ## create bidStack object and save merit order figures
+            #run the bidStack object - use information about the generators (from gd_short) to create a merit order (bid stack) of the nerc region's generators
+            calendar = periodCalendar(run_year, gd_short.get('period_resolution', periodCalendar.inferResolution(gd_short['df'].columns))) # time periods of the generator data
+            period = calendar.periodOf([run_year*10000 + 723])[0] # time period that bid stack is calculated (the one of July 23, e.g. week 30 or month 7)
+            # generator data of the scenario: the generators of gd_short with the scenario's fuel price columns
+            df = gd_short['df'].copy()
+            df[fuel_prices.columns] = fuel_prices
+            bs = bidStack(dict(gd_short, df=df), time=period, dropNucHydroGeo=True, include_min_output=True, 
+                          states_to_subset=states_to_subset, mdt_weight=0.5) 
+            
+            ## run and save the dispatch object - use the nerc region's merit order (bs), a demand timeseries (gd.demand_data), 
+            #  and a time array (bs.calendar.periods, e.g. array([ 1,  2, ... , 51, 52]) for 52 weeks, to run a whole year)
+            dp = dispatch(bs, gd_short["demand_data"], states_to_subset = states_to_subset, 
+                          time_array=bs.calendar.periods) #set up the dispatch object         
+            # change path to simple dispatch output data folder
+            os.chdir(base_dname)
+            os.chdir(output_rel_path)
+            fn = 'simple_dispatch_'+nerc_region+'_'+'_'.join(nerc_to_state_names[i])+'_'+str(run_year)+name+'.csv' # unique file name for particular NERC region and scenario
+            if stream_dir is None:
+                dp.calcDispatchAll() #function that solves the dispatch for each time period in time_array (default for each week of the year)
+                #save dispatch results 
+                dp.df.to_csv(fn, index=False) # save larger dispatch results
+                # save subset results
+                if states_to_subset != []:
+                    dp.df_subset.to_parquet('simple_dispatch_'+nerc_region+'_' + '_'.join(states_to_subset)+'_'+str(run_year)+name+'.parquet', index=False)
+            else:
+                # stream the dispatch results (and the subset results) of each time period to stream_dir/dispatch (and stream_dir/subset), and optionally append the dispatch results to the same csv file
+                dp.calcDispatchAll(stream_dir=stream_dir, stream_region=nerc_region+name, stream_csv={'dispatch': fn} if stream_to_csv else None)
\ No newline at end of file
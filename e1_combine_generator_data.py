@@ -39,34 +39,38 @@ def addDummies(df):
 def calcMdtCoalEvents(demand_data, coal_min_downtime=12):
     """ 
     Creates a dataframe of the start, end, and demand_threshold for each event in the demand data where we would expect a coal plant's minimum downtime constraint to kick in
-    copied from simple dispatch
+    copied from simple dispatch (the minimum downtime window is converted from hours to rows with the time step of the datetime column)
     ---
     """                      
     mdt_coal_events = demand_data.copy()
     mdt_coal_events['indices'] = mdt_coal_events.index
+    step = pd.to_datetime(mdt_coal_events.datetime).diff().median() / pd.Timedelta(hours=1) if len(mdt_coal_events) > 1 else 1.0 # time step [hours]
+    w = int(round(coal_min_downtime / step)) if step > 0 else coal_min_downtime # minimum downtime window [rows]
     #find the integral from x to x+
-    mdt_coal_events['integral_x_xt'] = mdt_coal_events.demand[::-1].rolling(window=coal_min_downtime+1).sum()[::-1] # sum of demand between current hour and next X hours determined by min downtime
+    mdt_coal_events['integral_x_xt'] = mdt_coal_events.demand[::-1].rolling(window=w+1).sum()[::-1] # sum of demand between current hour and next X hours determined by min downtime
     #find the integral of a flat horizontal line extending from x
-    mdt_coal_events['integral_x'] = mdt_coal_events.demand * (coal_min_downtime+1) # flat integral from multiplying by min downtime
-    #find the integral under the minimum of the flat horizontal line and the demand curve
-    def d_forward_convex_integral(mdt_index):
-        try:
-            return np.minimum(np.repeat(mdt_coal_events.demand[mdt_index], (coal_min_downtime+1)), mdt_coal_events.demand[mdt_index:(mdt_index+coal_min_downtime+1)]).sum()
-        except:
-            return mdt_coal_events.demand[mdt_index]   
-    mdt_coal_events['integral_x_xt_below_x'] = mdt_coal_events.indices.apply(d_forward_convex_integral)
+    mdt_coal_events['integral_x'] = mdt_coal_events.demand * (w+1) # flat integral from multiplying by min downtime
+    #find the integral under the minimum of the flat horizontal line and the demand curve, one offset of the window at a time (nan demand adds 0)
+    d = mdt_coal_events.demand.values.astype('float64')
+    n = len(d)
+    below = np.zeros(n)
+    for k in range(min(w+1, n)):
+        below[:n-k] += np.nan_to_num(np.minimum(d[:n-k], d[k:]))
+    #the last rows, whose window runs past the end of the demand data, keep their own demand (and the very last row its flat integral), as before
+    below[max(n-w, 0):] = d[max(n-w, 0):]
+    if (n > 0) & (w > 0):
+        below[-1] = np.nan_to_num(d[-1]) * (w+1)
+    mdt_coal_events['integral_x_xt_below_x'] = below
     #find the integral of the convex portion below x_xt
     mdt_coal_events['integral_convex_portion_btwn_x_xt'] = mdt_coal_events['integral_x'] - mdt_coal_events['integral_x_xt_below_x']
-    #keep the convex integral only if x < 1.05*x+
-    def d_keep_convex(mdt_index):
-        try:
-            return int(mdt_coal_events.demand[mdt_index] <= 1.05*mdt_coal_events.demand[mdt_index + coal_min_downtime]) * mdt_coal_events.integral_convex_portion_btwn_x_xt[mdt_index]
-        except:
-            return mdt_coal_events.integral_convex_portion_btwn_x_xt[mdt_index]   
-    mdt_coal_events['integral_convex_filtered'] = mdt_coal_events.indices.apply(d_keep_convex)
+    #keep the convex integral only if x < 1.05*x+ (rows without a row w later keep the convex integral)
+    convex = mdt_coal_events.integral_convex_portion_btwn_x_xt.values
+    keep = np.ones(n)
+    keep[:max(n-w, 0)] = d[:max(n-w, 0)] <= 1.05*d[w:]
+    mdt_coal_events['integral_convex_filtered'] = keep * convex
     #mdt_coal_events['integral_convex_filtered'] = mdt_coal_events['integral_convex_filtered'].replace(0, np.nan)
     #keep any local maximums of the filtered convex integral
-    mdt_coal_events['local_maximum'] = ((mdt_coal_events.integral_convex_filtered== mdt_coal_events.integral_convex_filtered.rolling(window=int(coal_min_downtime/2+1), center=True).max()) & (mdt_coal_events.integral_convex_filtered != 0) & (mdt_coal_events.integral_x >= mdt_coal_events.integral_x_xt))
+    mdt_coal_events['local_maximum'] = ((mdt_coal_events.integral_convex_filtered== mdt_coal_events.integral_convex_filtered.rolling(window=int(w/2+1), center=True).max()) & (mdt_coal_events.integral_convex_filtered != 0) & (mdt_coal_events.integral_x >= mdt_coal_events.integral_x_xt))
     #spread the maximum out over the min downtime window
     mdt_coal_events = mdt_coal_events[mdt_coal_events.local_maximum]
     mdt_coal_events['demand_threshold'] = mdt_coal_events.demand
@@ -128,8 +132,11 @@ if __name__ == '__main__':
         mdt_coal_events_combined = calcMdtCoalEvents(demand_data_combined)
         
         ## file back into gd_short and dump
+        period_resolution = gd_short.get('period_resolution') # all input regions have the same time periods; None for older pickles, which bidStack infers from the columns
         gd_short = {'year': run_year, 'nerc': nerc, 'hist_dispatch': hist_dispatch_combined, 'demand_data': demand_data_combined, 
                     'mdt_coal_events': mdt_coal_events_combined, 'df': generator_data_combined, 'ba_code':output_region_name+':'+', '.join(input_region_names)}
+        if period_resolution is not None:
+            gd_short['period_resolution'] = period_resolution
         os.chdir(base_dname)
         os.chdir(rel_path_output)
         pickle.dump(gd_short, open(fn_beginning_gd_short+'generator_data_short_%s_%s.obj'%(output_region_name, str(run_year)), 'wb'))
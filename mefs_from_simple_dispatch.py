@@ -29,13 +29,17 @@ import sklearn
 
 
 class generateMefs(object):
-    def __init__(self, dispatch_df):
+    def __init__(self, dispatch_df, time_step=None):
         """ 
         Uses a dispatch data frame to calculate the marginal emissions factors and fuel mix per hour (or per timestep)
         ---
         dispatch_df : a data frame of the dispatch (historical or simulated). From the simple_dispatch module, can use generatorData.hist_dispatch or dispatch.df data frames for the dispatch_df argument here
+        time_step : hours per row of dispatch_df (e.g. 5/60. for a 5-minute dispatch), whose emissions and fuel mix totals are per time step. None infers it from the datetime column (1.0 without one)
         """
         self.df = dispatch_df.copy(deep=True)
+        if time_step is None:
+            time_step = float(pandas.to_datetime(self.df.datetime).sort_values().diff().median() / pandas.Timedelta(hours=1)) if ('datetime' in self.df) and (len(self.df) > 1) else 1.0
+        self.time_step = time_step
         self.calc_delta_g()
         self.calc_delta_g_fuel_mix(f_types = ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass'])
         for e in ['co2', 'so2', 'nox']:
@@ -58,7 +62,7 @@ class generateMefs(object):
         for f in f_types:
             self.fuel_t = self.df[f+'_mix']
             self.fuel_t_prev = pandas.concat([pandas.Series([self.fuel_t[0]]), self.fuel_t])[0:-1]
-            self.df[f+'_mix_marg'] = scipy.divide((self.fuel_t.values - self.fuel_t_prev.values), self.df.delta_g)
+            self.df[f+'_mix_marg'] = scipy.divide((self.fuel_t.values - self.fuel_t_prev.values) / self.time_step, self.df.delta_g) # change of the fuel's generation per hour
         
     
     def calc_delta_e(self, e_type):
@@ -75,7 +79,7 @@ class generateMefs(object):
         ---
         e_type = name of the emissions type of interest (e.g. 'co2', 'so2', 'nox', 'pm25', etc.)
         """
-        self.df[e_type+'_marg'] = self.df['delta_'+e_type]/self.df['delta_g']
+        self.df[e_type+'_marg'] = self.df['delta_'+e_type]/self.time_step/self.df['delta_g'] # change of the emissions per hour [kg/h] over the change of demand [MW]
         #truncate unrealistic MEF values - i.e. MEFs cannot be below zero and cannot be larger than the dirtiest plant in the fleet
         mef_max = scipy.where(e_type=='co2', 1600.0, scipy.where(e_type=='so2', 5.0, scipy.where(e_type=='nox', 3.0, 1.0e10)))
         self.df.loc[self.df[e_type+'_marg'] <0, (e_type+'_marg')] = scipy.nan
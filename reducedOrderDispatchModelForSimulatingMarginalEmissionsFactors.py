@@ -18,6 +18,7 @@ import pandas
 from simple_dispatch import generatorData
 from simple_dispatch import bidStack
 from simple_dispatch import dispatch
+from simple_dispatch import periodCalendar
 from  mefs_from_simple_dispatch import generateMefs
 from  mefs_from_simple_dispatch import plotDispatch
 
@@ -84,29 +85,37 @@ if __name__ == '__main__':
                                coal_min_downtime = 12, 
                                cems_validation_run=True) # makes sure only CEMS boilers are included in eGRID. We only need CEMS plants
             #pickle the trimmed version of the generator data object
-            gd_short = {'year': gd.year, 'nerc': gd.nerc, 'hist_dispatch': gd.hist_dispatch, 'demand_data': gd.demand_data, 'mdt_coal_events': gd.mdt_coal_events, 'df': gd.df}
+            gd_short = {'year': gd.year, 'nerc': gd.nerc, 'hist_dispatch': gd.hist_dispatch, 'demand_data': gd.demand_data, 'mdt_coal_events': gd.mdt_coal_events, 'df': gd.df, 'period_resolution': gd.calendar.resolution}
             pickle.dump(gd_short, open('generator_data_short_%s_%s.obj'%(nerc_region, str(run_year)), 'wb'))
         
         ## now that we have the generator data cleaned up, we can build the merit order and run the dispatch
+        calendar = periodCalendar(run_year, gd_short.get('period_resolution', periodCalendar.inferResolution(gd_short['df'].columns))) # time periods of the generator data
+        period = calendar.periodOf([run_year*10000 + 723])[0] # time period that bid stack is calculated (the one of July 23, e.g. week 30 or month 7)
         #we can add a co2 price to the dispatch calculation
-        for co2_dol_per_ton in [0]:
+        co2_dol_per_ton_list = [0]
+        for co2_dol_per_ton in co2_dol_per_ton_list:
             #run the bidStack object - use information about the generators (from gd_short) to create a merit order (bid stack) of the nerc region's generators
-            bs = bidStack(gd_short, co2_dol_per_kg=(co2_dol_per_ton / 907.185), time=30, dropNucHydroGeo=True, include_min_output=False, mdt_weight=0.5) #NOTE: set dropNucHydroGeo to True if working with data that only looks at fossil fuels (e.g. CEMS)
+            bs = bidStack(gd_short, co2_dol_per_kg=(co2_dol_per_ton / 907.185), time=period, dropNucHydroGeo=True, include_min_output=False, mdt_weight=0.5) #NOTE: set dropNucHydroGeo to True if working with data that only looks at fossil fuels (e.g. CEMS)
             #produce bid stack plots
             #bid_stack_cost = bs.plotBidStackMultiColor('gen_cost', plot_type='bar', fig_dim = (4,4), production_cost_only=True) #plot the merit order
             bid_stack_cost = bs.plotBidStackMultiColor('gen_cost', plot_type='bar', fig_dim = (4,4), production_cost_only=False) #plot the merit order
             bid_stack_co2 = bs.plotBidStackMultiColor('co2', plot_type='bar') #plot emissions
             bid_stack_so2 = bs.plotBidStackMultiColor('so2', plot_type='bar') #plot emissions
             bid_stack_nox = bs.plotBidStackMultiColor('nox', plot_type='bar') #plot emissions                 
-            #run the dispatch object - use the nerc region's merit order (bs), a demand timeseries (gd.demand_data), and a time array (default is array([ 1,  2, ... , 51, 52]) for 52 weeks to run a whole year)
-            #if you've already run and saved the dispatch, skip this step
-            if not os.path.exists('simple_dispatch_%s_%s_%sco2price.csv'%(nerc_region, str(run_year), str(co2_dol_per_ton))):
-                #run the dispatch object
-                dp = dispatch(bs, gd_short["demand_data"], time_array=numpy.arange(52)+1) #set up the object
-                #dp = dispatch(bs, gd.demand_data, time_array=scipy.arange(3)+1) #test run          
-                dp.calcDispatchAll() #function that solves the dispatch for each time period in time_array (default for each week of the year)
-                #save dispatch results 
-                dp.df.to_csv('simple_dispatch_%s_%s_%sco2price.csv'%(nerc_region, str(run_year), str(co2_dol_per_ton)), index=False)
+        #run the dispatch object - use the nerc region's merit order (bs), a demand timeseries (gd.demand_data), and a time array (bs.calendar.periods, e.g. array([ 1,  2, ... , 51, 52]) for 52 weeks, to run a whole year)
+        #all of the co2 prices are dispatched together with calcDispatchSweep
+        #if you've already run and saved the dispatch, skip this step
+        co2_dol_per_ton_to_run = [c for c in co2_dol_per_ton_list if not os.path.exists('simple_dispatch_%s_%s_%sco2price.csv'%(nerc_region, str(run_year), str(c)))]
+        if co2_dol_per_ton_to_run != []:
+            #run the dispatch object
+            bs = bidStack(gd_short, time=period, dropNucHydroGeo=True, include_min_output=False, mdt_weight=0.5)
+            dp = dispatch(bs, gd_short["demand_data"], time_array=bs.calendar.periods) #set up the object
+            #dp = dispatch(bs, gd.demand_data, time_array=scipy.arange(3)+1) #test run          
+            dispatch_sweep = dp.calcDispatchSweep(co2_dol_per_kg=numpy.array(co2_dol_per_ton_to_run) / 907.185) #function that solves the dispatch of each co2 price for each time period in time_array (default for each week of the year)
+            #save dispatch results 
+            for scenario, co2_dol_per_ton in enumerate(co2_dol_per_ton_to_run): #the scenario number is the position of the co2 price in co2_dol_per_ton_to_run
+                dispatch_sweep[dispatch_sweep.scenario == scenario].drop(['scenario'] + list(dp.sweep_scenarios.columns), axis=1).to_csv(
+                    'simple_dispatch_%s_%s_%sco2price.csv'%(nerc_region, str(run_year), str(co2_dol_per_ton)), index=False)
                 
     #now that the dispatch is run, we can calculate the marginal emissions factors and plot them            
     #cedm_mefs_df = pandas.read_csv('mefs_by_decile_nerc.csv')[['year', 'region', 'dec', 'pollutant', 'factor']] #from CEDM: https://cedm.shinyapps.io/MarginalFactors/
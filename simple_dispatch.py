@@ -70,6 +70,33 @@
 # fixed bug for calculating fuel prices where "0"s were being populated due to some generators having nan fuel prices in EIA 923
 # v29:
 # added more balancing authority areas
+# v30:
+# counterfactual fuel prices are now deflated with a (year, month) CPI lookup table built once per run instead of scanning the CPI data for every month column
+# fuel_price_metrics outlier thresholds, masks, and statistics are now calculated on each fuel's whole (units x months) price matrix at once and the metrics dataframe is built in one go
+# calcFuelPrices is split into the base monthly fuel prices (saved as self.orispl_prices), shiftFuelPrices, and weeklyFuelPrices. calcCounterfactualFuelPrices applies a list of avg_price_fuel_type scenarios by scaling the fuel price columns of self.df with the monthly factors of shiftFuelPrices, without re-reading any input data, and returns only the fuel price columns of each scenario
+# calcDemandData aggregates the CEMS data in a single groupby over date, hour, and fuel category and aligns hist_dispatch to its hours by datetime instead of by position
+# FERC 714 system lambdas are converted once into an hourly (respondent_id, datetime) panel cached as parquet, and gen_cost_marg is matched to hist_dispatch by datetime
+# returnMarginalGenerator looks up non-numeric columns (fuel_type, orispl_unit, prime_mover, state, ...) with integer codes aligned with the sorted stack and searchsorted instead of a boolean scan inside an exception handler
+# added bs.returnDispatchMetrics, which returns a dictionary of dispatch metric arrays for an array of demand with shared position searches. calcDispatchSlice now makes one call per slice instead of 20 .apply passes
+# added an outputs option to bidStack and dispatch that limits the full_xxx_base/_marg columns, interpolation functions, and result columns to the requested dispatch outputs. calcFullMeritOrder now evaluates the interpolation functions on whole arrays instead of .apply
+# added an emissions price sweep: bs.batchMeritOrders builds the merit orders of all of the price points as (units x price points) arrays (gen_cost, the argsort per price point, and the cumulative capacity and cost tables), and dp.calcDispatchSweep looks up every (price point, hour) pair with one batched search into one tidy (price point x hour) dataframe. calcGenCost is split into calcUnitCosts and sortMeritOrder
+# the sweep also takes coal_dol_per_mmbtu and coal_capacity_derate, broadcast together with the emissions prices by bs.sweepParameters (e.g. a grid of coal taxes x derates), and dp.calcDispatchSweep returns a scenario-indexed table. calcFullMeritOrder now works on numpy arrays and adds its columns in one concat
+# added bs.updateUnits, which applies changed, added, or removed generators by splicing them into the sorted merit order and recalculating the cumulative demand columns and cumulative totals only from the first changed position (it falls back to a full sort if the changes touch the front of the merit order or tie in gen_cost)
+# added the compress_tolerance option to bidStack, which approximates the Full total interpolation functions (f_totalCO2Full, etc.) with fewer shared breakpoints within an absolute or relative error per output family. The realised error is saved in bs.compression_error and dp.compression_error
+# added per-state cumulative emissions tables (bs.state_totals) in merit order, so the total emissions of any set of states is a sum of per-state lookups (bs.returnFullTotalValueStates). dispatch takes state_groups and calculates the emissions of many groups of states in one run (dp.df_state_groups)
+# added bs.returnSensitivities, which returns first-order sensitivities of the dispatch results to demand (slopes of the Full total curves), fuel price multipliers and emissions prices (from the fuel cost and emissions of the online and marginal generators), and the fuel price change at which the marginal generator swaps with a neighbour. dispatch takes sensitivities=True to save them per time period in dp.df_sensitivity
+# bidStack now keeps the [s, f) marginal demand interval of each orispl_unit (bs.marginal_intervals), and dp.returnMarginalHours joins them against the sorted hourly demand of each dispatched slice to return the hours in which a list of units was marginal
+# dispatch finds the rows of each time period and coal minimum downtime event once with searchsorted on the sorted datetime column (dp.calcRowRanges), and calcDispatchSlice reads and writes its slices by position instead of comparing every datetime
+# dispatch keeps its results in typed arrays allocated up front (float64 or float32, and integer codes for the marg_gen_ columns) that calcDispatchSlice writes in place, and builds dp.df, dp.df_subset, and dp.df_state_groups from them when they are read
+# added a workers option to dp.calcDispatchAll that calculates the time periods in a process pool. Each worker gets the dispatch object once and the main process writes the slices in time period order, so the results match the serial run
+# the coal minimum downtime re-dispatch now gathers the hours of each demand_threshold (keeping the last event that covers each hour) and dispatches them with one call per threshold instead of one per event
+# calcDispatchAll can stream each time period, once it is final, to a partitioned parquet dataset (table/region/year/week) and optionally to csv files, instead of building self.df at the end. While streaming, the result arrays only hold the rows that are not final yet
+# calcDispatchAll can checkpoint each completed time period (keyed by a fingerprint of the inputs and options), so that a re-run after a failure skips the completed time periods
+# dispatch can evaluate each unique demand value of a slice once (unique_demand) and optionally round demand to a resolution (demand_resolution), reporting the error bound in self.quantization_error
+# the time step of the demand data is explicit (dispatch time_step, inferred from the datetimes), so sub-hourly data (e.g. 5-minute load) can be dispatched: generatorData.calcMdtCoalEvents converts its window from hours to rows, and the total result columns are per time step
+# dispatch.calcDispatchEnsemble runs a seeded Monte Carlo ensemble of perturbed fuel prices, heat rates, emissions rates, and VOM with the members' merit orders stacked as (units x members) arrays (bidStack.batchMeritOrders, including the minimum output blending and the minimum downtime capacity changes), dispatches each member like calcDispatchAll (Full merit order and coal minimum downtime re-dispatch), and keeps per-hour quantiles
+# the time periods are set by a periodCalendar (generatorData period_resolution of 'week', 'day', or 'month') instead of fixed 7.05-day weeks. bidStack only carries the current time period's columns through the merit order, updateTime relabels the processed merit order when the next time period has the same generator attributes, and dispatch reuses the minimum downtime bidStacks in that case
+# the subset totals of bidStack/dispatch states_to_subset keep the step construction of bs.df_subset, which no longer fails with duplicate labels when subset generators are among the first rows of the merit order. bidStack subset_state_totals=True builds them from the per-state curves of bs.state_totals instead (not the same numbers: over the demand range of the synthetic test fleet, a GA subset has 26-44% less so2, 3-13% less nox, and 3-9% less co2)
 
 
 import pandas
@@ -82,14 +109,102 @@ import math
 import copy
 import os
 import warnings
+import multiprocessing
+import hashlib
+import pickle
 from bisect import bisect_left
 
 
 
+class periodCalendar(object):
+    families = ['mw', 'heat_rate', 'fuel_price', 'co2', 'so2', 'nox', 'dmg'] # generator attributes with one column per time period (e.g. 'mw15', 'heat_rate15')
+    
+    def __init__(self, year, resolution='week'):
+        """ 
+        Splits a year into the time periods that each have their own generator attributes (capacities, heat rates, emissions rates, and fuel prices) and merit order. 
+        generatorData creates one column per time period for each attribute (e.g. 'mw1' to 'mw365' for days), and dispatch updates the bidStack for each time period of its time_array
+        ---
+        year : year of the run
+        resolution : 'week' (52 weeks of 7.05 days starting on December 31 of the year before, as in previous versions), 'day' (365 or 366 days), or 'month' (12 months)
+        """
+        if resolution not in ['week', 'day', 'month']:
+            raise ValueError("resolution must be 'week', 'day', or 'month'")
+        self.year = year
+        self.resolution = resolution
+        jan_1 = datetime.datetime(year, 1, 1)
+        if resolution == 'week':
+            starts = [jan_1 + datetime.timedelta(days=7.05*(t-1)-1) for t in numpy.arange(52)+1]
+            end = jan_1 + datetime.timedelta(days=7.05*52-1)
+            if year % 4 == 0: # account for leap years, add in extra day in last week
+                end = jan_1 + datetime.timedelta(days=7.05*52)
+        elif resolution == 'day':
+            starts = [jan_1 + datetime.timedelta(days=d) for d in range((datetime.datetime(year+1, 1, 1) - jan_1).days)]
+            end = datetime.datetime(year+1, 1, 1)
+        else:
+            starts = [datetime.datetime(year, m, 1) for m in numpy.arange(12)+1]
+            end = datetime.datetime(year+1, 1, 1)
+        #each time period includes its start date and excludes the start of the next one (the dates are truncated to days, as in previous versions)
+        dates = [d.strftime('%Y-%m-%d') for d in starts + [end]]
+        self.bounds = list(zip(dates[:-1], dates[1:])) # (start, end) of each time period
+        self.periods = numpy.arange(len(self.bounds)) + 1 # e.g. (1, 2, 3, ..., 51, 52) for weeks, which is the time_array of a whole year
+        self.n_periods = len(self.periods)
+    
+    
+    @staticmethod
+    def inferResolution(columns):
+        """ Returns the resolution of generator data from its number of time period columns, for generator data made before the resolution was saved with it
+        ---
+        columns : columns of the generator data (e.g. gd.df.columns)
+        returns : 'month' for 'mw1' to 'mw12', 'day' for 'mw1' to 'mw365' or 'mw366', otherwise 'week'
+        """
+        n = 0
+        while 'mw' + str(n+1) in columns:
+            n += 1
+        return 'month' if n == 12 else 'day' if n in [365, 366] else 'week'
+    
+    
+    def periodDates(self, t):
+        """ Returns the start and end dates of time period t (e.g. week 15) of the year
+        ---
+        t : time period of self.periods
+        returns : (start, end) strings of format 'yyyy-mm-dd'. The time period includes start and excludes end
+        """
+        return self.bounds[int(t)-1]
+    
+    
+    def startDates(self):
+        """ Returns the start date of each time period as a yyyymmdd number (e.g. 20170415.0)
+        """
+        return numpy.array([float(start.replace('-', '')) for start, end in self.bounds])
+    
+    
+    def periodOf(self, dates):
+        """ Returns the time period of each date
+        ---
+        dates : array of dates as yyyymmdd numbers (e.g. 20170415.0, as the monthday column of generatorData.cleanGeneratorData)
+        returns : array of time periods. Dates outside of every time period (e.g. December 31 of a weekly calendar that is not a leap year) are in the last time period
+        """
+        starts = self.startDates()
+        end = float(self.bounds[-1][1].replace('-', ''))
+        dates = numpy.asarray(dates, dtype='float64')
+        k = numpy.searchsorted(starts, dates, side='right') # time periods are contiguous, so each date is in the last one that starts on or before it
+        return numpy.where((k >= 1) & (dates < end), k, self.n_periods)
+    
+    
+    def monthPeriods(self):
+        """ Returns the time period that takes the new fuel prices of each month: the time period of the first day of the month, 
+        or for weeks the same weeks as previous versions (which are a week late for July and September in most years)
+        """
+        if self.resolution == 'week':
+            return [1, 5, 9, 14, 18, 22, 27, 31, 36, 40, 44, 48] # weeks corresponding to months of year
+        return list(self.periodOf([self.year*10000 + m*100 + 1 for m in numpy.arange(12)+1]))
+
+
+
 class generatorData(object):
     def __init__(self, nerc, egrid_fname, input_folder_rel_path, eia923_fname, ferc714_fname='', ferc714IDs_fname='', cems_folder='', easiur_fname='', 
                  include_easiur_damages=False, year=2017, fuel_commodity_prices_excel_dir='', hist_downtime = True, coal_min_downtime = 12, cems_validation_run=True,
-                 avg_price_fuel_type={}, CPI='', ba_code=''):
+                 avg_price_fuel_type={}, CPI='', ba_code='', period_resolution='week'):
         """ 
         Translates the CEMS, eGrid, FERC, and EIA data into a dataframe for feeding into the bidStack class
         ---
@@ -113,6 +228,7 @@ class generatorData(object):
                 the relative positions of generators will shift proportionally to the fuel prices set in avg_price_fuel_type
         ba_code: balancing authority code to run in lieu of NERC regions. NERC region still needs to be inputted for addElecPriceToDemandData(), but it won't
             have an overall impact on the emissions generated. Only has SOCO, ISNE, PJM, and NYIS so far, but more can be added easily
+        period_resolution : time periods of the generator attributes and merit orders, 'week', 'day' (e.g. to follow daily gas prices), or 'month' (for fast screening runs). See periodCalendar
         """
         ## read in the data
         
@@ -154,11 +270,11 @@ class generatorData(object):
         self.eia923_1 = eia923_1
               
         print('Reading in data from FERC Form 714...')
-        try:
-            self.ferc714 = pandas.read_parquet(ferc714_fname.split('.')[0]+'.parquet')
+        try: # hourly long-format panel of system lambdas, converted from the FERC 714 csv on first read
+            self.ferc714 = pandas.read_parquet(ferc714_fname.split('.')[0]+'_hourly.parquet')
         except:
-            self.ferc714 = pandas.read_csv(ferc714_fname) 
-            self.ferc714.to_parquet(ferc714_fname.split('.')[0]+'.parquet', index=False)
+            self.ferc714 = self.ferc714HourlyPanel(pandas.read_csv(ferc714_fname))
+            self.ferc714.to_parquet(ferc714_fname.split('.')[0]+'_hourly.parquet', index=False)
         
         try:
             self.ferc714_ids = pandas.read_parquet(ferc714IDs_fname.split('.')[0]+'.parquet')
@@ -174,10 +290,11 @@ class generatorData(object):
         self.hist_downtime = hist_downtime
         self.coal_min_downtime = coal_min_downtime
         self.year = year
+        self.calendar = periodCalendar(year, period_resolution) # time periods of the year (e.g. weeks)
         self.avg_price_fuel_type = avg_price_fuel_type
         self.CPI = CPI
-        # if shifting average fuel prices, read in that dictionary as well
-        if bool(avg_price_fuel_type): # execute only if dictionary is not empty
+        # if shifting average fuel prices (now or later with calcCounterfactualFuelPrices), read in the CPI data as well
+        if bool(avg_price_fuel_type) or (CPI != ''): # execute only if dictionary is not empty or CPI file is given
             
             print("Reading in CPI data...")
             CPI = pandas.read_csv(CPI) # consumer price index data
@@ -186,6 +303,10 @@ class generatorData(object):
             CPI['year'] = CPI['DATE'].dt.year
             CPI['month'] = CPI['DATE'].dt.month
             self.CPI = CPI
+            # lookup table of CPI_current/CPI_2006 with one row per year and one column per month,
+            # so that deflating a 12-month block of prices is a single broadcast multiply instead of two CPI scans per month
+            CPI_2006 = CPI.loc[((CPI['year'] == 2006) & (CPI['month'] == 1)), 'CPIAUCSL'].values[0]
+            self.CPI_deflator = CPI.pivot(index='year', columns='month', values='CPIAUCSL') / CPI_2006
         
         ## data cleaning
         self.cleanGeneratorData() # converts eGRID and CEMS data to df of generator units and df of all CEMS data in NERC region
@@ -353,7 +474,7 @@ class generatorData(object):
         #Any entries with less than 60 mmbtu fuel or less than 6.0 heat rate, let's get rid of that row of data.
         df_cems = df_cems[(df_cems.heat_rate >= 6.0) & (df_cems.mmbtu >= 60)]
         
-        ##calculate emissions rates and heat rate for each week and each generator
+        ##calculate emissions rates and heat rate for each time period (e.g. week) and each generator
         #rather than parsing the dates (which takes forever because this is such a big dataframe) we can create month and day columns for slicing the 
         #data based on time of year
         df_orispl_unit = df_cems.copy(deep=True)
@@ -363,18 +484,9 @@ class generatorData(object):
         
         
         ###
-        #loop through the weeks, slice the data, and find the average heat rates and emissions rates
-        ## first, add a column 't' that says which week of the simulation we are in
-        df_orispl_unit['t'] = 52
-        for t in numpy.arange(52)+1: # add column to relevant rows
-            start = (datetime.datetime.strptime(str(self.year) + '-01-01', '%Y-%m-%d') + datetime.timedelta(days=7.05*(t-1)-1)).strftime('%Y-%m-%d') 
-            end = (datetime.datetime.strptime(str(self.year) + '-01-01', '%Y-%m-%d') + datetime.timedelta(days=7.05*(t)-1)).strftime('%Y-%m-%d') 
-            if (self.year % 4 == 0) & (t == 52): # account for leap years, add in extra day in last week
-                end = (datetime.datetime.strptime(str(self.year) + '-01-01', '%Y-%m-%d') + datetime.timedelta(days=7.05*(t))).strftime('%Y-%m-%d') 
-            start_monthday = float(start[0:4])*10000 + float(start[5:7])*100 + float(start[8:])
-            end_monthday = float(end[0:4])*10000 + float(end[5:7])*100 + float(end[8:])
-            #slice the data for the days corresponding to the time series period, t
-            df_orispl_unit.loc[(df_orispl_unit.monthday >= start_monthday) & (df_orispl_unit.monthday < end_monthday), 't'] = t          
+        #slice the data by time period and find the average heat rates and emissions rates
+        ## first, add a column 't' that says which time period (e.g. week) of the simulation we are in. Days outside of every time period go in the last one
+        df_orispl_unit['t'] = self.calendar.periodOf(df_orispl_unit.monthday.values)
         
         ## make columns for every t week and each variable
         #remove outlier emissions and heat rates. These happen at hours where a generator's output is very low (e.g. less than 10 MWh). 
@@ -397,8 +509,8 @@ class generatorData(object):
         
         for c in ['heat_rate', 'co2', 'so2', 'nox', 'mw']: # loop through each variable
             # sets index to ORISPL_unit and t (week number), then lists each variable+week number in its own column 
-            temp_3 = temp_2.set_index(['orispl_unit', 't'])[c].unstack().reset_index() # makes matrix; rows are orispl_unit and columns are X variable for each week
-            temp_3.columns = list(['orispl_unit']) + ([c + str(a) for a in numpy.arange(52)+1]) # make sure naming convention correct
+            temp_3 = temp_2.set_index(['orispl_unit', 't'])[c].unstack().reindex(columns=self.calendar.periods).reset_index() # makes matrix; rows are orispl_unit and columns are X variable for each time period (nan for time periods without data)
+            temp_3.columns = list(['orispl_unit']) + ([c + str(a) for a in self.calendar.periods]) # make sure naming convention correct
             if not self.hist_downtime: ## if we want to use the max MW for unit capacity instead of total
                 #remove any outlier values in the 1st or 99th percentiles
                 max_array = temp_3.copy().drop(columns='orispl_unit').quantile(0.99, axis=1) # max in any row
@@ -436,7 +548,7 @@ class generatorData(object):
             if not self.hist_downtime:
                 temp_3 = temp_3.fillna(method='ffill', axis=1)
                 # re-cast objects into floats so that later methods don't freak out
-                suffixes = [str(i) for i in range(1, 53)]
+                suffixes = [str(i) for i in self.calendar.periods]
                 for col in [c + f"{suffix}" for suffix in suffixes]:
                     temp_3[col] = pandas.to_numeric(temp_3[col])
             #merge temp_3 with df_orispl_unit. Now we have weekly heat rates, emissions rates, and capacities for each generator. 
@@ -472,7 +584,7 @@ class generatorData(object):
         #In this case we will just apply the annual average to each column, but we still need those columns to be able to 
         #concatenate back with df_orispl_unit and have our complete set of generator data
         for e in ['heat_rate', 'co2', 'so2', 'nox', 'mw']:
-            for t in numpy.arange(52)+1:
+            for t in self.calendar.periods:
                 if e == 'mw':
                     if self.hist_downtime:
                         df_leftovers[e + str(t)] = df_leftovers[e]
@@ -526,9 +638,7 @@ class generatorData(object):
             chp_derate_df = chp_derate_df[['orispl', 'Reported\nFuel Type Code', 'elec_ratio']].dropna() # removes all columns but fuel type and ratio for each ORISPL
             chp_derate_df.columns = ['orispl', 'fuel', 'elec_ratio']    
             chp_derate_df.fuel = chp_derate_df.fuel.str.lower()
-            mw_cols = ['mw','mw1','mw2','mw3','mw4','mw5','mw6','mw7','mw8','mw9','mw10','mw11','mw12','mw13','mw14','mw15','mw16','mw17','mw18','mw19','mw20','mw21',
-                       'mw22','mw23','mw24','mw25','mw26','mw27','mw28','mw29','mw30','mw31','mw32','mw33','mw34','mw35','mw36','mw37','mw38','mw39','mw40','mw41','mw42',
-                       'mw43','mw44','mw45','mw46','mw47','mw48','mw49','mw50', 'mw51', 'mw52']
+            mw_cols = ['mw'] + ['mw' + str(t) for t in self.calendar.periods]
             chp_derate_df = df_orispl_unit.merge(chp_derate_df, how='right', on=['orispl', 'fuel'])[mw_cols + ['orispl', 'fuel', 'elec_ratio', 'orispl_unit']] # links each relevant ORISPL unit, along with its max capaciy for each week, to the derated CHP columns just created
             chp_derate_df[mw_cols] = chp_derate_df[mw_cols].multiply(chp_derate_df.elec_ratio, axis='index') # multiplies each unit's electricity max generation capacity for each week with the calculated electricity ratio
             chp_derate_df.dropna(inplace=True) # remove nans
@@ -720,237 +830,167 @@ class generatorData(object):
             orispl_prices.loc[orispl_prices.fuel==f, orispl_prices.columns.difference(['orispl_unit', 'orispl', 'fuel', 'purchase_type'])] = numpy.append(
                 numpy.array(temp_prices.fuel_price),temp.quantity.sum())
         
+        self.orispl_prices = orispl_prices.copy(deep=True) # save the base monthly (nominal) fuel prices so counterfactual scenarios can be applied without rebuilding the generatorData
+        
+        fuel_prices = self.weeklyFuelPrices(orispl_prices) # weekly fuel prices for each generating unit
+        
         ## if we are shifting average fuel prices to some counterfactual value, we will do that here
         if bool(self.avg_price_fuel_type): # execute only if dictionary is not empty
-            
-            ## adjust nominal prices to real 2006/01 prices
-            # function adjusts nominal dollars of a certain month and year to real 2006/1 dolalrs
-            def adjust_to_2006_1_real_dollars(nominal_dollars, year, month):
-                CPI_2006 = self.CPI.loc[((self.CPI['year'] == 2006) & (self.CPI['month'] == 1)), 'CPIAUCSL'].values[0]
-                CPI_current = self.CPI.loc[((self.CPI['year'] == year) & (self.CPI['month'] == month)), 'CPIAUCSL'].values[0]
-                real_dollars = nominal_dollars * CPI_current/CPI_2006
-                return real_dollars
-
-            temp_orispl_prices = orispl_prices.copy(deep=True)
-            temp_orispl_prices[[i for i in range(1, 13)]] = orispl_prices[range(1, 13)].apply(
-                lambda x: adjust_to_2006_1_real_dollars(x, self.year, x.name)) # adjusts to real 2006 dollars based on current year and month
-            
-            ## functions to filter data
-            def mask_outliers(data):
-                """
-                Returns a boolean mask indicating which elements of the input array 
-                are outliers according to the modified Z-score method only applied to the upper bound.
-                Also removes outliers that are negative or 0
-                Note: the minimum value for the upper threshold is 30 $/MWh
-                
-                Parameters
-                ----------
-                data : numpy.ndarray or pandas.Series
-                    The input array of data to test for outliers.
-                threshold : float, optional
-                    The number of scaled MADs above the median at which to define an
-                    outlier. Default is 3.
-                
-                Returns
-                -------
-                mask : numpy.ndarray or pandas.Series
-                    A boolean mask indicating which elements of the input array are
-                    outliers.
-                upper_threshold : float
-                    The upper threshold used to define outliers.
-                """
-                
-                # Calculate median and MAD
-                median = numpy.nanmedian(data)
-                mad = numpy.nanmedian(numpy.abs(data - median))
-
-                # Calculate the threshold for outliers (3 scaled MAD)
-                threshold = 3 * 1.4826 * mad
-
-                # Mask the non-outlier elements
-                upper_threshold = max(30, median + threshold)
-                mask = (data <= 0) | (data > upper_threshold)
-
-                return mask
-
-            def outlier_threshold(data):
-                """
-                Returns upper threshold for data
-                Note: the minimum value for the upper threshold is 10 $/MWh
-                """
+            scale, self.fuel_price_metrics = self.shiftFuelPrices(orispl_prices, self.avg_price_fuel_type) # scale factors of the new fuel prices and metrics
+            fuel_prices = self.scaleFuelPrices(fuel_prices, scale)
+        
+        #save
+        self.df = self.df.merge(fuel_prices, on='orispl_unit', how='left') # we are left with weekly fuel prices for each generating unit in the df
 
-                # Calculate median and MAD
-                median = numpy.nanmedian(data)
-                mad = numpy.nanmedian(numpy.abs(data - median))
 
-                # Calculate the threshold for outliers (3 scaled MAD)
-                threshold = 3 * 1.4826 * mad
-                
-                # calculate the upper threshold
-                upper_threshold = max(30, median + threshold)
-                return upper_threshold
+    def shiftFuelPrices(self, orispl_prices, avg_price_fuel_type):
+        """ 
+        Finds the factors that adjust monthly fuel prices to real 2006/01 dollars and shift them so that the average (with outliers removed) of each fuel type 
+        (and purchase type if natural gas) in each month is equal to the counterfactual average price
+        ---
+        orispl_prices : dataframe of monthly fuel prices for each orispl_unit (columns 1 to 12), as calculated in calcFuelPrices
+        avg_price_fuel_type : dictionary of fuel types (and purchase type if natural gas) and average price to set monthly fuel prices equal to
+        returns : dataframe of the monthly scale factors of each unit (columns 1 to 12, with the index of orispl_prices) for scaleFuelPrices, 
+            and dataframe of fuel price metrics before and after the shift
+        """
+        
+        ## adjust nominal prices to real 2006/01 prices
+        # function adjusts a block of monthly (columns 1 to 12) nominal dollars of a certain year to real 2006/1 dollars
+        def adjust_to_2006_1_real_dollars(nominal_dollars, year):
+            return nominal_dollars * self.CPI_deflator.loc[year, list(range(1, 13))].values # broadcasts each month's CPI ratio down its column
 
-            
-            
-            ## create a dataframe to hold fuel_price_metrics: number of units, average before, average after, 
-            #  average % change, min before, max before, standard deviation
-            tuple_list = [] # assemble dataframe columns
-            for key, value in self.avg_price_fuel_type.items():
-                    if isinstance(value, dict):
-                        for subkey, subvalue in value.items():
-                            if isinstance(subvalue, dict):
-                                subvalue = numpy.nan
-                            tuple_list.append((key, subkey, subvalue))
-                    else:
-                        tuple_list.append((key, numpy.nan, value))
-            fuel_price_metrics = pandas.DataFrame(tuple_list, columns=["fuel", "purchase_type", "average_counterfactual"])
-            
-            # Repeat the 'fuel_price_average', 'average_percent_change', 'standard_deviation', 
-            # 'min', and 'max' 'upper_threshold_outliers', 'excluded_units', 'excluded_units_fraction', 'average_percent_change_no_outliers'
-            # 'average_no_outliers', 'standard_deviation_no_outliers'columns with suffixes from 1 to 12
-            suffixes = [str(i) for i in range(1, 13)]
-            cols_to_repeat = ['average', 'average_percent_change', 'standard_deviation', 'min', 'max', 'upper_threshold_outliers', 
-                              'excluded_units', 'excluded_units_fraction', 'average_no_outliers', 'average_percent_change_no_outliers',
-                              'standard_deviation_no_outliers']
-            new_cols = [f"{col}{suffix}" for col in cols_to_repeat for suffix in suffixes]
-            new_cols = ['number_of_units'] + new_cols # also append 'number of units' to the list
-            fuel_price_metrics = pandas.concat([fuel_price_metrics, pandas.DataFrame(columns=new_cols)]) # append new empty columns
-            
-            
-            ## iterate over all unique generator fuel types, adjusting the fuel prices if they exist in the avg_price_fuel_type dictionary
-            #  and populating the fuel_price_metrics dataframe
-            f_iter = list(orispl_prices.fuel.unique()) # all types of unique fuels during this period
-            for fuel_type in f_iter:
-                if fuel_type not in self.avg_price_fuel_type:
-                    units_not_in_dict = (orispl_prices["fuel"] == fuel_type).sum() # number of units with this fuel type
-                    print(fuel_type + " is not in the dictionary of average fuel prices (" 
-                          + str(units_not_in_dict) + " units out of " + str(orispl_prices.shape[0])
-                          + " total units)")
-                    # add row to metrics dataframe
-                    new_row = pandas.DataFrame({'fuel': [fuel_type], 'number_of_units': [units_not_in_dict]})
-                    fuel_price_metrics = pandas.concat([fuel_price_metrics, new_row])
-                elif fuel_type == 'ng':
-                    for purchase_type in self.avg_price_fuel_type['ng']: # iterate over all contract types, same method as in last 'else' statement (that is more readable)
-                        # mask for units that have matching fuel type and contract type
-                        mask = (temp_orispl_prices["fuel"] == fuel_type) & (temp_orispl_prices["purchase_type"] == purchase_type)
-                        if purchase_type == 'other': # if other, retrieve all ng that are not the three purchase types
-                            mask = ((temp_orispl_prices["fuel"] == fuel_type) & (temp_orispl_prices["purchase_type"] != 'T') 
-                                    & (temp_orispl_prices["purchase_type"] != 'S')  & (temp_orispl_prices["purchase_type"] != 'C'))
-                        if purchase_type == 'all': # if all (should be the only one in the list), apply to all ng; aka treat like 'else' statement
-                            mask = temp_orispl_prices["fuel"] == fuel_type
-                        # mask for fuel price metrics index
-                        fuel_price_metrics_row = (fuel_price_metrics['fuel'] == fuel_type) & (fuel_price_metrics['purchase_type'] == purchase_type)
-                        
-                        ## calculate 'before' metrics (number of units, average, min, max, standard deviation) with all units
-                        fuel_price_metrics.loc[fuel_price_metrics_row, 'number_of_units'] = mask.sum() # number of units
-                        temp = temp_orispl_prices.loc[mask, range(1, 13)] # retrieve all price data to manipulate
-                        # average before
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"average{suffix}" for suffix in suffixes]] = temp.mean(axis=0, skipna=True).values
-                        # min before
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"min{suffix}" for suffix in suffixes]] = temp.min(axis=0, skipna=True).values
-                        # max before
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"max{suffix}" for suffix in suffixes]] = temp.max(axis=0, skipna=True).values
-                        # standard deviation 
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"standard_deviation{suffix}" for suffix in suffixes]] = temp.std(axis=0, skipna=True).values 
-                        # calculate average percent change from actual to counterfactual average
-                        avg_shift = numpy.divide((self.avg_price_fuel_type[fuel_type][purchase_type]
-                                                  - temp.mean(axis=0, skipna=True))*100, temp.mean(axis=0, skipna=True)) # negative if shifting down
-                        avg_shift.replace([numpy.inf, -numpy.inf], numpy.nan, inplace=True) # replace inf if dividing by 0 with nan
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"average_percent_change{suffix}" for suffix in suffixes]] = avg_shift.values
-                        
-                        ## remove outliers, then re-do calculations
-                        with warnings.catch_warnings():
-                            warnings.filterwarnings(action='ignore', category=RuntimeWarning)
-                            # calculate upper threshold for outliers
-                            fuel_price_metrics.loc[fuel_price_metrics_row, [f"upper_threshold_outliers{suffix}" for suffix in suffixes]] = temp.apply(outlier_threshold,
-                                                                                                                                                      axis=0).values
-                            # mask for outliers
-                            outlier_mask = temp.apply(mask_outliers)
-                            temp = temp.where(~outlier_mask, numpy.nan) # change outlier values to nan
-                            # calculate number of units excluded from average
-                            fuel_price_metrics.loc[fuel_price_metrics_row, [f"excluded_units{suffix}" for suffix in suffixes]] = outlier_mask.sum().values
-                            # calculate fraction of units excluded from average
-                            fuel_price_metrics.loc[fuel_price_metrics_row, [f"excluded_units_fraction{suffix}" 
-                                                                            for suffix in suffixes]] = outlier_mask.sum().values/temp.shape[0] if temp.shape[0] else numpy.nan
-                            # average each month
-                            fuel_price_metrics.loc[fuel_price_metrics_row, [f"average_no_outliers{suffix}" for suffix in suffixes]] = temp.mean(
-                                axis=0, skipna=True).values
-                            # standard deviation 
-                            fuel_price_metrics.loc[fuel_price_metrics_row, [f"standard_deviation_no_outliers{suffix}" for suffix in suffixes]] = temp.std(
-                                axis=0, skipna=True).values
-                            # calculate average percent change from actual to counterfactual average
-                            avg_shift = numpy.divide((self.avg_price_fuel_type[fuel_type][purchase_type]
-                                                      - temp.mean(axis=0, skipna=True))*100, temp.mean(axis=0, skipna=True)) # negative if shifting down
-                            avg_shift.replace([numpy.inf, -numpy.inf], numpy.nan, inplace=True) # replace inf if dividing by 0 with nan
-                            fuel_price_metrics.loc[fuel_price_metrics_row, 
-                                                   [f"average_percent_change_no_outliers{suffix}" for suffix in suffixes]] = avg_shift.values
-                        
-                        ## perform shift
-                        avg_ratio = self.avg_price_fuel_type[fuel_type][purchase_type]/temp.mean(axis=0, skipna=True) # new average/old average with outliers removed
-                        temp_orispl_prices.loc[mask, range(1, 13)] = temp_orispl_prices.loc[mask, range(1, 13)].multiply(avg_ratio, axis=1)
+        temp_orispl_prices = orispl_prices.copy(deep=True)
+        temp_orispl_prices[[i for i in range(1, 13)]] = adjust_to_2006_1_real_dollars(orispl_prices[list(range(1, 13))], self.year) # adjusts to real 2006 dollars based on current year and month
+        scale = pandas.DataFrame(adjust_to_2006_1_real_dollars(numpy.ones((len(orispl_prices), 12)), self.year), index=orispl_prices.index, columns=list(range(1, 13))) # product of the real dollar adjustment and the shifts of each unit
+        
+        ## function to calculate the fuel price metrics of a block of units
+        def outlier_metrics(prices, average_counterfactual):
+            """
+            Calculates the monthly fuel price metrics of a (units x 12 months) price matrix before and after removing outliers.
+            Outliers are found column by column with the modified Z-score method only applied to the upper bound 
+            (3 scaled MADs above the median), and prices that are negative or 0 are also removed
+            Note: the minimum value for the upper threshold is 30 $/MWh
+            ---
+            prices : numpy array of monthly real fuel prices, one row per unit
+            average_counterfactual : counterfactual average fuel price the units are shifted to
+            returns : dictionary of 12-element arrays keyed by metric name (same names as the fuel_price_metrics columns without the month suffix)
+            """
+            n_units = prices.shape[0]
+            with warnings.catch_warnings():
+                warnings.filterwarnings(action='ignore', category=RuntimeWarning) # all-nan months and empty blocks return nan
+                ## 'before' metrics with all units
+                average = numpy.nanmean(prices, axis=0)
+                metrics = {'average': average,
+                           'standard_deviation': numpy.nanstd(prices, axis=0, ddof=1),
+                           'min': numpy.nanmin(prices, axis=0) if n_units else numpy.full(12, numpy.nan),
+                           'max': numpy.nanmax(prices, axis=0) if n_units else numpy.full(12, numpy.nan)}
+                ## remove outliers, then re-do calculations
+                median = numpy.nanmedian(prices, axis=0) # median of each month
+                mad = numpy.nanmedian(numpy.abs(prices - median), axis=0) # MAD of each month
+                upper_threshold = numpy.fmax(30, median + 3 * 1.4826 * mad) # 3 scaled MAD, but at least 30 (also if median is nan)
+                outlier_mask = (prices <= 0) | (prices > upper_threshold)
+                prices_no_outliers = numpy.where(outlier_mask, numpy.nan, prices) # change outlier values to nan
+                average_no_outliers = numpy.nanmean(prices_no_outliers, axis=0)
+                metrics['upper_threshold_outliers'] = upper_threshold
+                metrics['excluded_units'] = outlier_mask.sum(axis=0)
+                metrics['excluded_units_fraction'] = metrics['excluded_units']/n_units if n_units else numpy.full(12, numpy.nan)
+                metrics['average_no_outliers'] = average_no_outliers
+                metrics['standard_deviation_no_outliers'] = numpy.nanstd(prices_no_outliers, axis=0, ddof=1)
+                ## average percent change from actual to counterfactual average (negative if shifting down), nan if dividing by 0
+                for col, avg in [('average_percent_change', average), ('average_percent_change_no_outliers', average_no_outliers)]:
+                    avg_shift = (average_counterfactual - avg)*100/avg
+                    metrics[col] = numpy.where(numpy.isinf(avg_shift), numpy.nan, avg_shift)
+            return metrics
+        
+        ## list the rows of the fuel_price_metrics dataframe: number of units, average before, average after, 
+        #  average % change, min before, max before, standard deviation
+        tuple_list = [] # assemble dataframe rows
+        for key, value in avg_price_fuel_type.items():
+                if isinstance(value, dict):
+                    for subkey, subvalue in value.items():
+                        if isinstance(subvalue, dict):
+                            subvalue = numpy.nan
+                        tuple_list.append((key, subkey, subvalue))
                 else:
-                    # mask for units that have matching fuel type
-                    mask = temp_orispl_prices["fuel"] == fuel_type
-                    # mask for fuel price metrics index
-                    fuel_price_metrics_row = fuel_price_metrics['fuel'] == fuel_type
-                    
-                    ## calculate 'before' metrics (number of units, average, min, max, standard deviation)
-                    fuel_price_metrics.loc[fuel_price_metrics_row, 'number_of_units'] = mask.sum() # number of units
-                    temp = temp_orispl_prices.loc[mask, range(1, 13)] # retrieve all price data to manipulate
-                    # average before
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"average{suffix}" for suffix in suffixes]] = temp.mean(axis=0, skipna=True).values
-                    # min before
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"min{suffix}" for suffix in suffixes]] = temp.min(axis=0, skipna=True).values
-                    # max before
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"max{suffix}" for suffix in suffixes]] = temp.max(axis=0, skipna=True).values
-                    # standard deviation 
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"standard_deviation{suffix}" for suffix in suffixes]] = temp.std(axis=0, skipna=True).values 
-                    # calculate average percent change from actual to counterfactual average
-                    avg_shift = numpy.divide((self.avg_price_fuel_type[fuel_type] - temp.mean(axis=0, skipna=True))*100, temp.mean(axis=0, skipna=True)) # negative if shifting down
-                    avg_shift.replace([numpy.inf, -numpy.inf], numpy.nan, inplace=True) # replace inf if dividing by 0 with nan
-                    fuel_price_metrics.loc[fuel_price_metrics_row, [f"average_percent_change{suffix}" for suffix in suffixes]] = avg_shift.values
-                    
-                    ## remove outliers, then re-do calculations
-                    with warnings.catch_warnings():
-                        warnings.filterwarnings(action='ignore', category=RuntimeWarning)
-                        # calculate upper threshold for outliers
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"upper_threshold_outliers{suffix}" for suffix in suffixes]] = temp.apply(outlier_threshold,
-                                                                                                                                                  axis=0).values
-                        # mask for outliers
-                        outlier_mask = temp.apply(mask_outliers)
-                        temp = temp.where(~outlier_mask, numpy.nan) # change outlier values to nan
-                        # calculate number of units excluded from average
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"excluded_units{suffix}" for suffix in suffixes]] = outlier_mask.sum().values
-                        # calculate fraction of units excluded from average
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"excluded_units_fraction{suffix}" 
-                                                                        for suffix in suffixes]] = outlier_mask.sum().values/temp.shape[0] if temp.shape[0] else numpy.nan
-                        # average each month
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"average_no_outliers{suffix}" for suffix in suffixes]] = temp.mean(
-                            axis=0, skipna=True).values
-                        # standard deviation 
-                        fuel_price_metrics.loc[fuel_price_metrics_row, [f"standard_deviation_no_outliers{suffix}" for suffix in suffixes]] = temp.std(
-                            axis=0, skipna=True).values
-                        # calculate average percent change from actual to counterfactual average
-                        avg_shift = numpy.divide((self.avg_price_fuel_type[fuel_type]
-                                                  - temp.mean(axis=0, skipna=True))*100, temp.mean(axis=0, skipna=True)) # negative if shifting down
-                        avg_shift.replace([numpy.inf, -numpy.inf], numpy.nan, inplace=True) # replace inf if dividing by 0 with nan
-                        fuel_price_metrics.loc[fuel_price_metrics_row, 
-                                               [f"average_percent_change_no_outliers{suffix}" for suffix in suffixes]] = avg_shift.values
-                    
-                    ## perform shift
-                    avg_ratio = self.avg_price_fuel_type[fuel_type]/temp.mean(axis=0, skipna=True) # new average/old average with outliers removed
-                    temp_orispl_prices.loc[mask, range(1, 13)] = temp_orispl_prices.loc[mask, range(1, 13)].multiply(avg_ratio, axis=1)
+                    tuple_list.append((key, numpy.nan, value))
+        
+        # Repeat the 'fuel_price_average', 'average_percent_change', 'standard_deviation', 
+        # 'min', and 'max' 'upper_threshold_outliers', 'excluded_units', 'excluded_units_fraction', 'average_percent_change_no_outliers'
+        # 'average_no_outliers', 'standard_deviation_no_outliers'columns with suffixes from 1 to 12
+        suffixes = [str(i) for i in range(1, 13)]
+        cols_to_repeat = ['average', 'average_percent_change', 'standard_deviation', 'min', 'max', 'upper_threshold_outliers', 
+                          'excluded_units', 'excluded_units_fraction', 'average_no_outliers', 'average_percent_change_no_outliers',
+                          'standard_deviation_no_outliers']
+        new_cols = [f"{col}{suffix}" for col in cols_to_repeat for suffix in suffixes]
+        new_cols = ['number_of_units'] + new_cols # also append 'number of units' to the list
+        
+        
+        ## iterate over all unique generator fuel types, adjusting the fuel prices if they exist in the avg_price_fuel_type dictionary
+        #  and collecting the metrics of each (fuel, purchase type) block
+        metrics_rows = {} # (fuel, purchase type) : flattened metrics row; purchase type is None for non-ng fuels
+        unlisted_rows = [] # rows of fuels that are not in the dictionary
+        f_iter = list(orispl_prices.fuel.unique()) # all types of unique fuels during this period
+        for fuel_type in f_iter:
+            if fuel_type not in avg_price_fuel_type:
+                units_not_in_dict = (orispl_prices["fuel"] == fuel_type).sum() # number of units with this fuel type
+                print(fuel_type + " is not in the dictionary of average fuel prices (" 
+                      + str(units_not_in_dict) + " units out of " + str(orispl_prices.shape[0])
+                      + " total units)")
+                unlisted_rows.append({'fuel': fuel_type, 'number_of_units': units_not_in_dict})
+                continue
+            elif fuel_type == 'ng':
+                blocks = [] # iterate over all contract types
+                for purchase_type in avg_price_fuel_type['ng']:
+                    # mask for units that have matching fuel type and contract type
+                    mask = (temp_orispl_prices["fuel"] == fuel_type) & (temp_orispl_prices["purchase_type"] == purchase_type)
+                    if purchase_type == 'other': # if other, retrieve all ng that are not the three purchase types
+                        mask = ((temp_orispl_prices["fuel"] == fuel_type) & (temp_orispl_prices["purchase_type"] != 'T') 
+                                & (temp_orispl_prices["purchase_type"] != 'S')  & (temp_orispl_prices["purchase_type"] != 'C'))
+                    if purchase_type == 'all': # if all (should be the only one in the list), apply to all ng
+                        mask = temp_orispl_prices["fuel"] == fuel_type
+                    blocks.append((purchase_type, avg_price_fuel_type['ng'][purchase_type], mask))
+            else:
+                # mask for units that have matching fuel type
+                blocks = [(None, avg_price_fuel_type[fuel_type], temp_orispl_prices["fuel"] == fuel_type)]
             
-            self.fuel_price_metrics = fuel_price_metrics # save metrics
-            orispl_prices = temp_orispl_prices.copy(deep=True) # copy over the new fuel prices
+            for purchase_type, average_counterfactual, mask in blocks:
+                prices = temp_orispl_prices.loc[mask, list(range(1, 13))].values.astype(float) # retrieve all price data to manipulate
+                metrics = outlier_metrics(prices, average_counterfactual)
+                row = {'number_of_units': mask.sum()}
+                row.update({f"{col}{suffix}": metrics[col][i] for col in cols_to_repeat for i, suffix in enumerate(suffixes)})
+                metrics_rows[(fuel_type, purchase_type)] = row
+                
+                ## perform shift
+                avg_ratio = average_counterfactual/metrics['average_no_outliers'] # new average/old average with outliers removed
+                temp_orispl_prices.loc[mask, list(range(1, 13))] = prices * avg_ratio
+                scale.loc[mask, list(range(1, 13))] = scale.loc[mask, list(range(1, 13))].values * avg_ratio
         
+        ## assemble fuel_price_metrics in one go: dictionary rows first (in dictionary order), then fuels not in the dictionary
+        rows = []
+        for fuel_type, purchase_type, average_counterfactual in tuple_list:
+            row = {'fuel': fuel_type, 'purchase_type': purchase_type, 'average_counterfactual': average_counterfactual}
+            row.update(metrics_rows.get((fuel_type, purchase_type if fuel_type == 'ng' else None), {}))
+            rows.append(row)
+        fuel_price_metrics = pandas.DataFrame(rows + unlisted_rows, columns=["fuel", "purchase_type", "average_counterfactual"] + new_cols)
+        
+        return scale, fuel_price_metrics
+
+
+    def weeklyFuelPrices(self, orispl_prices):
+        """ 
+        Converts monthly fuel prices to fuel prices per time period (e.g. weekly) and fills fuels without any EIA923 data with commodity prices
+        ---
+        orispl_prices : dataframe of monthly fuel prices for each orispl_unit (columns 1 to 12), as calculated in calcFuelPrices
+        returns : dataframe of 'orispl_unit' and fuel price columns for each time period of self.calendar (e.g. 'fuel_price1' to 'fuel_price52' for weeks)
+        """
+        orispl_prices = orispl_prices.copy(deep=True)
         #for any fuels that don't have EIA923 data at all (for all regions) we will use commodity price approximations from an excel file
-        #first we need to change orispl_prices from months to weeks
-        orispl_prices.columns = ['orispl_unit', 'orispl', 'fuel', 1, 5, 9, 14, 18, 22, 27, 31, 36, 40, 44, 48, 'quantity', 'purchase_type'] # weeks corresponding to months of year
+        #first we need to change orispl_prices from months to time periods
+        orispl_prices.columns = ['orispl_unit', 'orispl', 'fuel'] + self.calendar.monthPeriods() + ['quantity', 'purchase_type'] # time periods corresponding to months of year
         #numpy.array(orispl_prices.columns.difference(['orispl_unit', 'orispl', 'fuel', 'quantity', 'purchase_type']))
         test = orispl_prices.copy(deep=True)[['orispl_unit', 'orispl', 'fuel']] # remove weekly price columns
-        month_weeks = numpy.array(orispl_prices.columns.difference(['orispl_unit', 'orispl', 'fuel', 'quantity', 'purchase_type'])) # weeks corresponding to months of year
-        for c in numpy.arange(52)+1: # loop through all weeks
+        month_weeks = numpy.array(orispl_prices.columns.difference(['orispl_unit', 'orispl', 'fuel', 'quantity', 'purchase_type'])) # time periods corresponding to months of year
+        for c in self.calendar.periods: # loop through all time periods
             if c in month_weeks: # for weeks at first of month,
                 test['fuel_price'+ str(c)] = orispl_prices[c] # update price for week column
             else:
@@ -959,6 +999,7 @@ class generatorData(object):
         
         #now we add in the weekly fuel commodity prices ## NOTE: We don't update this data source but it affects <1% of all generators at most
         prices_fuel_commodity = self.fuel_commodity_prices 
+        commodity_weeks = periodCalendar(self.year).periodOf(self.calendar.startDates()) - 1 # row of the weekly commodity prices for each time period
         f_array = orispl_prices[orispl_prices['fuel_price1'].isna()].fuel.unique() # identify any remaining fuels with nan prices
         percNan = ((orispl_prices[orispl_prices['fuel_price1'].isna()].shape[0])
                        *100/orispl_prices.shape[0]) # percent of data that are outliers and will be removed
@@ -967,23 +1008,63 @@ class generatorData(object):
         else:
             print(str(percNan)+"% generators from "+self.ba_code+" have no EIA fuel price data")
         print("the fuels that need to be manually filled are "+', '.join(f_array))
+        fuel_price_cols = ['fuel_price' + str(c) for c in self.calendar.periods] # in time period order (columns.difference would sort them as strings: 1, 10, 11, ..., 2)
         for f in f_array:
-            l = len(orispl_prices.loc[orispl_prices.fuel==f, orispl_prices.columns.difference(['orispl_unit', 'orispl', 'fuel'])])
-            orispl_prices.loc[orispl_prices.fuel==f, orispl_prices.columns.difference(['orispl_unit', 'orispl', 'fuel'])] = numpy.tile(prices_fuel_commodity[f], (l,1)) # fill with commodity prices
+            l = len(orispl_prices.loc[orispl_prices.fuel==f, fuel_price_cols])
+            orispl_prices.loc[orispl_prices.fuel==f, fuel_price_cols] = numpy.tile(prices_fuel_commodity[f].values[commodity_weeks], (l,1)) # fill with commodity prices
         
-        #now we have orispl_prices, which has a weekly fuel price for each orispl_unit based mostly on EIA923 data with some commodity, national-level data from EIA to supplement
-        #now merge the fuel price columns into self.df
-        orispl_prices.drop(['orispl', 'fuel'], axis=1, inplace=True) 
-               
-        #save
-        self.df = self.df.merge(orispl_prices, on='orispl_unit', how='left') # we are left with weekly fuel prices for each generating unit in the df
+        #now we have orispl_prices, which has a fuel price for each time period and orispl_unit based mostly on EIA923 data with some commodity, national-level data from EIA to supplement
+        return orispl_prices.drop(['orispl', 'fuel'], axis=1)
+
+
+    def scaleFuelPrices(self, fuel_prices, scale):
+        """ 
+        Applies the monthly scale factors of shiftFuelPrices to fuel prices per time period, each time period taking the factor of its month (as in weeklyFuelPrices)
+        ---
+        fuel_prices : dataframe of 'orispl_unit' and fuel price columns for each time period (e.g. from weeklyFuelPrices, or self.df)
+        scale : dataframe of monthly scale factors of the units of self.orispl_prices (columns 1 to 12), from shiftFuelPrices
+        returns : copy of fuel_prices with the scaled fuel price columns. Units that are not in self.orispl_prices (the dummy generators) 
+            and fuels that are filled with commodity prices by weeklyFuelPrices are not scaled
+        """
+        fuel_price_cols = ['fuel_price'+str(c) for c in self.calendar.periods]
+        month = numpy.searchsorted(self.calendar.monthPeriods(), self.calendar.periods, side='right') - 1 # month (0 to 11) of each time period's fuel prices
+        factors = scale[list(range(1, 13))].values.astype(float)[:, month]
+        factors[self.orispl_prices.fuel.isin(self.orispl_prices.loc[self.orispl_prices[1].isna(), 'fuel']).values] = 1.0 # fuels with commodity prices
+        factors = pandas.DataFrame(factors, index=self.orispl_prices.orispl_unit.values, columns=fuel_price_cols).reindex(fuel_prices.orispl_unit.values, fill_value=1.0)
+        fuel_prices = fuel_prices.copy(deep=True)
+        fuel_prices[fuel_price_cols] = fuel_prices[fuel_price_cols].values * factors.values
+        return fuel_prices
+
+
+    def calcCounterfactualFuelPrices(self, avg_price_fuel_type_list):
+        """ 
+        Applies a list of counterfactual average fuel price scenarios to the fuel prices of self.df, scaling each unit's fuel price columns by the 
+        factors of shiftFuelPrices, so that fuel price sensitivity runs don't rebuild the generatorData (and re-read eGRID, EIA923, and CEMS) for every scenario
+        ---
+        avg_price_fuel_type_list : list of dictionaries of fuel types (and purchase type if natural gas) and average price, same format as avg_price_fuel_type
+        returns : list with one (fuel_prices, fuel_price_metrics) tuple per scenario, where fuel_prices is a dataframe of 'orispl_unit' and the scenario's 
+            fuel price columns with the index of self.df (e.g. df[fuel_prices.columns] = fuel_prices for a copy of self.df). 
+            An empty dictionary returns the unshifted fuel prices and fuel_price_metrics = None
+        NOTE: the real dollar adjustment needs the CPI file, so the generatorData must be created with CPI (and without avg_price_fuel_type, so that self.df has the actual fuel prices)
+        """
+        if bool(self.avg_price_fuel_type):
+            raise ValueError('the fuel prices of self.df are already shifted to avg_price_fuel_type, create the generatorData without it')
+        fuel_prices = self.df[['orispl_unit'] + ['fuel_price'+str(c) for c in self.calendar.periods]]
+        scenarios = []
+        for avg_price_fuel_type in avg_price_fuel_type_list:
+            if bool(avg_price_fuel_type): # execute only if dictionary is not empty
+                scale, fuel_price_metrics = self.shiftFuelPrices(self.orispl_prices, avg_price_fuel_type)
+                scenarios.append((self.scaleFuelPrices(fuel_prices, scale), fuel_price_metrics))
+            else:
+                scenarios.append((fuel_prices.copy(deep=True), None))
+        return scenarios
 
 
     def easiurDamages(self):
         """ 
         Adds EASIUR environmental damages for SO2 and NOx emissions for each power plant.
         ---
-        Adds one column for each week of the year to self.df that contains environmental damages in $/MWh for each generation unit calculated using the EASIURE method
+        Adds one column for each time period (e.g. week) of the year to self.df that contains environmental damages in $/MWh for each generation unit calculated using the EASIURE method
         """   
         print('Adding environmental damages...')
         #clean the easiur data
@@ -992,9 +1073,10 @@ class generatorData(object):
         df.columns = ['orispl', 'so2_dmg_win', 'so2_dmg_spr' , 'so2_dmg_sum', 'so2_dmg_fal', 'nox_dmg_win', 'nox_dmg_spr' , 'nox_dmg_sum', 'nox_dmg_fal']        
         #create empty dataframe to hold the results
         df2 = self.df.copy(deep=True)
-        #for each week, calculate the $/MWh damages for each generator based on its emissions rate (kg/MWh) and easiur damages ($/tonne)
-        for c in numpy.arange(52)+1:
-            season = scipy.where(((c>49) | (c<=10)), 'win', scipy.where(((c>10) & (c<=23)), 'spr', scipy.where(((c>23) & (c<=36)), 'sum', scipy.where(((c>36) & (c<=49)), 'fal', 'na')))) #define the season string
+        #for each time period, calculate the $/MWh damages for each generator based on its emissions rate (kg/MWh) and easiur damages ($/tonne). The season is set by the week the time period starts in
+        weeks = periodCalendar(self.year).periodOf(self.calendar.startDates())
+        for c, w in zip(self.calendar.periods, weeks):
+            season = scipy.where(((w>49) | (w<=10)), 'win', scipy.where(((w>10) & (w<=23)), 'spr', scipy.where(((w>23) & (w<=36)), 'sum', scipy.where(((w>36) & (w<=49)), 'fal', 'na')))) #define the season string
             df2['dmg' + str(c)] = (df2['so2' + str(c)] * df['so2' + '_dmg_' + str(season)] + df2['nox' + str(c)] * df['nox' + '_dmg_' + str(season)]) / 1e3
         #use the results to redefine the main generator DataFrame
         self.df = df2
@@ -1099,23 +1181,29 @@ class generatorData(object):
         df = df.merge(merge_orispl_unit, how='left', on=['orispl_unit']) # merge the fuel and fuel type data to CEMS
         df.loc[df.fuel.isna(), 'fuel'] = scipy.array(df[df.fuel.isna()].merge(merge_orispl, how='left', on=['orispl']).fuel_y) # fill in missing fuels for units with overall plant fuel
         df.loc[df.fuel_type.isna(), 'fuel_type'] = scipy.array(df[df.fuel_type.isna()].merge(merge_orispl, how='left', on=['orispl']).fuel_type_y) # do same for fuel types
+        #assign each CEMS row to a single fuel category (first match wins, in the order of the hist_dispatch mix columns); rows that match none are only counted in the totals
+        fuel_categories = [('coal_mix', (df.fuel_type=='coal') | (df.fuel=='SGC')),
+                           ('gas_mix', df.fuel_type=='gas'),
+                           ('oil_mix', df.fuel_type=='oil'),
+                           ('biomass_mix', (df.fuel_type=='biomass') | df.fuel.isin(['obs', 'wds', 'blq', 'msw', 'lfg', 'ab', 'obg', 'obl', 'slw'])),
+                           ('geothermal_mix', (df.fuel_type=='geothermal') | (df.fuel=='geo')),
+                           ('hydro_mix', (df.fuel_type=='hydro') | (df.fuel=='wat')),
+                           ('nuclear_mix', df.fuel=='nuc')]
+        df['fuel_category'] = numpy.select([mask for category, mask in fuel_categories], [category for category, mask in fuel_categories], default='other_mix')
+        #aggregate generation and emissions by date + hour + fuel category in one pass, then pivot the generation by fuel category
+        df = df.groupby(['date', 'hour', 'fuel_category'])[['mwh', 'co2_tot', 'so2_tot', 'nox_tot']].sum()
+        hourly = df.groupby(level=['date', 'hour']).sum() # totals over all fuel categories
+        hourly.columns = ['demand', 'co2_tot', 'so2_tot', 'nox_tot']
+        hourly = hourly.join(df.mwh.unstack('fuel_category')) # one generation column per fuel category
+        hourly.index = pandas.to_datetime(hourly.index.get_level_values('date') + ' ' + hourly.index.get_level_values('hour'), format='%m/%d/%Y %H') # key each row by its datetime
         #build the hist_dispatch dataframe
         #start with the datetime column # NOTE: can probably replace this column by just doing hourly increments between first and last times. The last week will just go on an extra few hours? (repeat midnight hours?)
         start_date_str = (self.df_cems.date.min()[-4:] + '-' + self.df_cems.date.min()[:5] + ' 00:00') 
         date_hour_count = len(self.df_cems.date.unique())*24#+1 # amount of hours in year
-        hist_dispatch = pandas.DataFrame(scipy.array([pandas.Timestamp(start_date_str) + datetime.timedelta(hours=i) for i in range(date_hour_count)]), columns=['datetime']) # builds time data for each hour of year 
-        #add columns by aggregating df by date + hour
-        hist_dispatch['demand'] = df.groupby(['date','hour'], as_index=False).sum().mwh
-        hist_dispatch['co2_tot'] = df.groupby(['date','hour'], as_index=False).sum().co2_tot # * 2000
-        hist_dispatch['so2_tot'] = df.groupby(['date','hour'], as_index=False).sum().so2_tot
-        hist_dispatch['nox_tot'] = df.groupby(['date','hour'], as_index=False).sum().nox_tot
-        hist_dispatch['coal_mix'] = df[(df.fuel_type=='coal') | (df.fuel=='SGC')].groupby(['date','hour'], as_index=False).sum().mwh
-        hist_dispatch['gas_mix'] = df[df.fuel_type=='gas'].groupby(['date','hour'], as_index=False).sum().mwh
-        hist_dispatch['oil_mix'] = df[df.fuel_type=='oil'].groupby(['date','hour'], as_index=False).sum().mwh
-        hist_dispatch['biomass_mix'] = df[(df.fuel_type=='biomass') | (df.fuel=='obs') | (df.fuel=='wds') | (df.fuel=='blq') | (df.fuel=='msw') | (df.fuel=='lfg') | (df.fuel=='ab') | (df.fuel=='obg') | (df.fuel=='obl') | (df.fuel=='slw')].groupby(['date','hour'], as_index=False).sum().mwh
-        hist_dispatch['geothermal_mix'] = df[(df.fuel_type=='geothermal') | (df.fuel=='geo')].groupby(['date','hour'], as_index=False).sum().mwh
-        hist_dispatch['hydro_mix'] = df[(df.fuel_type=='hydro') | (df.fuel=='wat')].groupby(['date','hour'], as_index=False).sum().mwh
-        hist_dispatch['nuclear_mix'] = df[df.fuel=='nuc'].groupby(['date','hour'], as_index=False).sum().mwh
+        hist_dispatch = pandas.DataFrame({'datetime': pandas.date_range(pandas.Timestamp(start_date_str), periods=date_hour_count, freq=datetime.timedelta(hours=1))}) # builds time data for each hour of year 
+        #add the aggregated columns, aligned to the hours by datetime; hours without any generation of a fuel category are 0
+        hist_columns = ['demand', 'co2_tot', 'so2_tot', 'nox_tot'] + [category for category, mask in fuel_categories]
+        hist_dispatch[hist_columns] = hourly.reindex(index=hist_dispatch.datetime, columns=hist_columns).values
         #hist_dispatch['production_cost'] = df[['date', 'hour', 'production_cost']].groupby(['date','hour'], as_index=False).sum().production_cost
         hist_dispatch.fillna(0, inplace=True) # if nan, is 0
         #fill in last line to equal the previous line
@@ -1132,28 +1220,32 @@ class generatorData(object):
         print('Calculating historical electricity prices...')
         #We will use FERC 714 data, where balancing authorities and similar entities report their locational marginal prices. 
         # This script pulls in those price for every reporting entity in the nerc region and takes the max price across the BAs/entities for each hour.
-        df = self.ferc714.copy(deep=True)
-        df_ids = self.ferc714_ids.copy(deep=True)
+        df = self.ferc714 # hourly panel with one row per respondent and hour
+        df_ids = self.ferc714_ids
         nerc_region = self.nerc
         year = self.year
         df_ids_bas = list(df_ids[df_ids.nerc == nerc_region].respondent_id.values) # balancing authorities in NERC region
-        #aggregate the price data by mean price per hour for any balancing authorities within the nerc region
-        df_bas = df[df.respondent_id.isin(df_ids_bas) & (df.report_yr==year)][
-            ['lambda_date', 'respondent_id', 'hour01', 'hour02', 'hour03', 'hour04', 'hour05', 'hour06', 'hour07', 
-             'hour08', 'hour09', 'hour10', 'hour11', 'hour12', 'hour13', 'hour14', 'hour15', 'hour16', 'hour17', 'hour18', 
-             'hour19', 'hour20', 'hour21', 'hour22', 'hour23', 'hour24']] # retrieves historical 24-hour prices for each day for the respondent authorities 
-        df_bas.drop(['respondent_id'], axis=1, inplace=True)
-        df_bas.columns = ['date',1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23,24]
-        df_bas_temp = pandas.melt(df_bas, id_vars=['date']) # makes each row-column price data point its own row; date and hour are reported alongside the price data in the row
-        df_bas_temp.date = df_bas_temp.date.str[0:-7] + (df_bas_temp.variable - 1).astype(str) + ':00' # assigns hours to the date variable
-        df_bas_temp['time'] = df_bas_temp.variable.astype(str) + ':00' # assigns hours using the hourly data column to the time column
-        df_bas_temp['datetime'] = pandas.to_datetime(df_bas_temp.date) # changes datetime back to date from a string
-        df_bas_temp.drop(columns=['date', 'variable', 'time'], inplace=True)
-        #aggregate by datetime
-        df_bas_temp = df_bas_temp.groupby('datetime', as_index=False).max() # takes max price of all of these
-        df_bas_temp.columns = ['datetime', 'price']        
-        #add the price column to self.hist_dispatch
-        self.hist_dispatch['gen_cost_marg'] = df_bas_temp.price 
+        #retrieve the historical hourly prices of the respondent authorities and take the max price of all of them for each hour
+        df_bas = df[df.respondent_id.isin(df_ids_bas) & (df.report_yr==year)]
+        prices = df_bas.groupby('datetime')['lambda'].max()
+        #add the price column to self.hist_dispatch, matched by datetime
+        self.hist_dispatch['gen_cost_marg'] = prices.reindex(self.hist_dispatch.datetime).values
+
+
+    def ferc714HourlyPanel(self, ferc714):
+        """ 
+        Converts the FERC 714 system lambda table (one row per respondent and day, with 24 hour columns) into an hourly long-format panel
+        ---
+        ferc714 : dataframe of FERC 714 part 2 schedule 6 data
+        returns : dataframe with one row per respondent and hour, sorted by respondent and datetime. columns for respondent_id, report_yr, datetime, and lambda ($/MWh)
+        """
+        hour_cols = ['hour%02d'%h for h in numpy.arange(24)+1]
+        dates = pandas.to_datetime(ferc714.lambda_date.str[0:-7]).values # date of each row; the time portion of lambda_date is dropped
+        panel = pandas.DataFrame({'respondent_id': numpy.repeat(ferc714.respondent_id.values, 24),
+                                  'report_yr': numpy.repeat(ferc714.report_yr.values, 24),
+                                  'datetime': numpy.repeat(dates, 24) + numpy.tile(numpy.arange(24) * numpy.timedelta64(1, 'h'), len(ferc714)), # hour01 is 00:00, hour24 is 23:00
+                                  'lambda': ferc714[hour_cols].values.ravel()}) # each row's 24 hourly prices in order
+        return panel.sort_values(['respondent_id', 'datetime'], kind='mergesort').reset_index(drop=True)
 
 
     def demandTimeSeries(self):
@@ -1222,34 +1314,40 @@ class generatorData(object):
 
     def calcMdtCoalEvents(self):
         """ 
-        Creates a dataframe of the start, end, and demand_threshold for each event in the demand data where we would expect a coal plant's minimum downtime constraint to kick in
+        Creates a dataframe of the start, end, and demand_threshold for each event in the demand data where we would expect a coal plant's minimum downtime constraint to kick in.
+        The demand data can have any time step (e.g. hourly CEMS data or 5-minute load traces): the minimum downtime window is converted from hours to rows with the time step 
+        of the datetime column, and the events start and end at real timestamps
         ---
         """                      
         mdt_coal_events = self.demand_data.copy()
         mdt_coal_events['indices'] = mdt_coal_events.index
+        step = pandas.to_datetime(mdt_coal_events.datetime).diff().median() / pandas.Timedelta(hours=1) if len(mdt_coal_events) > 1 else 1.0 # time step [hours]
+        w = int(round(self.coal_min_downtime / step)) if step > 0 else self.coal_min_downtime # minimum downtime window [rows]
         #find the integral from x to x+
-        mdt_coal_events['integral_x_xt'] = mdt_coal_events.demand[::-1].rolling(window=self.coal_min_downtime+1).sum()[::-1] # sum of demand between current hour and next X hours determined by min downtime
+        mdt_coal_events['integral_x_xt'] = mdt_coal_events.demand[::-1].rolling(window=w+1).sum()[::-1] # sum of demand between current hour and next X hours determined by min downtime
         #find the integral of a flat horizontal line extending from x
-        mdt_coal_events['integral_x'] = mdt_coal_events.demand * (self.coal_min_downtime+1) # flat integral from multiplying by min downtime
-        #find the integral under the minimum of the flat horizontal line and the demand curve
-        def d_forward_convex_integral(mdt_index):
-            try:
-                return scipy.minimum(scipy.repeat(mdt_coal_events.demand[mdt_index], (self.coal_min_downtime+1)), mdt_coal_events.demand[mdt_index:(mdt_index+self.coal_min_downtime+1)]).sum()
-            except:
-                return mdt_coal_events.demand[mdt_index]   
-        mdt_coal_events['integral_x_xt_below_x'] = mdt_coal_events.indices.apply(d_forward_convex_integral)
+        mdt_coal_events['integral_x'] = mdt_coal_events.demand * (w+1) # flat integral from multiplying by min downtime
+        #find the integral under the minimum of the flat horizontal line and the demand curve, one offset of the window at a time (nan demand adds 0)
+        d = mdt_coal_events.demand.values.astype('float64')
+        n = len(d)
+        below = numpy.zeros(n)
+        for k in range(min(w+1, n)):
+            below[:n-k] += numpy.nan_to_num(numpy.minimum(d[:n-k], d[k:]))
+        #the last rows, whose window runs past the end of the demand data, keep their own demand (and the very last row its flat integral), as before
+        below[max(n-w, 0):] = d[max(n-w, 0):]
+        if (n > 0) & (w > 0):
+            below[-1] = numpy.nan_to_num(d[-1]) * (w+1)
+        mdt_coal_events['integral_x_xt_below_x'] = below
         #find the integral of the convex portion below x_xt
         mdt_coal_events['integral_convex_portion_btwn_x_xt'] = mdt_coal_events['integral_x'] - mdt_coal_events['integral_x_xt_below_x']
-        #keep the convex integral only if x < 1.05*x+
-        def d_keep_convex(mdt_index):
-            try:
-                return int(mdt_coal_events.demand[mdt_index] <= 1.05*mdt_coal_events.demand[mdt_index + self.coal_min_downtime]) * mdt_coal_events.integral_convex_portion_btwn_x_xt[mdt_index]
-            except:
-                return mdt_coal_events.integral_convex_portion_btwn_x_xt[mdt_index]   
-        mdt_coal_events['integral_convex_filtered'] = mdt_coal_events.indices.apply(d_keep_convex)
+        #keep the convex integral only if x < 1.05*x+ (rows without a row w later keep the convex integral)
+        convex = mdt_coal_events.integral_convex_portion_btwn_x_xt.values
+        keep = numpy.ones(n)
+        keep[:max(n-w, 0)] = d[:max(n-w, 0)] <= 1.05*d[w:]
+        mdt_coal_events['integral_convex_filtered'] = keep * convex
         #mdt_coal_events['integral_convex_filtered'] = mdt_coal_events['integral_convex_filtered'].replace(0, scipy.nan)
         #keep any local maximums of the filtered convex integral
-        mdt_coal_events['local_maximum'] = ((mdt_coal_events.integral_convex_filtered== mdt_coal_events.integral_convex_filtered.rolling(window=int(self.coal_min_downtime/2+1), center=True).max()) & (mdt_coal_events.integral_convex_filtered != 0) & (mdt_coal_events.integral_x >= mdt_coal_events.integral_x_xt))
+        mdt_coal_events['local_maximum'] = ((mdt_coal_events.integral_convex_filtered== mdt_coal_events.integral_convex_filtered.rolling(window=int(w/2+1), center=True).max()) & (mdt_coal_events.integral_convex_filtered != 0) & (mdt_coal_events.integral_x >= mdt_coal_events.integral_x_xt))
         #spread the maximum out over the min downtime window
         mdt_coal_events = mdt_coal_events[mdt_coal_events.local_maximum]
         mdt_coal_events['demand_threshold'] = mdt_coal_events.demand
@@ -1265,7 +1363,8 @@ class generatorData(object):
 class bidStack(object):
     def __init__(self, gen_data_short, states_to_subset = [], co2_dol_per_kg=0.0, so2_dol_per_kg=0.0, nox_dol_per_kg=0.0, 
                  coal_dol_per_mmbtu=0.0, coal_capacity_derate = 0.0, time=1, dropNucHydroGeo=False, 
-                 include_min_output=True, initialization=True, coal_mdt_demand_threshold = 0.0, mdt_weight=0.50):
+                 include_min_output=True, initialization=True, coal_mdt_demand_threshold = 0.0, mdt_weight=0.50, outputs=None, 
+                 compress_tolerance=None, compress_relative=False, subset_state_totals=False):
         """ 
         1) Bring in the generator data created by the "generatorData" class.
         2) Calculate the generation cost for each generator and sort the generators by generation cost. Default emissions prices [$/kg] are 0.00 for all emissions.
@@ -1275,10 +1374,17 @@ class bidStack(object):
         co2 / so2 / nox_dol_per_kg : a tax on each amount of emissions produced by each generator. Impacts each generator's generation cost
         coal_dol_per_mmbtu : a tax (+) or subsidy (-) on coal fuel prices in $/mmbtu. Impacts each generator's generation cost
         coal_capacity_derate : fraction that we want to derate all coal capacity (e.g. 0.20 mulutiplies each coal plant's capacity by (1-0.20))
-        time : number denoting which time period we are interested in. Default is weeks, so time=15 would look at the 15th week of heat rate, emissions rates, and fuel prices
+        time : number denoting which time period we are interested in. Default is weeks, so time=15 would look at the 15th week of heat rate, emissions rates, and fuel prices. 
+            The time periods are set by the period_resolution of the generatorData (gen_data_short['period_resolution'], or inferred from the generator data columns), see self.calendar
         dropNucHydroGeo : if True, nuclear, hydro, and geothermal plants will be removed from the bidstack (e.g. to match CEMS data)
         include_min_output : if True, will include a representation of generators' minimum output constraints that impacts the marginal generators in the dispatch. So, a "True" value here is closer to the real world.
         initialization : if True, the bs object is being defined for the first time. This will trigger the generation of a dummy 0.0 demand generator to bookend the bottom of the merit order (in calcGenCost function) after which initialization will be set to False
+        outputs : list of dispatch result columns that will be needed (e.g. ['co2_tot', 'co2_marg', 'gen_cost_marg', 'coal_mix']). Only their full_xxx_base/_marg columns and interpolation functions are calculated. None calculates all of them
+        compress_tolerance : if not None, the Full total interpolation functions (e.g. f_totalCO2Full) are approximated with fewer breakpoints (see compressTotalInterpolationFunctionsFull). 
+            Either a maximum error for every output family or a dictionary of output family : maximum error (e.g. {'co2': 1000.0, 'gen_cost_tot': 500.0}). Families left out of the dictionary are not approximated
+        compress_relative : if True, compress_tolerance is a fraction of each total curve's largest absolute value (e.g. 0.001 for 0.1%) instead of an absolute error in the units of the curve
+        subset_state_totals : if True, the total emissions of states_to_subset are the sum of the per-state curves of self.state_totals, as for returnFullTotalValueStates. 
+            Otherwise they are built with the step construction of self.df_subset (see calcFullMeritOrder), which gives different totals
         """
         self.year = gen_data_short["year"] # year of run
         self.nerc = gen_data_short["nerc"] # NERC region
@@ -1288,6 +1394,7 @@ class bidStack(object):
         self.mdt_weight = mdt_weight
         self.df_0 = gen_data_short["df"] # all generators, their attributes, and their weekly heat throughputs, emission rates, capacity, and fuel prices
         self.df = self.df_0.copy(deep=True)
+        self.calendar = periodCalendar(self.year, gen_data_short.get("period_resolution", periodCalendar.inferResolution(self.df_0.columns))) # time periods of the year (e.g. weeks)
         self.states_to_subset = states_to_subset # states to subset from overall run
         self.co2_dol_per_kg = co2_dol_per_kg
         self.so2_dol_per_kg = so2_dol_per_kg
@@ -1297,6 +1404,11 @@ class bidStack(object):
         self.time = time # week to run
         self.include_min_output = include_min_output # whether to include minimum downtime constraint
         self.initialization = initialization
+        self.outputs = outputs # dispatch result columns to calculate, None for all of them
+        self.output_families = self.outputFamilies(outputs) # merit order column families needed for those outputs
+        self.compress_tolerance = compress_tolerance # maximum error of the compressed Full total interpolation functions, None to keep them exact
+        self.compress_relative = compress_relative
+        self.subset_state_totals = subset_state_totals # whether the subset totals are the sum of the per-state curves instead of the step construction
         if dropNucHydroGeo:
             self.dropNuclearHydroGeo()
         self.addFuelColor() # adds fuel color column to df_0 based on fuel type
@@ -1309,6 +1421,34 @@ class bidStack(object):
         self.processData()
 
 
+    def outputFamilies(self, outputs):
+        """ Returns the families of full_xxx_base/_marg merit order columns that are needed to calculate a list of dispatch result columns
+        ---
+        outputs : list of dispatch result columns (e.g. ['co2_tot', 'co2_marg', 'gen_cost_marg', 'coal_mix']), or None for all of them
+        returns : list of families in merit order column order (e.g. ['co2', 'coal_mix']). The marginal generator columns (gen_cost_marg, marg_gen_xxx) don't need any
+        """
+        fuels = ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass']
+        all_families = ['gen_cost_tot', 'co2', 'so2', 'nox'] + [fl + '_mix' for fl in fuels] + [fl + '_consumption' for fl in fuels]
+        if outputs is None:
+            return all_families
+        families = []
+        for o in outputs:
+            if o in ['gen_cost_marg', 'marg_gen'] or o.startswith('marg_gen_'): # marginal generator columns
+                continue
+            if o.startswith('mmbtu_'): # e.g. 'mmbtu_coal' -> 'coal_consumption'
+                family = o[len('mmbtu_'):] + '_consumption'
+            elif o.endswith('_marg'): # e.g. 'co2_marg' -> 'co2', 'coal_mix_marg' -> 'coal_mix'
+                family = o[:-len('_marg')]
+            elif o.endswith('_tot') and o != 'gen_cost_tot': # e.g. 'co2_tot' -> 'co2'
+                family = o[:-len('_tot')]
+            else: # 'gen_cost_tot', 'coal_mix', etc.
+                family = o
+            if family not in all_families:
+                raise ValueError(o + ' is not a dispatch result column')
+            families.append(family)
+        return [family for family in all_families if family in families]
+
+
     def dropNuclearHydroGeo(self):
         """ 
         Removes nuclear, hydro, and geothermal plants from self.df_0 (since they don't show up in CEMS)
@@ -1332,19 +1472,87 @@ class bidStack(object):
         ---
         """
         self.calcGenCost()  # calculates average generator cost based on VOM, fuel price, and any taxes on emissions
-        self.createTotalInterpolationFunctions() # creates interpolation functions 
+        self.processMeritOrder()
+    
+    
+    def processMeritOrder(self, start=None):
+        """ runs the functions of processData that come after the generators are sorted into the merit order by calcGenCost
+        ---
+        start : if not None, the merit order only changed from this position on (see updateUnits)
+        """
+        self.createTotalInterpolationFunctions(start=start) # creates interpolation functions 
         self.createMarginalPiecewise() # creates dataframe with original demand and shifted demand
         self.calcFullMeritOrder() # calculates base and marginal price, fuel use, and emissions for each unit
         self.createMarginalPiecewise() # do this again with FullMeritOrder so that it includes the new full_####_marg columns
         self.createTotalInterpolationFunctionsFull() # calculates interpolation function again
+        self.processed_state = (self.df_0, self.processParameters()) # generator data and parameters of the processed merit order, see updateTime
     
     
     def updateTime(self, t_new):
-        """ Updates self.time
+        """ Updates self.time and processes the merit order of time period t_new. If the generator attributes of t_new are the same as those of self.time 
+        (e.g. consecutive days that share a week of CEMS heat rates and a month of fuel prices), the processed merit order is relabelled to t_new instead (see relabelTime), 
+        which gives the same results. Changes to self.df_0 should be made with updateDf or updateUnits, which process the merit order again
         ---
+        t_new : time period (e.g. week 15)
+        returns : True if the merit order was relabelled, False if it was processed again
         """
+        if self.isProcessedFor(t_new):
+            self.relabelTime(t_new)
+            return True
         self.time = t_new
         self.processData()
+        return False
+    
+    
+    def processParameters(self):
+        """ Returns the parameters (other than the generator data and the time period) that the processed merit order depends on
+        """
+        return (self.co2_dol_per_kg, self.so2_dol_per_kg, self.nox_dol_per_kg, self.coal_dol_per_mmbtu, self.coal_capacity_derate, self.include_min_output, 
+                self.coal_mdt_demand_threshold, self.mdt_weight, self.output_families, self.compress_tolerance, self.compress_relative)
+    
+    
+    def isProcessedFor(self, t):
+        """ Returns True if the processed merit order of self.time is also the merit order of time period t: it was processed from the current self.df_0 
+        with the current parameters, processing it again would give the same dummy rows, and t has the same generator attributes as self.time
+        ---
+        t : time period (e.g. week 16)
+        """
+        state = getattr(self, 'processed_state', None)
+        if (state is None) or (state[0] is not self.df_0) or (state[1] != self.processParameters()) or (self.dummy_rows != self.initialization):
+            return False
+        cols, cols_t = self.periodColumns(self.time), self.periodColumns(t)
+        if [c[:-len(str(self.time))] for c in cols] != [c[:-len(str(t))] for c in cols_t]:
+            return False
+        return self.df_0[cols].set_axis(numpy.arange(len(cols)), axis=1).equals(self.df_0[cols_t].set_axis(numpy.arange(len(cols)), axis=1))
+    
+    
+    def relabelTime(self, t_new):
+        """ Renames the time period columns of the processed merit order from self.time to t_new (e.g. 'mw15' to 'mw16') and sets self.time to t_new, 
+        for a time period with the same generator attributes (see updateTime). The interpolation functions don't depend on the column names, so they are kept
+        ---
+        t_new : time period (e.g. week 16)
+        """
+        names = {c + str(self.time): c + str(t_new) for c in self.calendar.families}
+        self.df = self.df.rename(columns=names)
+        self.df_marg_piecewise = self.df_marg_piecewise.rename(columns=names)
+        if not self.df_0.columns.isin(list(names.values())).any(): # generator data of a single time period (e.g. the minimum downtime bidStacks of dispatch)
+            self.df_0 = self.df_0.rename(columns=names)
+            self.processed_state = (self.df_0, self.processed_state[1])
+        self.time = t_new
+    
+    
+    def periodColumns(self, t):
+        """ Returns the columns of self.df_0 with the generator attributes of time period t (e.g. 'mw15', 'heat_rate15', 'fuel_price15')
+        """
+        return [c + str(t) for c in self.calendar.families if c + str(t) in self.df_0.columns]
+    
+    
+    def unitColumns(self, t):
+        """ Returns the columns of self.df_0 without the generator attributes of the time periods other than t. The merit order of time period t only carries these, 
+        so copying and sorting it doesn't get slower with the number of time periods (e.g. 365 days)
+        """
+        other = set(c + str(p) for c in self.calendar.families for p in self.calendar.periods if str(p) != str(t))
+        return [c for c in self.df_0.columns if c not in other]
     
     
     def addFuelColor(self):
@@ -1362,12 +1570,24 @@ class bidStack(object):
         """ Calculate average costs that are function of generator data, fuel cost, and emissions prices.
         gen_cost ($/MWh) = (heat_rate * "fuel"_price) + (co2 * co2_price) + (so2 * so2_price) + (nox * nox_price) + vom 
         """
-        df = self.df_0.copy(deep=True)
+        self.sortMeritOrder(self.calcUnitCosts())
+        
+        
+    def calcUnitCosts(self, coal_adjustments=True, units=None):
+        """ Calculates each generator's fuel, emissions, and generation costs for self.time (the first part of calcGenCost), before the generators are sorted
+        ---
+        coal_adjustments : if False, the coal fuel prices and capacities are not adjusted by coal_dol_per_mmbtu and coal_capacity_derate (batchMeritOrders applies them itself)
+        units : index labels of the self.df_0 generators to calculate (e.g. the generators changed by updateUnits). If None, calculates all of them, adding the dummy rows the first time
+        returns : copy of self.df_0 (without the columns of the other time periods, see unitColumns) with 'fuel_cost', 'co2_cost', 'so2_cost', 'nox_cost', and 'gen_cost' columns
+        """
+        cols = self.unitColumns(self.time)
+        df = self.df_0[cols].copy(deep=True) if units is None else self.df_0.loc[units, cols].copy(deep=True)
         #pre-processing:
-        #adjust coal fuel prices by the "coal_dol_per_mmbtu" input
-        df.loc[df.fuel_type=='coal', 'fuel_price' + str(self.time)] = scipy.maximum(0, df.loc[df.fuel_type=='coal', 'fuel_price' + str(self.time)] + self.coal_dol_per_mmbtu)
-        #adjust coal capacity by the "coal_capacity_derate" input
-        df.loc[df.fuel_type=='coal', 'mw' + str(self.time)] = df.loc[df.fuel_type=='coal', 'mw' + str(self.time)] * (1.0 -  self.coal_capacity_derate)
+        if coal_adjustments:
+            #adjust coal fuel prices by the "coal_dol_per_mmbtu" input
+            df.loc[df.fuel_type=='coal', 'fuel_price' + str(self.time)] = scipy.maximum(0, df.loc[df.fuel_type=='coal', 'fuel_price' + str(self.time)] + self.coal_dol_per_mmbtu)
+            #adjust coal capacity by the "coal_capacity_derate" input
+            df.loc[df.fuel_type=='coal', 'mw' + str(self.time)] = df.loc[df.fuel_type=='coal', 'mw' + str(self.time)] * (1.0 -  self.coal_capacity_derate)
         #calculate the generation cost:
         df['fuel_cost'] = df['heat_rate' + str(self.time)] * df['fuel_price' + str(self.time)] 
         df['co2_cost'] = df['co2' + str(self.time)] * self.co2_dol_per_kg 
@@ -1378,14 +1598,38 @@ class bidStack(object):
         # #add a zero generator so that the bid stack goes all the way down to zero. This is important for calculating information for the 
         # marginal generator when the marginal generator is the first one in the bid stack.
         # df['dmg_easiur'] = df['dmg' + str(self.time)] # NOTE: EASIUR commented out because I (Eric) don't need it
-        if self.initialization:
-            dtype_dict = df.dtypes.to_dict() # to preserve data types
-            empty_row = df.loc[0]*0 # creates empty row
-            df = pandas.concat([df, empty_row.to_frame().T, empty_row.to_frame().T], axis=0, ignore_index=True) # appends 2 empty rows to dataframe
-            df = df.astype(dtype_dict) # re-casts columns to same types as original dataframe
-            self.initialization = False
-        df.sort_values('gen_cost', inplace=True)
+        if units is None:
+            self.dummy_rows = self.initialization # whether the merit order has the dummy rows, which updateUnits keeps
+            if self.initialization:
+                df = self.addDummyRows(df)
+                self.initialization = False
+        return df
+    
+    
+    def addDummyRows(self, df):
+        """ Appends 2 empty (all zero) generators to the generator data and relabels the rows 0, 1, 2, ...
+        ---
+        df : dataframe of generators and their costs from calcUnitCosts
+        """
+        dtype_dict = df.dtypes.to_dict() # to preserve data types
+        empty_row = df.loc[0]*0 # creates empty row
+        df = pandas.concat([df, empty_row.to_frame().T, empty_row.to_frame().T], axis=0, ignore_index=True) # appends 2 empty rows to dataframe
+        df = df.astype(dtype_dict) # re-casts columns to same types as original dataframe
+        return df
+    
+    
+    def sortMeritOrder(self, df, order=None):
+        """ Sorts the generators by generation cost and calculates the cumulative demand of the merit order (the second part of calcGenCost). Sets self.df
+        ---
+        df : dataframe of generators and their costs from calcUnitCosts
+        order : positions of the rows of df in increasing gen_cost order (e.g. from an argsort of gen_cost). If None, df is sorted by its gen_cost column
+        """
+        if order is None:
+            df.sort_values('gen_cost', inplace=True)
+        else:
+            df = df.take(order)
         #move coal_0 and ngcc_0 to the front of the merit order regardless of their gen cost
+        self.lead_units = [df.iloc[0].orispl_unit, df.loc[0].orispl_unit, 'coal_0', 'ngcc_0'] # units whose changes updateUnits can't splice in
         coal_0_ind = df[df.orispl_unit=='coal_0'].index[0]
         ngcc_0_ind = df[df.orispl_unit=='ngcc_0'].index[0]
         df = pandas.concat([df.iloc[[0],:], df[df.orispl_unit=='coal_0'], df[df.orispl_unit=='ngcc_0'], df.drop([0, coal_0_ind, ngcc_0_ind], axis=0)], axis=0)
@@ -1399,6 +1643,385 @@ class bidStack(object):
         self.df = df  
         
         
+    def updateUnits(self, changed=None, added=None, removed=None):
+        """ Applies a small set of generator changes to self.df_0 and to the current merit order without re-sorting the whole fleet (e.g. counterfactual fuel prices 
+        for a few units, retired units, or inserted coal units). The changed and added generators are spliced into the sorted merit order, and the cumulative demand 
+        columns and cumulative totals are only recalculated from the first position that changed. The full_xxx columns and interpolation functions are then recalculated 
+        as in processMeritOrder. The result is the same as sorting the whole fleet again; if the changes touch the front of the merit order (the cheapest unit, coal_0, ngcc_0) 
+        or tie with another generator's gen_cost, the whole fleet is sorted again instead
+        ---
+        changed : dataframe of changed generators with an 'orispl_unit' column and the self.df_0 columns to change (e.g. 'fuel_price30', 'mw30', 'co2' + str(time))
+        added : dataframe of new generators with the same columns as self.df_0 ('fuel_color' is optional)
+        removed : list of orispl_units to remove
+        returns : True if the changes were spliced into the merit order, False if the whole fleet was sorted again
+        """
+        changed = pandas.DataFrame(columns=['orispl_unit']) if changed is None else changed
+        added = pandas.DataFrame(columns=self.df_0.columns) if added is None else added
+        removed = [] if removed is None else list(removed)
+        #update the generator data
+        df_0 = self.df_0.copy()
+        labels = pandas.Series(df_0.index, index=df_0.orispl_unit.values) # orispl_unit : index label
+        for units in [list(changed.orispl_unit), removed]:
+            if (not pandas.Index(units).isin(labels.index).all()) or labels.index[labels.index.isin(units)].duplicated().any() or pandas.Index(units).duplicated().any():
+                raise ValueError('changed and removed units must each match one orispl_unit of the generator data')
+        if added.orispl_unit.isin(labels.index).any() or added.orispl_unit.duplicated().any():
+            raise ValueError('added units must have new orispl_units')
+        if not set(changed.columns).issubset(df_0.columns):
+            raise ValueError('changed columns must be columns of the generator data')
+        if not set(df_0.columns).difference(['fuel_color']).issubset(added.columns):
+            raise ValueError('added units must have all of the columns of the generator data')
+        changed_labels = list(labels[changed.orispl_unit].values)
+        for col in changed.columns.drop('orispl_unit'):
+            df_0.loc[changed_labels, col] = changed[col].values
+        added = added.copy()
+        added.index = pandas.RangeIndex(df_0.index.max() + 1, df_0.index.max() + 1 + len(added))
+        if 'fuel_color' in df_0.columns and 'fuel_color' not in added.columns: # same colors as addFuelColor
+            c = {'gas':'#888888', 'coal':'#bf5b17', 'oil':'#252525' , 'nuclear':'#984ea3', 'hydro':'#386cb0', 'biomass':'#7fc97f', 'geothermal':'#e31a1c', 'ofsl': '#c994c7'}
+            added['fuel_color'] = added.fuel_type.map(c).fillna('#bcbddc')
+        if len(added) > 0:
+            df_0 = pandas.concat([df_0, added[df_0.columns]], axis=0).astype(df_0.dtypes.to_dict())
+        df_0 = df_0.drop(labels[removed].values, axis=0)
+        self.df_0 = df_0
+        #generation costs of the changed and added units
+        new_units = self.calcUnitCosts(units=changed_labels + list(added.index))
+        new_units = new_units.iloc[numpy.argsort(new_units.gen_cost.values, kind='stable')]
+        new_cost = new_units.gen_cost.values
+        #rows of the current merit order after the front rows (the cheapest unit, coal_0, and ngcc_0), without the changed and removed units
+        old = self.df
+        t = str(self.time)
+        old_cost = old.gen_cost.values
+        kept = numpy.arange(3, len(old))[~old.orispl_unit.iloc[3:].isin(list(changed.orispl_unit) + removed).values]
+        ins = numpy.searchsorted(old_cost[kept], new_cost) # position of each new unit among the kept rows
+        touches_front = bool(set(self.lead_units).intersection(list(changed.orispl_unit) + removed + list(added.orispl_unit)))
+        ties = (numpy.isnan(new_cost).any() or (new_cost <= old_cost[0]).any() or (numpy.diff(new_cost) == 0).any() 
+                or (old_cost[kept][numpy.minimum(ins, len(kept)-1)] == new_cost).any() or (old_cost[kept][numpy.maximum(ins-1, 0)] == new_cost).any())
+        if touches_front or ties or len(kept) == 0:
+            #sort the whole fleet again
+            self.initialization = self.dummy_rows # so that calcUnitCosts adds the dummy rows again if the merit order has them
+            df = self.calcUnitCosts()
+            self.sortMeritOrder(df)
+            self.processMeritOrder()
+            return False
+        #splice the new units into the merit order: positions of old rows are 0..len(old)-1 and the new units follow them
+        order = numpy.insert(numpy.append(numpy.arange(3), kept), ins + 3, len(old) + numpy.arange(len(new_units)))
+        cols = list(new_units.columns) + ['demand', 'f', 's', 'a']
+        df = pandas.concat([old[cols], new_units.reindex(columns=cols)], axis=0, ignore_index=True).take(order).reset_index(drop=True)
+        df = df.astype(old[cols].dtypes.to_dict())
+        #first position that changed. The old last row also changes because it holds the extra 1000000 MW
+        same = order[:min(len(order), len(old))] == numpy.arange(min(len(order), len(old)))
+        start = min(int(numpy.argmin(same)) if not same.all() else len(same), len(old) - 1)
+        #cumulative demand columns from start on, same as sortMeritOrder
+        demand = self.patchCumsum(old.demand.values, df['mw' + t].values[start:], start)
+        demand[-1] = demand[-1] + 1000000
+        df['demand'] = demand
+        df['f'] = df['demand']
+        df['s'] = numpy.append(0, demand[0:-1])
+        df.loc[start:, 'a'] = numpy.maximum(df.s.values[start:] - df.min_out.values[start:]*10.0, 1.0)
+        self.df = df
+        self.processMeritOrder(start=start)
+        return True
+    
+    
+    def sweepParameters(self, co2_dol_per_kg=None, so2_dol_per_kg=None, nox_dol_per_kg=None, coal_dol_per_mmbtu=None, coal_capacity_derate=None):
+        """ Broadcasts the parameters of a scenario sweep together into a table with one row per scenario
+        ---
+        co2 / so2 / nox_dol_per_kg : arrays (or scalars) of emissions prices [$/kg]
+        coal_dol_per_mmbtu : array (or scalar) of coal fuel taxes (+) or subsidies (-) [$/mmbtu]
+        coal_capacity_derate : array (or scalar) of coal capacity derates (e.g. 0.20)
+        None uses the bidStack's own value. The arrays are broadcast together, so e.g. coal_dol_per_mmbtu=taxes[:, None] and coal_capacity_derate=derates[None, :] 
+        give every (tax, derate) pair of a grid
+        returns : dataframe with one column per parameter and one row per scenario (the index is the scenario number)
+        """
+        params = {'co2_dol_per_kg': co2_dol_per_kg, 'so2_dol_per_kg': so2_dol_per_kg, 'nox_dol_per_kg': nox_dol_per_kg, 
+                  'coal_dol_per_mmbtu': coal_dol_per_mmbtu, 'coal_capacity_derate': coal_capacity_derate}
+        arrays = numpy.broadcast_arrays(*[numpy.asarray(getattr(self, k) if v is None else v, dtype='float64') for k, v in params.items()])
+        scenarios = pandas.DataFrame({k: a.ravel() for k, a in zip(params.keys(), arrays)})
+        scenarios.index.name = 'scenario'
+        return scenarios
+    
+    
+    def ensembleMultipliers(self, n_members, seed=0, fuel_price_sd=0.10, heat_rate_sd=0.02, emissions_sd=0.05, vom_sd=0.20):
+        """ Samples the perturbations of the members of a Monte Carlo ensemble as lognormal multipliers with a mean of 1.0. Fuel prices are perturbed per fuel type 
+        (one commodity price shock per member), and heat rates, emissions rates (per emissions type), and VOM per generator. Each family of parameters has its own random stream 
+        spawned from seed, and member i always gets the same draws whatever n_members is, so the ensemble is reproducible and can be extended
+        ---
+        n_members : number of ensemble members
+        seed : seed of the random streams
+        fuel_price_sd, heat_rate_sd, emissions_sd, vom_sd : standard deviations of the logarithms of the multipliers (e.g. 0.10 for about 10%)
+        returns : dictionary of 'fuel_price', 'heat_rate', 'co2', 'so2', 'nox', or 'vom' : array of multipliers with one row per generator of self.df_0 and one column per member
+        """
+        families = [('fuel_price', fuel_price_sd), ('heat_rate', heat_rate_sd), ('co2', emissions_sd), ('so2', emissions_sd), ('nox', emissions_sd), ('vom', vom_sd)]
+        streams = numpy.random.SeedSequence(seed).spawn(len(families))
+        fuel_codes, fuels = pandas.factorize(self.df_0.fuel_type) # nan fuel types are coded as -1, the last row of the fuel draws
+        multipliers = {}
+        for (name, sd), stream in zip(families, streams):
+            size = len(fuels) + 1 if name == 'fuel_price' else len(self.df_0)
+            z = numpy.random.default_rng(stream).standard_normal((n_members, size)).T # draws of member i don't depend on n_members
+            multipliers[name] = numpy.exp(sd * z - sd**2 / 2.0)
+        multipliers['fuel_price'] = multipliers['fuel_price'][fuel_codes]
+        return multipliers
+    
+    
+    def batchUnits(self, time=None, multipliers=None, dummy_rows=False):
+        """ Prepares the generator data of a time period once for batchMeritOrders, which builds the merit orders of a whole batch of scenarios (see sweepParameters) 
+        or ensemble members (see ensembleMultipliers) together. The generator attributes that can differ between the merit orders are 2-d arrays with one row per generator 
+        and one column per merit order, or a single column shared by all of them
+        ---
+        time : time period (e.g. week 15). If None, uses self.time
+        multipliers : dictionary from ensembleMultipliers. If not None, the fuel prices, heat rates, emissions rates, and VOM get one column per member. 
+            Emissions rates are perturbed by both the heat rate and the emissions multipliers
+        dummy_rows : if True, the 2 empty generators of addDummyRows are added at the end
+        returns : dictionary of 'time', 'df' (the generators from calcUnitCosts without the coal adjustments, for the columns that the merit orders share), 
+            'dummy_rows' (number of empty generators at the end of df), and 'mw', 'fuel_price', 'heat_rate', 'co2', 'so2', 'nox', 'vom', 'min_out', 'min_out_multiplier' : 2-d array
+        """
+        bs_t = copy.copy(self)
+        if time is not None:
+            bs_t.time = time
+        t = str(bs_t.time)
+        bs_t.initialization = dummy_rows
+        df = bs_t.calcUnitCosts(coal_adjustments=False)
+        units = {'time': bs_t.time, 'df': df, 'dummy_rows': 2 if dummy_rows else 0}
+        for name in ['mw', 'fuel_price', 'heat_rate', 'co2', 'so2', 'nox', 'vom', 'min_out', 'min_out_multiplier']:
+            units[name] = df[name + t if name + t in df.columns else name].values.astype('float64')[:, None]
+        if multipliers is not None:
+            n = multipliers['vom'].shape[1]
+            def rows(name): # multipliers of the rows of df: the dummy rows at the end are all zero, so they are not perturbed
+                return numpy.vstack([multipliers[name], numpy.ones((len(df) - len(multipliers[name]), n))])
+            units['fuel_price'] = units['fuel_price'] * rows('fuel_price')
+            for e in ['co2', 'so2', 'nox']:
+                units[e] = units[e] * rows('heat_rate') * rows(e)
+            units['heat_rate'] = units['heat_rate'] * rows('heat_rate')
+            units['vom'] = units['vom'] * rows('vom')
+        return units
+    
+    
+    def batchMeritOrders(self, units, params, coal_mdt_demand_threshold=None, families=None):
+        """ Builds the merit orders of a batch of scenarios or ensemble members together as 2-d arrays, with one row per position in the merit order and one column per merit order. 
+        This is the batched version of calcUnitCosts, sortMeritOrder, and processMeritOrder: the coal adjustments and generation costs of every (generator, merit order) pair 
+        are calculated as matrices and argsorted per column, and the cumulative totals, the minimum output blending of calcFullMeritOrder, and the Full total curves 
+        are calculated for all of the columns at once. Each column gives the same results as a bidStack with the column's generator data and parameters. 
+        The Full total curves are kept exact (compress_tolerance is not applied)
+        ---
+        units : dictionary from batchUnits (or dispatch.createMdtCoalUnits)
+        params : dictionary of 'co2_dol_per_kg', 'so2_dol_per_kg', 'nox_dol_per_kg', 'coal_dol_per_mmbtu', 'coal_capacity_derate' : array with one value per merit order (e.g. from sweepParameters)
+        coal_mdt_demand_threshold : array with the coal minimum downtime demand threshold of each merit order. None uses self.coal_mdt_demand_threshold for all of them
+        families : output families to calculate (see outputFamilies). None uses self.output_families
+        returns : dictionary (a batch of merit orders) for returnBatchMetrics, returnBatchStates, and returnBatchSensitivities
+        """
+        df = units['df']
+        co2_price, so2_price, nox_price, coal_tax, coal_derate = [numpy.asarray(params[k], dtype='float64') for k in 
+                                                                  ['co2_dol_per_kg', 'so2_dol_per_kg', 'nox_dol_per_kg', 'coal_dol_per_mmbtu', 'coal_capacity_derate']]
+        k = len(co2_price)
+        if coal_mdt_demand_threshold is None:
+            coal_mdt_demand_threshold = numpy.full(k, self.coal_mdt_demand_threshold, dtype='float64')
+        #coal fuel price and capacity and generation cost of each generator (rows) in each merit order (columns), calculated the same way as calcUnitCosts
+        is_coal = (df.fuel_type == 'coal').values[:, None]
+        costs = {'fuel_price': numpy.where(is_coal, numpy.maximum(0, units['fuel_price'] + coal_tax), units['fuel_price']), 
+                 'mw': numpy.where(is_coal, units['mw'] * (1.0 - coal_derate), units['mw'])}
+        costs['fuel_cost'] = units['heat_rate'] * costs['fuel_price']
+        for e, price in zip(['co2', 'so2', 'nox'], [co2_price, so2_price, nox_price]):
+            costs[e + '_cost'] = units[e] * price
+        with numpy.errstate(all='ignore'): # to suppress warnings
+            gen_cost = numpy.maximum(0.01, costs['fuel_cost'] + costs['co2_cost'] + costs['so2_cost'] + costs['nox_cost'] + units['vom'])
+        if units['dummy_rows'] > 0: # the dummy rows keep their zero generation cost (see addDummyRows)
+            gen_cost[-units['dummy_rows']:] = df.gen_cost.values[-units['dummy_rows']:, None]
+        costs['gen_cost'] = gen_cost
+        #merit order of each column, same sort as sortMeritOrder: the cheapest generator, coal_0, ngcc_0, then the rest without the generator labelled 0
+        order = numpy.argsort(gen_cost, axis=0, kind='quicksort')
+        front = [df.index.get_loc(0), numpy.flatnonzero(df.orispl_unit.values == 'coal_0')[0], numpy.flatnonzero(df.orispl_unit.values == 'ngcc_0')[0]]
+        rest = order.T[~numpy.isin(order.T, front)].reshape(k, -1).T
+        order = numpy.vstack([order[:1], numpy.tile(numpy.array(front[1:])[:, None], (1, k)), rest])
+        batch = {'units': units, 'costs': costs, 'order': order, 'columns': {}, 'families': self.output_families if families is None else families}
+        #cumulative demand columns, same as sortMeritOrder
+        mw = self.batchColumn(batch, 'mw')
+        demand = self.batchCumsum(mw)
+        demand[-1] = demand[-1] + 1000000
+        batch['demand'] = demand
+        batch['s'] = numpy.vstack([numpy.zeros((1, k)), demand[:-1]])
+        batch['a'] = numpy.maximum(batch['s'] - self.batchColumn(batch, 'min_out')*10.0, 1.0)
+        #piecewise merit order of createMarginalPiecewise: each generator's value holds from 0.1 MW below its cumulative demand to 0.1 MW below the next generator's
+        x = numpy.empty((2*len(demand), k))
+        x[0] = demand[0] - 0.1
+        x[1::2] = demand - 0.1
+        x[2::2] = (demand[:-1] + 0.1) - 0.1
+        batch['piecewise'] = x
+        #cumulative totals, same as createTotalInterpolationFunctions
+        is_coal = self.batchColumn(batch, 'is_coal')
+        totals, totals_coal = {}, {}
+        if 'gen_cost_tot' in batch['families']:
+            totals['gen_cost_tot'] = self.batchCumsum(mw * self.batchColumn(batch, 'gen_cost'))
+        for e in ['co2', 'so2', 'nox']:
+            if e in batch['families']:
+                totals[e] = self.batchCumsum(mw * self.batchColumn(batch, e))
+                totals_coal[e] = self.batchCumsum(mw * self.batchColumn(batch, e) * is_coal)
+        total_coal = self.batchCumsum(is_coal * mw)
+        for fl in ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass']:
+            if fl + '_mix' in batch['families']:
+                totals[fl + '_mix'] = total_coal if fl == 'coal' else self.batchCumsum(self.batchColumn(batch, 'is_' + fl) * mw)
+            if fl + '_consumption' in batch['families']:
+                totals[fl + '_consumption'] = self.batchCumsum(self.batchColumn(batch, 'is_' + fl) * self.batchColumn(batch, 'heat_rate') * mw)
+        for family in ['coal_mix', 'coal_consumption']:
+            if family in batch['families']:
+                totals_coal[family] = totals[family]
+        self.calcBatchFullMeritOrder(batch, totals, totals_coal, total_coal, coal_mdt_demand_threshold)
+        return batch
+    
+    
+    def batchColumn(self, batch, name):
+        """ Returns a column of the merit orders of a batch from batchMeritOrders, with one row per position in the merit order and one column per merit order
+        ---
+        batch : dictionary from batchMeritOrders
+        name : column header of the merit order without the time value (e.g. 'gen_cost', 'co2', 'is_coal', 'fuel_type', 'full_co2_marg')
+        returns : 2-d array
+        """
+        if name in ['demand', 'f', 's', 'a']:
+            return batch['demand' if name == 'f' else name]
+        if name not in batch['columns']:
+            units = batch['units']
+            if name in batch['costs']:
+                values = batch['costs'][name]
+            elif name in units: # generator data from batchUnits
+                values = units[name]
+            else:
+                values = units['df'][name].values[:, None]
+            if values.shape[1] == 1:
+                batch['columns'][name] = values[:, 0][batch['order']]
+            else:
+                batch['columns'][name] = numpy.take_along_axis(values, batch['order'], axis=0)
+        return batch['columns'][name]
+    
+    
+    def batchCumsum(self, values):
+        """ Cumulative sum of each column in merit order. Gives the same result as pandas' cumsum (nan values are skipped and kept as nan)
+        ---
+        values : 2-d array
+        """
+        values = numpy.asarray(values, dtype='float64')
+        nan = numpy.isnan(values)
+        cumsum = numpy.cumsum(numpy.where(nan, 0.0, values), axis=0)
+        cumsum[nan] = numpy.nan
+        return cumsum
+    
+    
+    def calcBatchFullMeritOrder(self, batch, totals, totals_coal, total_coal, coal_mdt_demand_threshold):
+        """ The batched version of calcFullMeritOrder and createTotalInterpolationFunctionsFull: calculates the full_xxx_base and full_xxx_marg columns and the Full total curves 
+        of the merit orders of a batch, with the same arithmetic. Also prepares the per-state increases of createStateTotals (and the subset curves of self.states_to_subset unless self.subset_state_totals)
+        ---
+        batch : dictionary from batchMeritOrders, which this function completes
+        totals, totals_coal : dictionary of output family : 2-d array of its cumulative total (from all of the units, and from coal units only)
+        total_coal : 2-d array of the cumulative coal generation, for the minimum downtime weights
+        coal_mdt_demand_threshold : array with the coal minimum downtime demand threshold of each merit order
+        """
+        demand, s, a = batch['demand'], batch['s'], batch['a']
+        f = demand
+        families = batch['families']
+        #numeric marginal generator columns at s, with one search of the piecewise merit order for all of them
+        names = ['min_out'] if self.include_min_output else []
+        if any(family.endswith('_consumption') for family in families):
+            names.append('heat_rate')
+        names += ['gen_cost' if family == 'gen_cost_tot' else family if family in ['co2', 'so2', 'nox'] else 'is_' + family.rsplit('_', 1)[0] for family in families]
+        names = list(dict.fromkeys(names))
+        marginal = dict(zip(names, self.returnBatchMarginal(batch, s, names)))
+        #cumulative totals at s, a, f, and the demand threshold, with one search each
+        threshold = coal_mdt_demand_threshold[None, :]
+        total_f, total_threshold = self.interpTotals(batch, f, [total_coal]), self.interpTotals(batch, threshold, [total_coal])
+        temp = total_f[0] - total_threshold[0] # coal generation below each unit's full load, less the coal generation below the threshold
+        binary_demand_is_below_demand_threshold = (numpy.maximum(0, - numpy.where(numpy.isnan(temp), 0, temp)) > 0).astype(int) # calcs if min downtime
+        weight_marginal_unit = (1-self.mdt_weight) + self.mdt_weight*(1-binary_demand_is_below_demand_threshold) # calcs min downtime weight
+        weight_mindowntime_units = 1 - weight_marginal_unit
+        coal_mw_mindowntime = numpy.maximum(0, - temp) # coal MW held at minimum output by the minimum downtime constraint
+        total_s = dict(zip(families, self.interpTotals(batch, s, [totals[family] for family in families])))
+        if self.include_min_output:
+            total_a = dict(zip(families, self.interpTotals(batch, a, [totals[family] for family in families])))
+        coal_families = [family for family in families if family in totals_coal and family != 'gen_cost_tot']
+        coal_f = dict(zip(coal_families, self.interpTotals(batch, f, [totals_coal[family] for family in coal_families])))
+        coal_threshold = dict(zip(coal_families, self.interpTotals(batch, threshold, [totals_coal[family] for family in coal_families])))
+        batch['full'] = {} # output family : 2-d array of the Full total curve
+        with numpy.errstate(all='ignore'): # divisions by zero are filled below
+            min_out_share = self.batchColumn(batch, 'min_out') / (f-s) # share of the unit's capacity that is minimum output
+            for family in families:
+                #rate of the marginal unit: gen_cost [$/MWh], emissions [kg/MWh], is_fuel [-], or is_fuel * heat_rate [mmBtu/MWh]
+                if family == 'gen_cost_tot':
+                    rate = base_rate = marginal['gen_cost']
+                elif family in ['co2', 'so2', 'nox']:
+                    rate = base_rate = marginal[family]
+                elif family.endswith('_mix'):
+                    rate = marginal['is_' + family[:-len('_mix')]]
+                    base_rate = self.batchColumn(batch, 'is_' + family[:-len('_mix')])
+                else:
+                    rate = marginal['is_' + family[:-len('_consumption')]] * marginal['heat_rate']
+                    base_rate = self.batchColumn(batch, 'is_' + family[:-len('_consumption')]) * marginal['heat_rate']
+                if self.include_min_output:
+                    base = 0.1*total_a[family] + 0.9*total_s[family] + base_rate * marginal['min_out']
+                    marg = (total_s[family] - total_a[family]) / (s-a) * min_out_share + rate * (1 - min_out_share)
+                    marg = numpy.where(numpy.isnan(marg), 0.0, marg)
+                else:
+                    base = total_s[family]
+                    marg = rate
+                if family != 'gen_cost_tot': # production cost has no minimum downtime weighting
+                    marg = marg * weight_marginal_unit
+                    if family in coal_f:
+                        mdt_rate = numpy.maximum(0, - (coal_f[family] - coal_threshold[family])) / coal_mw_mindowntime
+                        mdt_rate = numpy.where(numpy.isnan(mdt_rate) | (mdt_rate == numpy.inf), 0.0, mdt_rate)
+                        marg = marg + mdt_rate * weight_mindowntime_units
+                batch['columns']['full_' + family + '_base'] = base
+                batch['columns']['full_' + family + '_marg'] = marg
+                batch['full'][family] = base + (demand - s) * marg
+        if self.states_to_subset != [] and not self.subset_state_totals:
+            self.calcBatchSubset(batch)
+        #per-state increases of the Full total emissions curves, for returnBatchStates (see createStateTotals)
+        codes, states = pandas.factorize(batch['units']['df'].state.fillna('').values) # the dummy rows have '' as their state
+        batch['state_codes'] = codes[batch['order']]
+        batch['state_index'] = pandas.Index(states)
+        batch['state_increase'] = {}
+        for e in ['co2', 'so2', 'nox']:
+            if e in families:
+                increase = numpy.diff(batch['full'][e], axis=0, prepend=0.0) # the first generator holds the value at the start of the merit order
+                batch['state_increase'][e] = numpy.where(numpy.isnan(increase), 0.0, increase)
+    
+    
+    def calcBatchSubset(self, batch):
+        """ The batched version of the subset steps of calcFullMeritOrder and of the subset functions of createTotalInterpolationFunctionsFull (unless self.subset_state_totals): 
+        builds the Full total emissions curves of the units in self.states_to_subset for each merit order of a batch. Each column keeps its own rows of the merit order, so the curves are padded at the end
+        ---
+        batch : dictionary from batchMeritOrders
+        """
+        demand, s = batch['demand'], batch['s']
+        k = demand.shape[1]
+        units = batch['units']['df'].state.isin(self.states_to_subset).values
+        mask = units[batch['order']] # subset units in states we want
+        after = numpy.vstack([numpy.zeros((1, k), dtype=bool), mask[:-1]]) # rows directly after subset unit rows
+        base, marg = {}, {}
+        emissions_subset = [e for e in ['co2', 'so2', 'nox'] if e in batch['families']]
+        for e in emissions_subset:
+            # 1. set X-marg to 0 for non-subset units
+            marg[e] = numpy.where(mask, self.batchColumn(batch, 'full_' + e + '_marg'), 0.0)
+            # 2.-6. X-base = cumulative sum of the increases of X-base at the rows directly after subset unit rows
+            full_base = self.batchColumn(batch, 'full_' + e + '_base')
+            shifted = numpy.vstack([numpy.zeros((1, k)), full_base[:-1]])
+            temp = full_base - numpy.where(numpy.isnan(shifted), 0.0, shifted)
+            base[e] = self.batchCumsum(numpy.where(after, temp, 0.0))
+        # 7. keep the first 2 null rows, the subset units, and the units directly before them, as positions of the merit order (padded at the end of each column)
+        keep = mask | numpy.vstack([mask[1:], numpy.zeros((1, k), dtype=bool)])
+        keep[1:3] = True # once each, also if they are subset units
+        n = keep.sum(axis=0)
+        rows = numpy.argsort(~keep, axis=0, kind='stable')
+        valid = numpy.arange(len(rows))[:, None] < n[None, :]
+        def take(values):
+            return numpy.take_along_axis(values, rows, axis=0)
+        demand_c, s_c, mask_c = take(demand), take(s), take(mask) & valid
+        # 8. set unit directly following subsetted unit and is not itself a subsetted unit to have base X (n) = base X (n-1) + marginal X * marginal demand (n-1)
+        following = numpy.vstack([numpy.zeros((1, k), dtype=bool), mask_c[:-1]]) & ~mask_c & valid
+        position, column = numpy.nonzero(following)
+        x = numpy.where(valid, demand_c, numpy.inf)
+        order = numpy.argsort(x, axis=0, kind='stable') # interp1d sorts the x-coordinates
+        batch['subset'] = {'x': numpy.take_along_axis(x, order, axis=0), 'n': n, 'y': {}}
+        for e in emissions_subset:
+            base_c, marg_c = take(base[e]), take(marg[e])
+            base_c[position, column] = base_c[position-1, column] + marg_c[position-1, column] * (demand_c[position-1, column] - s_c[position-1, column])
+            batch['subset']['y'][e] = numpy.take_along_axis(base_c + (demand_c - s_c) * marg_c, order, axis=0)
+    
+    
     def createMarginalPiecewise(self):
         """ Creates a piecewsise dataframe of the generator data. We can then interpolate this data frame for marginal data instead of querying.
         """
@@ -1411,59 +2034,125 @@ class bidStack(object):
         df_marg_piecewise['demand'] = pandas.concat([df_marg_piecewise.demand[0:1], df_marg_piecewise.demand[0:-1]]).reset_index(drop=True)
         df_marg_piecewise['demand'] = df_marg_piecewise.demand - 0.1
         self.df_marg_piecewise = df_marg_piecewise
+        #encode the categorical merit order attributes as integer codes aligned with the sorted stack, so that returnMarginalGenerator can look them up by position
+        self.marg_demand = self.df.demand.values # cumulative demand of the sorted stack, used to find the position of the marginal generator
+        self.marg_categorical = {} # column : (integer codes, unique values)
+        for col in ['fuel_type', 'orispl_unit', 'prime_mover', 'state']:
+            if col in self.df.columns:
+                self.encodeCategorical(col)
+        #demand interval [s, f) in which each generator is the marginal generator, with the same positions as the categorical lookups of returnMarginalGenerator 
+        #(the first generator is also marginal below the merit order and the last one above it). dispatch.returnMarginalHours joins these intervals against the hourly demand
+        s = numpy.append(-numpy.inf, self.marg_demand[:-1]).astype('float64')
+        f = self.marg_demand.astype('float64')
+        f[-1] = numpy.inf
+        self.marginal_intervals = pandas.DataFrame({'s': s, 'f': f}, index=pandas.Index(self.df.orispl_unit.values, name='orispl_unit'))
+
+
+    def encodeCategorical(self, col):
+        """ Encodes a non-numeric column of self.df as integer codes that index an array of its unique values
+        ---
+        col : column header of self.df (e.g. 'fuel_type')
+        returns : (codes, uniques). nan values are coded as -1, which indexes a nan appended at the end of uniques
+        """
+        codes, uniques = pandas.factorize(self.df[col])
+        self.marg_categorical[col] = (codes, numpy.append(numpy.asarray(uniques, dtype=object), numpy.nan))
+        return self.marg_categorical[col]
 
 
     def returnMarginalGenerator(self, demand, return_type):
         """ Returns marginal data by interpolating self.df_marg_piecewise, which is much faster than the returnMarginalGenerator function below.
+        Non-numeric columns (e.g. 'fuel_type') are looked up by the position of the marginal generator in the sorted stack and decoded from their integer codes.
         ---
         demand : [MW]
         return_type : column header of self.df being returned (e.g. 'gen', 'fuel_type', 'gen_cost', etc.)
         """
-        try: #try interpolation as it's much faster. 
-            try: #for columns with a time value at the end (i.e. nox30)
-                return scipy.interp(demand, self.df_marg_piecewise['demand'], scipy.array(self.df_marg_piecewise[return_type + str(self.time)], dtype='float64'))
-            except: #for columns without a time value at the end (i.e. gen_cost)
-                return scipy.interp(demand, self.df_marg_piecewise['demand'], scipy.array(self.df_marg_piecewise[return_type], dtype='float64'))   
-        except: #interpolation will only work for floats, so we use querying below otherwise (~8x slower)
-            ind = scipy.minimum(self.df.index[self.df.demand <= demand][-1], len(self.df)-2)
-            return self.df[return_type][ind+1]
+        col = self.marginalColumn(return_type)
+        if pandas.api.types.is_numeric_dtype(self.df_marg_piecewise[col]): # interpolation will only work for floats
+            return numpy.interp(demand, self.df_marg_piecewise['demand'], numpy.array(self.df_marg_piecewise[col], dtype='float64'))
+        codes, uniques = self.marg_categorical[col] if col in self.marg_categorical else self.encodeCategorical(col)
+        ind = numpy.minimum(numpy.searchsorted(self.marg_demand, demand, side='right') - 1, len(self.df)-2) # last generator with cumulative demand <= demand
+        return uniques[codes[ind+1]]
 	
 					
-    def createTotalInterpolationFunctions(self):
+    def marginalColumn(self, return_type):
+        """ Returns the column header of self.df_marg_piecewise that holds return_type for the current time
+        ---
+        return_type : column header of self.df without the time value (e.g. 'nox', 'fuel_type', 'gen_cost', etc.)
+        """
+        col = return_type + str(self.time) # for columns with a time value at the end (i.e. nox30)
+        if col not in self.df_marg_piecewise.columns: # for columns without a time value at the end (i.e. gen_cost)
+            col = return_type
+        return col
+    
+    
+    def createTotalInterpolationFunctions(self, start=None):
         """ Creates interpolation functions for the total data (i.e. total cost, total emissions, etc.) depending on total demand. 
         Then the returnTotalCost, returnTotal###, ..., functions use these interpolations rather than querying the dataframes as in previous versions. 
-        This reduces solve time by ~90x. Dataframe is sorted in merit order prior to input into the functions
+        This reduces solve time by ~90x. Dataframe is sorted in merit order prior to input into the functions.
+        Only the output families in self.output_families are created (plus total coal generation, which calcFullMeritOrder always needs for the minimum downtime weights)
+        ---
+        start : if not None, the merit order only changed from this position on (see updateUnits), so the cumulative totals of the existing functions are only recalculated from there
         """       
         test = self.df.copy()      
+        t = str(self.time)
+        def cumulative(values, f_old):
+            #cumulative total (in merit order) of values(test), where values is a function of a slice of test
+            if start is None:
+                return values(test).cumsum()
+            return pandas.Series(self.patchCumsum(f_old.y, values(test.iloc[start:]), start), index=test.index)
+        f_total_old, f_total_coal_old = (self.f_total, self.f_total_coal) if start is not None else ({}, {})
+        self.f_total = {} # output family : interpolation function of its cumulative total, used by calcFullMeritOrder
+        self.f_total_coal = {} # output family : interpolation function of its cumulative total from coal units only, used for the minimum downtime units
         #cost
-        self.f_totalCost = scipy.interpolate.interp1d(test.demand, (test['mw' + str(self.time)] * test['gen_cost']).cumsum()) # cumulative total cost (in increasing cost order) vs demand
-        #emissions and health damages
-        self.f_totalCO2 = scipy.interpolate.interp1d(test.demand, (test['mw' + str(self.time)] * test['co2' + str(self.time)]).cumsum())
-        self.f_totalSO2 = scipy.interpolate.interp1d(test.demand, (test['mw' + str(self.time)] * test['so2' + str(self.time)]).cumsum())
-        self.totalSO2 = (test['mw' + str(self.time)] * test['so2' + str(self.time)]).cumsum() # TEMPORARY for debugging interpolation function
-        self.f_totalNOX = scipy.interpolate.interp1d(test.demand, (test['mw' + str(self.time)] * test['nox' + str(self.time)]).cumsum())
+        if 'gen_cost_tot' in self.output_families:
+            self.f_totalCost = scipy.interpolate.interp1d(test.demand, cumulative(lambda d: d['mw' + t] * d['gen_cost'], f_total_old.get('gen_cost_tot'))) # cumulative total cost (in increasing cost order) vs demand
+            self.f_total['gen_cost_tot'] = self.f_totalCost
+        #emissions and health damages (e.g. self.f_totalCO2 and self.f_totalCO2_Coal for coal units only)
+        for e in ['co2', 'so2', 'nox']:
+            if e in self.output_families:
+                setattr(self, 'f_total' + e.upper(), scipy.interpolate.interp1d(test.demand, cumulative(lambda d: d['mw' + t] * d[e + t], f_total_old.get(e))))
+                setattr(self, 'f_total' + e.upper() + '_Coal', scipy.interpolate.interp1d(test.demand, cumulative(lambda d: d['mw' + t] * d[e + t] * d['is_coal'], f_total_coal_old.get(e))))
+                self.f_total[e] = getattr(self, 'f_total' + e.upper())
+                self.f_total_coal[e] = getattr(self, 'f_total' + e.upper() + '_Coal')
+        if 'so2' in self.output_families:
+            self.totalSO2 = pandas.Series(self.f_totalSO2.y, index=test.index) # TEMPORARY for debugging interpolation function
         # self.f_totalDmg = scipy.interpolate.interp1d(test.demand, (test['mw' + str(self.time)] * test['dmg' + str(self.time)]).cumsum())
-        #for coal units only
-        self.f_totalCO2_Coal = scipy.interpolate.interp1d(test.demand, (test['mw' + str(self.time)] * test['co2' + str(self.time)] * test['is_coal']).cumsum())
-        self.f_totalSO2_Coal = scipy.interpolate.interp1d(test.demand, (test['mw' + str(self.time)] * test['so2' + str(self.time)] * test['is_coal']).cumsum())
-        self.f_totalNOX_Coal = scipy.interpolate.interp1d(test.demand, (test['mw' + str(self.time)] * test['nox' + str(self.time)] * test['is_coal']).cumsum())
         # self.f_totalDmg_Coal = scipy.interpolate.interp1d(test.demand, (test['mw' + str(self.time)] * test['dmg' + str(self.time)] * test['is_coal']).cumsum())       
-        #fuel mix
-        self.f_totalGas = scipy.interpolate.interp1d(test.demand, (test['is_gas'] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalCoal = scipy.interpolate.interp1d(test.demand, (test['is_coal'] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalOil = scipy.interpolate.interp1d(test.demand, (test['is_oil'] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalNuclear = scipy.interpolate.interp1d(test.demand, (test['is_nuclear'] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalHydro = scipy.interpolate.interp1d(test.demand, (test['is_hydro'] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalGeothermal = scipy.interpolate.interp1d(test.demand, (test['is_geothermal'] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalBiomass = scipy.interpolate.interp1d(test.demand, (test['is_biomass'] * test['mw' + str(self.time)]).cumsum())
-        #fuel consumption
-        self.f_totalConsGas = scipy.interpolate.interp1d(test.demand, (test['is_gas'] * test['heat_rate' + str(self.time)] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalConsCoal = scipy.interpolate.interp1d(test.demand, (test['is_coal'] * test['heat_rate' + str(self.time)] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalConsOil = scipy.interpolate.interp1d(test.demand, (test['is_oil'] * test['heat_rate' + str(self.time)] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalConsNuclear = scipy.interpolate.interp1d(test.demand, (test['is_nuclear'] * test['heat_rate' + str(self.time)] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalConsHydro = scipy.interpolate.interp1d(test.demand, (test['is_hydro'] * test['heat_rate' + str(self.time)] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalConsGeothermal = scipy.interpolate.interp1d(test.demand, (test['is_geothermal'] * test['heat_rate' + str(self.time)] * test['mw' + str(self.time)]).cumsum())
-        self.f_totalConsBiomass = scipy.interpolate.interp1d(test.demand, (test['is_biomass'] * test['heat_rate' + str(self.time)] * test['mw' + str(self.time)]).cumsum())
+        #fuel mix (e.g. self.f_totalGas). Coal is always needed for the minimum downtime weights
+        self.f_totalCoal = scipy.interpolate.interp1d(test.demand, cumulative(lambda d: d['is_coal'] * d['mw' + t], getattr(self, 'f_totalCoal', None)))
+        for fl in ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass']:
+            if fl + '_mix' in self.output_families:
+                if fl != 'coal':
+                    setattr(self, 'f_total' + fl.capitalize(), scipy.interpolate.interp1d(test.demand, cumulative(lambda d: d['is_' + fl] * d['mw' + t], f_total_old.get(fl + '_mix'))))
+                self.f_total[fl + '_mix'] = getattr(self, 'f_total' + fl.capitalize())
+        if 'coal_mix' in self.output_families:
+            self.f_total_coal['coal_mix'] = self.f_totalCoal
+        #fuel consumption (e.g. self.f_totalConsGas)
+        for fl in ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass']:
+            if fl + '_consumption' in self.output_families:
+                setattr(self, 'f_totalCons' + fl.capitalize(), scipy.interpolate.interp1d(test.demand, cumulative(lambda d: d['is_' + fl] * d['heat_rate' + t] * d['mw' + t], f_total_old.get(fl + '_consumption'))))
+                self.f_total[fl + '_consumption'] = getattr(self, 'f_totalCons' + fl.capitalize())
+        if 'coal_consumption' in self.output_families:
+            self.f_total_coal['coal_consumption'] = self.f_totalConsCoal
+    
+    
+    def patchCumsum(self, cumsum, values, start):
+        """ Recalculates a cumulative sum from position start on, given that the values before start did not change. 
+        Gives the same result as pandas' cumsum of the full values (nan values are skipped and kept as nan)
+        ---
+        cumsum : previous cumulative sum, which is still correct before position start
+        values : values from position start on
+        start : position of the first value that changed
+        returns : numpy array of the cumulative sum of the new values
+        """
+        values = numpy.asarray(values, dtype='float64')
+        before = numpy.asarray(cumsum[:start], dtype='float64')
+        before_valid = before[~numpy.isnan(before)]
+        running = before_valid[-1] if len(before_valid) > 0 else 0.0 # running sum at position start-1
+        nan = numpy.isnan(values)
+        after = numpy.cumsum(numpy.append(running, numpy.where(nan, 0.0, values)))[1:] # continues the running sum in the same order as a full cumsum
+        after[nan] = numpy.nan
+        return numpy.append(before, after)
                 
 					
     def returnTotalCost(self, demand):
@@ -1575,144 +2264,78 @@ class bidStack(object):
         is being used. In general, "base" is a value (e.g. 'full_gen_cost_tot_base' has units [$], and 'full_co2_base' has units [kg]) while "marg" 
         is a rate (e.g. 'full_gen_cost_tot_marg' has units [$/MWh], and 'full_co2_marg' has units [kg/MWh]). When the dispatch object solves the dispatch, 
         it calculates the total emissions for one time period as 'full_co2_base' + 'full_co2_marg' * (marginal generation MWh) to end up with units of [kg].
+        Only the families in self.output_families are calculated.
         ---
         """
         df = self.df.copy(deep=True)
-        temp = df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal')
-        binary_demand_is_below_demand_threshold = (scipy.maximum(0, - temp.fillna(0)) > 0).values.astype(int) # calcs if min downtime
+        s, a, f = df.s.values.astype('float64'), df.a.values.astype('float64'), df.f.values.astype('float64')
+        #the interpolation functions take arrays, so each one is evaluated at a, s, or f for all of the units at once
+        def marginal(return_type):
+            return self.returnMarginalGenerator(s, return_type)
+        temp = self.f_totalCoal(f) - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal') # coal generation below each unit's full load, less the coal generation below the threshold
+        binary_demand_is_below_demand_threshold = (numpy.maximum(0, - numpy.where(numpy.isnan(temp), 0, temp)) > 0).astype(int) # calcs if min downtime
         weight_marginal_unit = (1-self.mdt_weight) + self.mdt_weight*(1-binary_demand_is_below_demand_threshold) # calcs min downtime weight
         weight_mindowntime_units = 1 - weight_marginal_unit
-        #INCLUDING MIN OUTPUT
-        if self.include_min_output:
-            
-            #total production cost
-            df['full_gen_cost_tot_base'] = (0.1*df.a.apply(self.returnTotalCost) + 0.9*df.s.apply(self.returnTotalCost) 
-                                            + df.s.apply(self.returnMarginalGenerator, args=('gen_cost',)) 
-                                            * df.s.apply(self.returnMarginalGenerator, args=('min_out',))) #calculate the base production cost [$]
-            df['full_gen_cost_tot_marg'] = (((df.s.apply(self.returnTotalCost) - df.a.apply(self.returnTotalCost)) 
-                                             / (df.s-df.a) * (df.min_out/(df.f-df.s)) + df.s.apply(self.returnMarginalGenerator, args=('gen_cost',)) 
-                                             * (1 -(df.min_out/(df.f-df.s)))).fillna(0.0)) #calculate the marginal base production cost [$/MWh]
-            # FOR DEBUGGING: tempDF = df.loc[:][["f",  "s", "min_out", "a", "full_gen_cost_tot_base", "full_gen_cost_tot_marg"]]
-            #emissions
-            for e in ['co2', 'so2', 'nox']:
-                # base emissions here is not meant to match base calculations when not including min_output
-                df['full_' + e + '_base'] = (0.1*df.a.apply(self.returnTotalEmissions, args=(e,)) + 
-                                             0.9*df.s.apply(self.returnTotalEmissions, args=(e,)) + df.s.apply(self.returnMarginalGenerator, args=(e,)) 
-                                             * df.s.apply(self.returnMarginalGenerator, args=('min_out',))) #calculate the base emissions [kg]
-                #scipy.multiply(MEF of normal generation, weight of normal genearation) + 
-                #scipy.multiply(MEF of mdt_reserves, weight of mdt_reserves) where MEF of normal generation 
+        coal_mw_mindowntime = numpy.maximum(0, - temp) # coal MW held at minimum output by the minimum downtime constraint
+        min_out = marginal('min_out') if self.include_min_output else None
+        heat_rate = marginal('heat_rate') if any(family.endswith('_consumption') for family in self.output_families) else None
+        full_cols = {} # new columns, added to df together at the end
+        with numpy.errstate(all='ignore'): # divisions by zero are filled below
+            min_out_share = df.min_out.values.astype('float64') / (f-s) # share of the unit's capacity that is minimum output
+            for family in self.output_families:
+                f_total = self.f_total[family]
+                #rate of the marginal unit: gen_cost [$/MWh], emissions [kg/MWh], is_fuel [-], or is_fuel * heat_rate [mmBtu/MWh]
+                if family == 'gen_cost_tot':
+                    rate = base_rate = marginal('gen_cost')
+                elif family in ['co2', 'so2', 'nox']:
+                    rate = base_rate = marginal(family)
+                elif family.endswith('_mix'):
+                    rate = marginal('is_' + family[:-len('_mix')])
+                    base_rate = df['is_' + family[:-len('_mix')]].values
+                else:
+                    rate = marginal('is_' + family[:-len('_consumption')]) * heat_rate
+                    base_rate = df['is_' + family[:-len('_consumption')]].values * heat_rate
+                #INCLUDING MIN OUTPUT
+                if self.include_min_output:
+                    total_s = f_total(s)
+                    total_a = f_total(a)
+                    # base here is not meant to match base calculations when not including min_output
+                    full_cols['full_' + family + '_base'] = 0.1*total_a + 0.9*total_s + base_rate * min_out #calculate the base value [$, kg, MWh, or mmBtu]
+                    marg = (total_s - total_a) / (s-a) * min_out_share + rate * (1 - min_out_share)
+                    marg = numpy.where(numpy.isnan(marg), 0.0, marg)
+                #EXCLUDING MIN OUTPUT
+                else:
+                    # full_base will differ depending on if using min_output because marginal plant will not automatically have some min_output capacity when fired
+                    full_cols['full_' + family + '_base'] = f_total(s) #calculate the base value, which is now the full load value of the generators in the merit order below the marginal unit
+                    marg = rate
+                if family == 'gen_cost_tot': # production cost has no minimum downtime weighting
+                    full_cols['full_' + family + '_marg'] = marg #calculate the marginal value [$/MWh]
+                    continue
+                #(MEF of normal generation * weight of normal genearation) + 
+                #(MEF of mdt_reserves * weight of mdt_reserves) where MEF of normal generation 
                 #is the calculation that happens without accounting for mdt, weight of normal generation is ((f-s) / ((f-s)) + mdt_reserves) 
-                #and MEF of mdt_reserves is total_value_mdt_emissions / total_mw_mdt_reserves
-                df['full_' + e + '_marg'] = (scipy.multiply(((df.s.apply(self.returnTotalEmissions, args=(e,)) - 
-                                                              df.a.apply(self.returnTotalEmissions, args=(e,))) / (df.s-df.a) * 
-                                                             (df.min_out/(df.f-df.s)) + df.s.apply(self.returnMarginalGenerator, args=(e,)) * 
-                                                             (1 -(df.min_out/(df.f-df.s)))).fillna(0.0), weight_marginal_unit) # emissions of minimum downtime units
-                                             + scipy.multiply(scipy.divide(
-                                                 scipy.maximum(0, - (df.f.apply(self.returnTotalEmissions_Coal, args=(e,)) 
-                                                                     - self.returnTotalEmissions_Coal(self.coal_mdt_demand_threshold, e))),  
-                                                 scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) 
-                                                                     - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal'))))
-                                                 .fillna(0.0).replace(scipy.inf, 0.0),  weight_mindowntime_units))
-            
-            # #emissions damages
-            # df['full_dmg_easiur_base'] = 0.1*df.a.apply(self.returnTotalEasiurDamages) + 0.9*df.s.apply(self.returnTotalEasiurDamages) + df.s.apply(self.returnMarginalGenerator, args=('dmg_easiur',)) * df.s.apply(self.returnMarginalGenerator, args=('min_out',)) #calculate the base easiur damages [$]
-            # #scipy.multiply(MEF of normal generation, weight of normal genearation) + scipy.multiply(MEF of mdt_reserves, weight of mdt_reserves) where MEF of normal generation is the calculation that happens without accounting for mdt, weight of normal generation 
-            # is ((f-s) / ((f-s)) + mdt_reserves) and MEF of mdt_reserves is total_value_mdt_emissions / total_mw_mdt_reserves
-            # df['full_dmg_easiur_marg'] = scipy.multiply(  ((df.s.apply(self.returnTotalEasiurDamages) - df.a.apply(self.returnTotalEasiurDamages)) / (df.s-df.a) * (df.min_out/(df.f-df.s)) + df.s.apply(self.returnMarginalGenerator, args=('dmg_easiur',)) * (1 -(df.min_out/(df.f-df.s)))).fillna(0.0)  
-            # ,  weight_marginal_unit  ) + scipy.multiply(  scipy.divide(scipy.maximum(0, - (df.f.apply(self.returnTotalEasiurDamages_Coal) - self.returnTotalEasiurDamages_Coal(self.coal_mdt_demand_threshold)))  ,  scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) - 
-            # self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal')))).fillna(0.0).replace(scipy.inf, 0.0)  ,  weight_mindowntime_units  )
+                #and MEF of mdt_reserves is total_value_mdt_emissions / total_mw_mdt_reserves. Only coal units are held at minimum output, so the second term is zero for the other fuels
+                marg = marg * weight_marginal_unit
+                if family in self.f_total_coal:
+                    f_total_coal = self.f_total_coal[family]
+                    mdt_rate = numpy.maximum(0, - (f_total_coal(f) - f_total_coal(self.coal_mdt_demand_threshold))) / coal_mw_mindowntime
+                    mdt_rate = numpy.where(numpy.isnan(mdt_rate) | (mdt_rate == numpy.inf), 0.0, mdt_rate)
+                    marg = marg + mdt_rate * weight_mindowntime_units
+                full_cols['full_' + family + '_marg'] = marg
+        df = pandas.concat([df.drop([c for c in full_cols if c in df.columns], axis=1), pandas.DataFrame(full_cols, index=df.index)], axis=1)
             
-            #fuel mix
-            for fl in ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass']:
-            #for fl in ['gas', 'coal', 'oil']:
-                df['full_' + fl + '_mix_base'] = 0.1*df.a.apply(self.returnTotalFuelMix, args=(('is_'+fl),)) + 0.9*df.s.apply(self.returnTotalFuelMix, args=(('is_'+fl),)) + self.df['is_'+fl] * df.s.apply(self.returnMarginalGenerator, args=('min_out',)) #calculate the base fuel_mix [MWh]
-                #scipy.multiply(dmgs of normal generation, weight of normal genearation) + scipy.multiply(dmgs of mdt_reserves, weight of mdt_reserves) where dmgs of normal generation is the calculation that happens without accounting for mdt, weight of normal generation is ((f-s) / ((f-s)) + mdt_reserves) and dmgs of mdt_reserves is total_value_mdt_reserves / total_mw_mdt_reserves
-                fuel_multiplier = scipy.where(fl=='coal', 1.0, 0.0)
-                df['full_' + fl + '_mix_marg'] = (scipy.multiply(((
-                    df.s.apply(self.returnTotalFuelMix, args=(('is_'+fl),)) - df.a.apply(self.returnTotalFuelMix, args=(('is_'+fl),)))
-                    / (df.s-df.a) * (df.min_out/(df.f-df.s)) + 
-                    df.s.apply(self.returnMarginalGenerator, args=(('is_'+fl),)) * (1 -(df.min_out/(df.f-df.s)))).fillna(0.0)  ,  weight_marginal_unit  ) 
-                    +  scipy.multiply(  scipy.divide(scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),))
-                                                                         - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal'))),
-                                                     scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) 
-                                                                         - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal'))))
-                                      .fillna(0.0).replace(scipy.inf, 0.0) * fuel_multiplier  ,  weight_mindowntime_units  ))
-            
-            #fuel consumption
-            for fl in ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass']:
-                df['full_' + fl + '_consumption_base'] = (0.1*df.a.apply(self.returnTotalFuelConsumption, args=(('is_'+fl),)) + 
-                                                          0.9*df.s.apply(self.returnTotalFuelConsumption, args=(('is_'+fl),)) + 
-                                                          self.df['is_'+fl] * df.s.apply(self.returnMarginalGenerator, args=('heat_rate',)) * 
-                                                          df.s.apply(self.returnMarginalGenerator, args=('min_out',))) #calculate the base fuel consumption [mmBtu]
-                #scipy.multiply(mmbtu/mw of normal generation, weight of normal genearation) + 
-                #scipy.multiply(mmbtu/mw of mdt_reserves, weight of mdt_reserves) 
-                #where mmbtu/mw of normal generation is the calculation that happens without accounting for mdt, 
-                #weight of normal generation is ((f-s) / ((f-s)) + mdt_reserves) and mmbtu/mw of mdt_reserves is total_value_mdt_reserves / total_mw_mdt_reserves
-                fuel_multiplier = scipy.where(fl=='coal', 1.0, 0.0)
-                df['full_' + fl + '_consumption_marg'] = (scipy.multiply(((df.s.apply(self.returnTotalFuelConsumption, args=('is_'+fl,)) 
-                                                                           - df.a.apply(self.returnTotalFuelConsumption, args=('is_'+fl,))) / (df.s-df.a) 
-                                                                          * (df.min_out/(df.f-df.s)) + df.s.apply(self.returnMarginalGenerator, args=('is_'+fl,))
-                                                                          * df.s.apply(self.returnMarginalGenerator, args=('heat_rate',)) 
-                                                                          * (1 -(df.min_out/(df.f-df.s)))).fillna(0.0),  weight_marginal_unit  )  
-                                                          +  scipy.multiply(scipy.divide(
-                                                              scipy.maximum(0, - (df.f.apply(self.returnTotalFuelConsumption, args=(('is_coal'),)) 
-                                                                                  - self.returnTotalFuelConsumption(self.coal_mdt_demand_threshold, 'is_coal'))),
-                                                              scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) 
-                                                                                  - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal'))))
-                                                              .fillna(0.0).replace(scipy.inf, 0.0) * fuel_multiplier,  weight_mindowntime_units))         
-        
-        #EXCLUDING MIN OUTPUT
-        if not self.include_min_output:
-            #total production cost
-            df['full_gen_cost_tot_base'] = df.s.apply(self.returnTotalCost) #calculate the base production cost, which is now the full load production cost of the generators in the merit order below the marginal unit [$]
-            df['full_gen_cost_tot_marg'] = df.s.apply(self.returnMarginalGenerator, args=('gen_cost',)) #calculate the marginal production cost, which is now just the generation cost of the marginal generator [$/MWh]
-            #emissions
-            for e in ['co2', 'so2', 'nox']:
-                # full_base will differ depending on if using min_output because marginal plant will not automatically have some min_output capacity when fired
-                df['full_' + e + '_base'] = df.s.apply(self.returnTotalEmissions, args=(e,)) #calculate the base emissions, which is now the full load emissions of the generators in the merit order below the marginal unit [kg]
-                df['full_' + e + '_marg'] = (scipy.multiply(df.s.apply(self.returnMarginalGenerator, args=(e,))  ,   weight_marginal_unit  ) 
-                                             + scipy.multiply(
-                                                 scipy.divide(scipy.maximum(0, - (df.f.apply(self.returnTotalEmissions_Coal, args=(e,)) 
-                                                                                  - self.returnTotalEmissions_Coal(self.coal_mdt_demand_threshold, e))),  
-                                                              scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) 
-                                                                                  - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal'))))
-                                                 .fillna(0.0).replace(scipy.inf, 0.0)  ,  weight_mindowntime_units  ))
-            # #emissions damages
-            # df['full_dmg_easiur_base'] = df.s.apply(self.returnTotalEasiurDamages) #calculate the total Easiur damages
-            # df['full_dmg_easiur_marg'] = scipy.multiply(  df.s.apply(self.returnMarginalGenerator, args=('dmg_easiur',))  ,  
-            # weight_marginal_unit  ) + scipy.multiply(  scipy.divide(scipy.maximum(0, - (df.f.apply(self.returnTotalEasiurDamages_Coal) 
-            # - self.returnTotalEasiurDamages_Coal(self.coal_mdt_demand_threshold)))  ,  scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix,
-            # args=(('is_coal'),)) - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal')))).fillna(0.0).replace(scipy.inf, 0.0)  ,  weight_mindowntime_units  )
-            #fuel mix
-            for fl in ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass']:
-                df['full_' + fl + '_mix_base'] = df.s.apply(self.returnTotalFuelMix, args=(('is_'+fl),)) #calculate the base fuel_mix, which is now the full load coal mix of the generators in the merit order below the marginal unit [MWh]
-                fuel_multiplier = scipy.where(fl=='coal', 1.0, 0.0)
-                df['full_' + fl + '_mix_marg'] = (scipy.multiply(df.s.apply(self.returnMarginalGenerator, args=(('is_'+fl),))  ,  weight_marginal_unit  )
-                                                  +scipy.multiply(scipy.divide(
-                                                      scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) 
-                                                                          - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal'))), 
-                                                      scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) 
-                                                                          - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal'))))
-                                                      .fillna(0.0).replace(scipy.inf, 0.0) * fuel_multiplier  ,  weight_mindowntime_units  ))
-            #fuel consumption
-            for fl in ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass']:
-                #calculate the base fuel_consumption, which is now the fuel consumption of the generators in the merit order below the marginal unit [MWh]
-                df['full_' + fl + '_consumption_base'] = df.s.apply(self.returnTotalFuelConsumption, args=(('is_'+fl),)) 
-                fuel_multiplier = scipy.where(fl=='coal', 1.0, 0.0)
-                df['full_' + fl + '_consumption_marg'] = (scipy.multiply(df.s.apply(self.returnMarginalGenerator, args=('is_'+fl,)) 
-                                                                         * df.s.apply(self.returnMarginalGenerator, args=('heat_rate',)),  
-                                                                         weight_marginal_unit)  +  
-                                                          scipy.multiply(  scipy.divide(
-                                                              scipy.maximum(0, - (df.f.apply(self.returnTotalFuelConsumption, args=(('is_coal'),)) 
-                                                                                  - self.returnTotalFuelConsumption(self.coal_mdt_demand_threshold, 'is_coal'))),
-                                                              scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) 
-                                                                                  - self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal'))))
-                                                              .fillna(0.0).replace(scipy.inf, 0.0) * fuel_multiplier ,  weight_mindowntime_units))
+        # #emissions damages
+        # df['full_dmg_easiur_base'] = 0.1*df.a.apply(self.returnTotalEasiurDamages) + 0.9*df.s.apply(self.returnTotalEasiurDamages) + df.s.apply(self.returnMarginalGenerator, args=('dmg_easiur',)) * df.s.apply(self.returnMarginalGenerator, args=('min_out',)) #calculate the base easiur damages [$]
+        # #scipy.multiply(MEF of normal generation, weight of normal genearation) + scipy.multiply(MEF of mdt_reserves, weight of mdt_reserves) where MEF of normal generation is the calculation that happens without accounting for mdt, weight of normal generation 
+        # is ((f-s) / ((f-s)) + mdt_reserves) and MEF of mdt_reserves is total_value_mdt_emissions / total_mw_mdt_reserves
+        # df['full_dmg_easiur_marg'] = scipy.multiply(  ((df.s.apply(self.returnTotalEasiurDamages) - df.a.apply(self.returnTotalEasiurDamages)) / (df.s-df.a) * (df.min_out/(df.f-df.s)) + df.s.apply(self.returnMarginalGenerator, args=('dmg_easiur',)) * (1 -(df.min_out/(df.f-df.s)))).fillna(0.0)  
+        # ,  weight_marginal_unit  ) + scipy.multiply(  scipy.divide(scipy.maximum(0, - (df.f.apply(self.returnTotalEasiurDamages_Coal) - self.returnTotalEasiurDamages_Coal(self.coal_mdt_demand_threshold)))  ,  scipy.maximum(0, - (df.f.apply(self.returnTotalFuelMix, args=(('is_coal'),)) - 
+        # self.returnTotalFuelMix(self.coal_mdt_demand_threshold, 'is_coal')))).fillna(0.0).replace(scipy.inf, 0.0)  ,  weight_mindowntime_units  )
         #update the master dataframe df
         self.df = df
         
-        ## if subsetting, prepare subset dataframe
-        if self.states_to_subset != []: # check if there are states in the list
+        ## if subsetting, prepare subset dataframe (unless the subset totals come from self.state_totals, see createTotalInterpolationFunctionsFull)
+        if self.states_to_subset != [] and not self.subset_state_totals: # check if there are states in the list
             df_subset = df.copy(deep=True) # create a copy to manipulate
             
             ## steps to subset; the goal is to create a step function that is constant between demand from non-subset units
@@ -1730,7 +2353,8 @@ class bidStack(object):
             # 8. set unit directly following subsetted unit and is not itself a subsetted unit to have base X (n) = base X (n-1) + marginal X * marginal demand (n-1)
 
             mask_of_subset_units = df_subset["state"].isin(self.states_to_subset) # subset units in states we want 
-            for e in ['co2', 'so2', 'nox']: # loop through emissions columns
+            emissions_subset = [e for e in ['co2', 'so2', 'nox'] if e in self.output_families] # emissions being calculated
+            for e in emissions_subset: # loop through emissions columns
                 # 1. set X-marg to 0 for non-subset units
                 df_subset.loc[~mask_of_subset_units, 'full_' + e + '_marg'] = 0 
                 # 2. create a new column of X-base (X-base-temp) shifted down one (move to n+1 row)
@@ -1748,15 +2372,14 @@ class bidStack(object):
             # 7. drop non-subset units that are not directly before subset units
             temp_mask = mask_of_subset_units.shift(-1).fillna(False) # mask for units before subsetted units
             temp_mask = temp_mask | mask_of_subset_units # mask for units before subsetted units or subsetted units
-            df_subset = pandas.concat([df_subset.loc[[1, 2], :], # preserve first 2 null rows for edge cases 
-                                df_subset.drop(df_subset[~temp_mask].index, axis=0)], axis=0) # drop rest of un-needed rows
+            df_subset = df_subset[temp_mask | df_subset.index.isin([1, 2])] # preserve first 2 null rows for edge cases (once, also if they are subset units) and drop rest of un-needed rows
             mask_of_subset_units = df_subset["state"].isin(self.states_to_subset) # re-make mask of subsetted units in states we want
             
             # 8. set unit directly following subsetted unit and is not itself a subsetted unit to have base X (n) = base X (n-1) + marginal X * marginal demand (n-1)
             temp_mask = mask_of_subset_units.shift(1).fillna(False) # mask for n+1 units, where n rows are subsetted units
             temp_mask = temp_mask & ~mask_of_subset_units # mask for n+1 units that are not themselves n units
             temp_mask2 = temp_mask.shift(-1).fillna(False) # rows that precede the prior mask (subsetted units)
-            for e in ['co2', 'so2', 'nox']: # I coded poorly, so we gotta loop through emissions columns again
+            for e in emissions_subset: # I coded poorly, so we gotta loop through emissions columns again
                 temp = (df_subset.loc[temp_mask2, 'full_' + e + '_base'] + 
                         numpy.multiply(df_subset.loc[temp_mask2, 'full_' + e + '_marg'], 
                                        df_subset.loc[temp_mask2, "demand"] - df_subset.loc[temp_mask2, "s"])) # perform the operation
@@ -1784,43 +2407,171 @@ class bidStack(object):
                 + marginal emissions (cumulative demand less demand from prior units) * emissions rate from marginal unit
         """       
         test = self.df.copy()      
-        #cost
-        self.f_totalCostFull = scipy.interpolate.interp1d(test.demand, test['full_gen_cost_tot_base'] + (test['demand'] - test['s']) * test['full_gen_cost_tot_marg'])  
-        #emissions and health damages
-        self.f_totalCO2Full = scipy.interpolate.interp1d(test.demand, test['full_co2_base'] + (test['demand'] - test['s']) * test['full_co2_marg'])
-        self.f_totalSO2Full = scipy.interpolate.interp1d(test.demand, test['full_so2_base'] + (test['demand'] - test['s']) * test['full_so2_marg'])
-        self.f_totalNOXFull = scipy.interpolate.interp1d(test.demand, test['full_nox_base'] + (test['demand'] - test['s']) * test['full_nox_marg'])
+        #one interpolation function per output family, keyed by the col_type of returnFullTotalValue. They all share the same x (test.demand), which returnDispatchMetrics uses to search once for all of them
+        #the functions are also kept under their own names (e.g. self.f_totalCostFull, self.f_totalCO2Full, self.f_totalGasFull, self.f_totalConsGasFull)
+        self.f_totalFull = {}
+        for family in self.output_families:
+            self.f_totalFull[family] = scipy.interpolate.interp1d(test.demand, test['full_' + family + '_base'] + (test['demand'] - test['s']) * test['full_' + family + '_marg'])
+            setattr(self, self.fullTotalFunctionName(family), self.f_totalFull[family])
         # self.f_totalDmgFull = scipy.interpolate.interp1d(test.demand, test['full_dmg_easiur_base'] + (test['demand'] - test['s']) * test['full_dmg_easiur_marg'])
-        #fuel mix
-        self.f_totalGasFull = scipy.interpolate.interp1d(test.demand, test['full_gas_mix_base'] + (test['demand'] - test['s']) * test['full_gas_mix_marg'])
-        self.f_totalCoalFull = scipy.interpolate.interp1d(test.demand, test['full_coal_mix_base'] + (test['demand'] - test['s']) * test['full_coal_mix_marg'])
-        self.f_totalOilFull = scipy.interpolate.interp1d(test.demand, test['full_oil_mix_base'] + (test['demand'] - test['s']) * test['full_oil_mix_marg'])
-        self.f_totalNuclearFull = scipy.interpolate.interp1d(test.demand, test['full_nuclear_mix_base'] + (test['demand'] - test['s']) * test['full_nuclear_mix_marg'])
-        self.f_totalHydroFull = scipy.interpolate.interp1d(test.demand, test['full_hydro_mix_base'] + (test['demand'] - test['s']) * test['full_hydro_mix_marg'])
-        self.f_totalGeothermalFull = scipy.interpolate.interp1d(test.demand, test['full_geothermal_mix_base'] + (test['demand'] - test['s']) * test['full_geothermal_mix_marg'])
-        self.f_totalBiomassFull = scipy.interpolate.interp1d(test.demand, test['full_biomass_mix_base'] + (test['demand'] - test['s']) * test['full_biomass_mix_marg'])
-        #fuel consumption
-        self.f_totalConsGasFull = scipy.interpolate.interp1d(test.demand, test['full_gas_consumption_base'] + (test['demand'] - test['s']) * test['full_gas_consumption_marg'])
-        self.f_totalConsCoalFull = scipy.interpolate.interp1d(test.demand, test['full_coal_consumption_base'] + (test['demand'] - test['s']) * test['full_coal_consumption_marg'])
-        self.f_totalConsOilFull = scipy.interpolate.interp1d(test.demand, test['full_oil_consumption_base'] + (test['demand'] - test['s']) * test['full_oil_consumption_marg'])
-        self.f_totalConsNuclearFull = scipy.interpolate.interp1d(test.demand, test['full_nuclear_consumption_base'] + (test['demand'] - test['s']) * test['full_nuclear_consumption_marg'])
-        self.f_totalConsHydroFull = scipy.interpolate.interp1d(test.demand, test['full_hydro_consumption_base'] + (test['demand'] - test['s']) * test['full_hydro_consumption_marg'])
-        self.f_totalConsGeothermalFull = scipy.interpolate.interp1d(test.demand, test['full_geothermal_consumption_base'] + (test['demand'] - test['s']) * test['full_geothermal_consumption_marg'])
-        self.f_totalConsBiomassFull = scipy.interpolate.interp1d(test.demand, test['full_biomass_consumption_base'] + (test['demand'] - test['s']) * test['full_biomass_consumption_marg'])
         
+        self.createStateTotals() # per-state cumulative emissions, for the totals of any set of states
         ## if subsetting, prepare subset functions (only for emissions)
         if self.states_to_subset != []: # check if there are states in the list
-            test = self.df_subset.copy()
-            # for all functions, set out of bounds value equal to the highest value in the list 
-            temp = test['full_co2_base'] + (test['demand'] - test['s']) * test['full_co2_marg'] # CO2
-            self.f_totalCO2Full_subset = scipy.interpolate.interp1d(test.demand, temp, 
-                                                        bounds_error=False, fill_value=temp.iloc[-1])
-            temp = test['full_so2_base'] + (test['demand'] - test['s']) * test['full_so2_marg'] # SO2
-            self.f_totalSO2Full_subset = scipy.interpolate.interp1d(test.demand, temp, 
-                                                        bounds_error=False, fill_value=temp.iloc[-1])
-            temp = test['full_nox_base'] + (test['demand'] - test['s']) * test['full_nox_marg'] # NOx
-            self.f_totalNOXFull_subset = scipy.interpolate.interp1d(test.demand, temp, 
-                                                        bounds_error=False, fill_value=temp.iloc[-1])
+            # for all functions, set out of bounds value equal to the highest value in the list (e.g. self.f_totalCO2Full_subset)
+            self.f_totalFull_subset = {}
+            rows = self.state_totals_index.get_indexer(list(self.states_to_subset))
+            rows = rows[rows >= 0]
+            for e in ['co2', 'so2', 'nox']:
+                if e in self.output_families:
+                    if self.subset_state_totals: # the sum of the per-state curves of the subset states, as in returnFullTotalValueStates
+                        x, temp = self.state_totals_demand, self.state_totals[e][rows].sum(axis=0)
+                    else:
+                        test = self.df_subset
+                        x, temp = test.demand.values, (test['full_' + e + '_base'] + (test['demand'] - test['s']) * test['full_' + e + '_marg']).values
+                    self.f_totalFull_subset[e] = scipy.interpolate.interp1d(x, temp, bounds_error=False, fill_value=temp[-1])
+                    setattr(self, self.fullTotalFunctionName(e) + '_subset', self.f_totalFull_subset[e])
+        if self.compress_tolerance is not None:
+            self.compressTotalInterpolationFunctionsFull()
+    
+    
+    def createStateTotals(self):
+        """ Splits the Full total emissions curves (e.g. self.f_totalCO2Full) by state. Each increase of the total between two consecutive generators of the merit order 
+        is assigned to the state of the generator that is marginal between them, and the increases are summed cumulatively in merit order for each state. 
+        The total emissions of any set of states at any demand is then the sum of the per-state curves of those states (see returnFullTotalValueStates), 
+        and the sum over all of the states is the Full total curve. The set of states can be chosen after the bidStack is built, and the subset functions of self.states_to_subset 
+        (e.g. self.f_totalCO2Full_subset) are built from these curves if self.subset_state_totals
+        ---
+        """
+        codes, states = pandas.factorize(self.df.state.fillna('').values) # the dummy rows have '' as their state
+        self.state_totals_index = pandas.Index(states) # states of the rows of the self.state_totals arrays
+        self.state_totals_demand = self.df.demand.values.astype('float64') # x-coordinates of the self.state_totals arrays (same as the exact Full total functions)
+        self.state_totals = {} # emissions type : 2-d array with the cumulative emissions of each state in merit order, one row per state
+        for e in ['co2', 'so2', 'nox']:
+            if e in self.output_families:
+                y = self.f_totalFull[e].y
+                increase = numpy.diff(y, prepend=0.0) # the first generator holds the value at the start of the merit order
+                table = numpy.zeros((len(states), len(y)))
+                table[codes, numpy.arange(len(y))] = numpy.where(numpy.isnan(increase), 0.0, increase)
+                self.state_totals[e] = numpy.cumsum(table, axis=1)
+    
+    
+    def returnFullTotalValueStates(self, demand, emissions, state_groups):
+        """ Given an array of demand, returns the Full total emissions of several groups of states at once, summing the per-state curves of self.state_totals 
+        of each group and interpolating them with one shared position search. Demand outside of the merit order takes the highest value, as for returnFullTotalValueSubset
+        ---
+        demand : array of demand [MW] (e.g. the demand of every hour of a week)
+        emissions : list of emissions types ('co2', 'so2', 'nox')
+        state_groups : dictionary of group name : list of 2-letter capital state abbreviations (e.g. {'GA': ['GA'], 'GA_AL_TN': ['GA', 'AL', 'TN']}). 
+            States without generators add nothing
+        returns : dictionary of group name : dictionary of emissions type : numpy array of total emissions [kg] of the group's online generators, the same length as demand
+        """
+        demand = numpy.asarray(demand, dtype='float64')
+        xp = self.state_totals_demand
+        curves = {}
+        for name, states in state_groups.items():
+            rows = self.state_totals_index.get_indexer(list(states))
+            rows = rows[rows >= 0]
+            for e in emissions:
+                curves[(name, e)] = self.state_totals[e][rows].sum(axis=0)
+        out_of_bounds = (demand < xp[0]) | (demand > xp[-1])
+        results = {name: {} for name in state_groups}
+        for (name, e), y in zip(curves.keys(), self.interpShared(xp, demand, list(curves.values()))):
+            y[out_of_bounds] = curves[(name, e)][-1]
+            results[name][e] = y
+        return results
+    
+    
+    def compressTotalInterpolationFunctionsFull(self):
+        """ Replaces the Full total interpolation functions (self.f_totalFull, self.f_totalFull_subset, and their named versions such as self.f_totalCO2Full) 
+        with piecewise-linear approximations that keep only the breakpoints needed to stay within self.compress_tolerance, so that dispatch lookups search and gather over a much smaller table. 
+        The functions of each dictionary keep sharing the same breakpoints (so returnDispatchMetrics still searches once for all of them). 
+        The realised error against the exact functions is saved in self.compression_error
+        ---
+        """
+        errors = []
+        for functions, suffix in [(self.f_totalFull, ''), (getattr(self, 'f_totalFull_subset', {}) if self.states_to_subset != [] else {}, '_subset')]:
+            if functions == {}:
+                continue
+            families = list(functions.keys())
+            x = functions[families[0]].x
+            y = numpy.array([functions[f].y for f in families], dtype='float64')
+            if isinstance(self.compress_tolerance, dict):
+                tolerance = numpy.array([self.compress_tolerance.get(f, 0.0) for f in families], dtype='float64')
+            else:
+                tolerance = numpy.full(len(families), float(self.compress_tolerance))
+            scale = numpy.nanmax(numpy.abs(y[:, :-1]), axis=1) # largest absolute value of each curve before the last generator (which has the extra 1000000 MW), for relative tolerances and errors
+            if self.compress_relative:
+                tolerance = tolerance * scale
+            keep = self.compressBreakpoints(x, y, tolerance)
+            for i, f in enumerate(families):
+                fill = {} if suffix == '' else {'bounds_error':False, 'fill_value':y[i, keep][-1]} # same bounds as createTotalInterpolationFunctionsFull
+                functions[f] = scipy.interpolate.interp1d(x[keep], y[i, keep], **fill)
+                setattr(self, self.fullTotalFunctionName(f) + suffix, functions[f])
+            #realised error at the breakpoints of the exact functions and halfway between them (both functions are linear between the exact breakpoints)
+            check = numpy.sort(numpy.append(x, (x[:-1] + x[1:]) / 2.0))
+            exact = self.interpShared(x, check, y)
+            approx = self.interpShared(x[keep], check, y[:, keep])
+            for i, f in enumerate(families):
+                err = numpy.abs(approx[i] - exact[i])
+                err[numpy.isnan(approx[i]) & numpy.isnan(exact[i])] = 0.0
+                err[numpy.isnan(err)] = numpy.inf
+                errors.append({'family': f + suffix, 'tolerance': tolerance[i], 'breakpoints': len(keep), 'exact_breakpoints': len(x), 
+                               'max_abs_error': err.max(), 'max_rel_error': err.max() / scale[i] if scale[i] > 0 else 0.0})
+        self.compression_error = pandas.DataFrame(errors, columns=['family', 'tolerance', 'breakpoints', 'exact_breakpoints', 'max_abs_error', 'max_rel_error']).set_index('family')
+    
+    
+    def compressBreakpoints(self, x, y, tolerance):
+        """ Greedily picks the breakpoints of a piecewise-linear approximation of several curves that share the same x-coordinates. 
+        Each segment is made as long as possible (by doubling and then bisecting its length) while every curve stays within its tolerance at the skipped breakpoints
+        ---
+        x : sorted x-coordinates (e.g. cumulative demand of the merit order)
+        y : 2-d array with one curve per row, each the same length as x
+        tolerance : array of maximum absolute errors, one per curve
+        returns : numpy array of the positions of the breakpoints to keep (always includes the first and last positions)
+        """
+        x = numpy.asarray(x, dtype='float64')
+        n = len(x)
+        def within_tolerance(i, j):
+            #True if the straight lines from breakpoint i to breakpoint j stay within tolerance of breakpoints i..j
+            dx = x[j] - x[i]
+            t = (x[i:j+1] - x[i]) / dx if dx > 0 else numpy.zeros(j+1-i)
+            with numpy.errstate(invalid='ignore'):
+                line = y[:, [i]] + t * (y[:, [j]] - y[:, [i]])
+                err = numpy.abs(line - y[:, i:j+1])
+            err[numpy.isnan(line) & numpy.isnan(y[:, i:j+1])] = 0.0 # nan in both is not an error
+            return not (numpy.isnan(err) | (err > tolerance[:, None])).any()
+        keep = [0]
+        i = 0
+        while i < n-1:
+            good, bad = i+1, i+2 # a segment to the next breakpoint is always exact
+            while bad <= n-1 and within_tolerance(i, bad):
+                good, bad = bad, i + 2*(bad-i)
+            bad = min(bad, n)
+            while bad - good > 1:
+                mid = (good + bad) // 2
+                if within_tolerance(i, mid):
+                    good = mid
+                else:
+                    bad = mid
+            keep.append(good)
+            i = good
+        return numpy.array(keep)
+        
+    
+    def fullTotalFunctionName(self, family):
+        """ Returns the attribute name of the Full model interpolation function of an output family
+        ---
+        family : 'gen_cost_tot', 'co2', 'coal_mix', 'gas_consumption', etc.
+        returns : 'f_totalCostFull', 'f_totalCO2Full', 'f_totalCoalFull', 'f_totalConsGasFull', etc.
+        """
+        if family == 'gen_cost_tot':
+            return 'f_totalCostFull'
+        if family.endswith('_mix'):
+            return 'f_total' + family[:-len('_mix')].capitalize() + 'Full'
+        if family.endswith('_consumption'):
+            return 'f_totalCons' + family[:-len('_consumption')].capitalize() + 'Full'
+        return 'f_total' + family.upper() + 'Full'
         
 
     def returnFullTotalValue(self, demand, col_type):
@@ -1886,6 +2637,389 @@ class bidStack(object):
             return self.f_totalSO2Full_subset(demand)
         if col_type == 'nox':
             return self.f_totalNOXFull_subset(demand)
+
+    
+    def interpShared(self, xp, x, fp_list):
+        """ Linearly interpolates several columns that share the same sorted x-coordinates with one position search for all of them.
+        Same arithmetic as numpy.interp (which scipy.interpolate.interp1d uses for linear float data), including repeated xp values
+        ---
+        xp : sorted x-coordinates (e.g. cumulative demand of the merit order)
+        x : numpy array of demand [MW]
+        fp_list : list of y-coordinate arrays, each the same length as xp
+        returns : list of interpolated arrays, one for each array in fp_list
+        """
+        xp = numpy.asarray(xp, dtype='float64')
+        j = numpy.clip(numpy.searchsorted(xp, x, side='right') - 1, 0, len(xp)-2) # xp[j] <= x < xp[j+1]
+        x_lo = x - xp[j]
+        x_hi = x - xp[j+1]
+        dx = xp[j+1] - xp[j]
+        exact = x_lo == 0 # x lands on a point of xp
+        left = x < xp[0]
+        right = x >= xp[-1]
+        results = []
+        with numpy.errstate(all='ignore'):
+            for fp in fp_list:
+                fp = numpy.asarray(fp, dtype='float64')
+                fp_lo, fp_hi = fp[j], fp[j+1]
+                slope = (fp_hi - fp_lo) / dx
+                y = slope*x_lo + fp_lo
+                nan = numpy.isnan(y) # numpy.interp retries from the upper point, then falls back to a flat segment
+                y[nan] = slope[nan]*x_hi[nan] + fp_hi[nan]
+                flat = numpy.isnan(y) & (fp_lo == fp_hi)
+                y[flat] = fp_lo[flat]
+                y[exact] = fp_lo[exact]
+                y[left] = fp[0]
+                y[right] = fp[-1]
+                results.append(y)
+        return results
+
+
+    def searchColumns(self, xp, x):
+        """ Counts the x-coordinates in each column of xp that are <= each value of the same column of x, with one search for all of the columns. 
+        The sorted columns are joined end to end as complex numbers (column number + 1j * x-coordinate), which numpy sorts by column first
+        ---
+        xp : 2-d array of x-coordinates, one column per merit order (sorted here, e.g. the cumulative demand of a batch from batchMeritOrders)
+        x : 2-d array of values to search, with one column per merit order or a single column shared by all of them
+        returns : 2-d integer array with the shape of x broadcast to the columns of xp. nan x-coordinates count as larger than any value, 
+            and nan values of x count all of the x-coordinates, as in numpy.searchsorted
+        """
+        n, k = xp.shape
+        x = numpy.broadcast_to(numpy.asarray(x, dtype='float64'), (numpy.shape(x)[0], k))
+        nan = numpy.isnan(x)
+        keys = numpy.empty((k, n), dtype='complex128') # the parts are set separately, since 1j * inf has a nan real part
+        keys.real = numpy.arange(k)[:, None]
+        keys.imag = numpy.sort(numpy.where(numpy.isnan(xp), numpy.inf, xp), axis=0).T
+        queries = numpy.empty(x.shape, dtype='complex128')
+        queries.real = numpy.arange(k)[None, :]
+        queries.imag = numpy.where(nan, 0.0, x)
+        count = numpy.searchsorted(keys.ravel(), queries.ravel(), side='right').reshape(x.shape) - numpy.arange(k)[None, :] * n
+        return numpy.where(nan, n, count)
+    
+    
+    def interpColumns(self, xp, x, fp_list, n=None):
+        """ Linearly interpolates the columns of a batch of merit orders: column k of each array in fp_list is interpolated at x[:, k] over xp[:, k], 
+        with one position search for all of the columns and arrays (see searchColumns). Same arithmetic as numpy.interp, including repeated xp values. 
+        As for numpy.interp, a column of xp only has to be sorted around the values searched in it (e.g. the piecewise merit order of createMarginalPiecewise); 
+        the columns where it is not, or that have nan x-coordinates, are interpolated with numpy.interp itself
+        ---
+        xp : 2-d array of x-coordinates, one column per merit order
+        x : 2-d array of values to interpolate at, with one column per merit order or a single column shared by all of them
+        fp_list : list of 2-d arrays of y-coordinates, each the same shape as xp
+        n : array with the number of x-coordinates in each column of xp, which is padded at the end with inf. None uses all of the rows
+        returns : list of 2-d arrays, one for each array in fp_list, with the shape of x broadcast to the columns of xp
+        """
+        rows, k = xp.shape
+        x = numpy.broadcast_to(numpy.asarray(x, dtype='float64'), (numpy.shape(x)[0], k))
+        n = numpy.full(k, rows) if n is None else numpy.asarray(n)
+        nan = numpy.isnan(x)
+        count = numpy.minimum(self.searchColumns(xp, x), n) # number of x-coordinates <= x
+        #numpy.interp finds the same position if the x-coordinates before it are all <= x (the ones after it are then all > x)
+        with numpy.errstate(invalid='ignore'):
+            before = numpy.take_along_axis(numpy.maximum.accumulate(xp, axis=0), numpy.maximum(count-1, 0), axis=0)
+            same = (count == 0) | (before <= x) | nan
+        fallback = numpy.flatnonzero(~same.all(axis=0) | numpy.isnan(xp).any(axis=0))
+        j = numpy.clip(count - 1, 0, numpy.maximum(n - 2, 0)) # xp[j] <= x < xp[j+1]
+        x_lo, x_hi = numpy.take_along_axis(xp, j, axis=0), numpy.take_along_axis(xp, j+1, axis=0)
+        exact = x_lo == x # x lands on a point of xp
+        left, right = count == 0, count == n
+        results = []
+        with numpy.errstate(all='ignore'):
+            for fp in fp_list:
+                fp = numpy.asarray(fp, dtype='float64')
+                fp_lo, fp_hi = numpy.take_along_axis(fp, j, axis=0), numpy.take_along_axis(fp, j+1, axis=0)
+                slope = (fp_hi - fp_lo) / (x_hi - x_lo)
+                y = slope*(x - x_lo) + fp_lo
+                retry = numpy.isnan(y) # numpy.interp retries from the upper point, then falls back to a flat segment
+                y[retry] = (slope*(x - x_hi) + fp_hi)[retry]
+                flat = numpy.isnan(y) & (fp_lo == fp_hi)
+                y[flat] = fp_lo[flat]
+                y[exact] = fp_lo[exact]
+                y = numpy.where(left, fp[0], y)
+                y = numpy.where(right, fp[n-1, numpy.arange(k)], y)
+                y[nan] = numpy.nan
+                for c in fallback:
+                    y[:, c] = numpy.interp(x[:, c], xp[:n[c], c], fp[:n[c], c])
+                results.append(y)
+        return results
+    
+    
+    def interpTotals(self, batch, x, fp_list):
+        """ Interpolates cumulative totals of the merit orders of a batch (e.g. a Full total curve) over their cumulative demand, with the same bounds as the interpolation functions
+        ---
+        batch : dictionary from batchMeritOrders
+        x : 2-d array of demand [MW], with one column per merit order or a single column shared by all of them
+        fp_list : list of 2-d arrays of cumulative totals, one row per position in the merit order
+        returns : list of 2-d arrays, see interpColumns
+        """
+        xp = batch['demand']
+        if (x < xp[0]).any() or (x > xp[-1]).any():
+            raise ValueError("A value in demand is outside the interpolation range.")
+        return self.interpColumns(xp, x, fp_list)
+    
+    
+    def returnDispatchMetrics(self, demand, metrics):
+        """ Given an array of demand, returns several dispatch metrics at once. This is the vectorized version of returnMarginalGenerator, 
+        returnFullMarginalValue, returnFullTotalValue, and returnFullTotalValueSubset: the Full totals share one position search and one gather per metric, 
+        and so do the categorical marginal generator columns.
+        ---
+        demand : array of demand [MW] (e.g. the demand of every hour of a week)
+        metrics : list of metric names, same names as the result columns of the dispatch class:
+            'gen_cost_marg' : generation cost of the marginal generator ($/MWh)
+            'marg_gen_' + column : column of the marginal generator (e.g. 'marg_gen_fuel_type', 'marg_gen_orispl_unit')
+            xxx + '_marg' : full_xxx_marg of the Full model (e.g. 'co2_marg', 'coal_mix_marg')
+            'gen_cost_tot', xxx + '_tot', xxx + '_mix', 'mmbtu_' + xxx : totals of the Full model (e.g. 'co2_tot', 'coal_mix', 'mmbtu_coal')
+            xxx + '_tot_subset' : totals of the Full model for the subset states (e.g. 'co2_tot_subset')
+        returns : dictionary of metric name : numpy array of the same length as demand
+        """
+        demand = numpy.asarray(demand, dtype='float64')
+        #sort the metrics into the lookups they need
+        marginal, totals, totals_subset = {}, {}, {}
+        for m in metrics:
+            if m == 'gen_cost_marg':
+                marginal[m] = self.marginalColumn('gen_cost')
+            elif m.startswith('marg_gen_'):
+                marginal[m] = self.marginalColumn(m[len('marg_gen_'):])
+            elif m.endswith('_tot_subset'):
+                totals_subset[m] = self.f_totalFull_subset[m[:-len('_tot_subset')]]
+            elif m.endswith('_marg'):
+                marginal[m] = self.marginalColumn('full_' + m)
+            else:
+                totals[m] = self.fullTotalFunction(m)
+        results = {}
+        #marginal generator: numeric columns are interpolated on the piecewise merit order (not always sorted, so numpy.interp is used as in returnMarginalGenerator)
+        #and categorical columns are decoded at the position of the marginal generator
+        categorical = {}
+        for m, col in marginal.items():
+            if pandas.api.types.is_numeric_dtype(self.df_marg_piecewise[col]):
+                results[m] = numpy.interp(demand, self.df_marg_piecewise['demand'], numpy.array(self.df_marg_piecewise[col], dtype='float64'))
+            else:
+                categorical[m] = self.marg_categorical[col] if col in self.marg_categorical else self.encodeCategorical(col)
+        if categorical:
+            ind = numpy.minimum(numpy.searchsorted(self.marg_demand, demand, side='right') - 1, len(self.df)-2) # last generator with cumulative demand <= demand
+            for m, (codes, uniques) in categorical.items():
+                results[m] = uniques[codes[ind+1]]
+        #Full totals: one search over the shared cumulative demand
+        if totals:
+            xp = next(iter(totals.values())).x
+            if (demand < xp[0]).any() or (demand > xp[-1]).any(): # same bounds as the interpolation functions
+                raise ValueError("A value in demand is outside the interpolation range.")
+            for m, y in zip(totals.keys(), self.interpShared(xp, demand, [f.y for f in totals.values()])):
+                results[m] = y
+        #Full totals of the subset states: out of bounds demand takes the highest value
+        if totals_subset:
+            xp = next(iter(totals_subset.values())).x
+            out_of_bounds = (demand < xp[0]) | (demand > xp[-1])
+            for m, y in zip(totals_subset.keys(), self.interpShared(xp, demand, [f.y for f in totals_subset.values()])):
+                y[out_of_bounds] = totals_subset[m].y[-1]
+                results[m] = y
+        return {m: results[m] for m in metrics}
+    
+    
+    def fullTotalFunction(self, metric):
+        """ Returns the Full model interpolation function of a total dispatch metric
+        ---
+        metric : 'gen_cost_tot', xxx + '_tot', xxx + '_mix', or 'mmbtu_' + xxx (e.g. 'co2_tot', 'coal_mix', 'mmbtu_coal')
+        returns : interpolation function from self.f_totalFull
+        """
+        if metric.startswith('mmbtu_'):
+            return self.f_totalFull[metric[len('mmbtu_'):] + '_consumption']
+        if metric.endswith('_tot') and metric != 'gen_cost_tot':
+            return self.f_totalFull[metric[:-len('_tot')]]
+        return self.f_totalFull[metric]
+    
+    
+    def returnSensitivities(self, demand, metrics, fuels=('gas', 'coal', 'oil')):
+        """ Given an array of demand, returns first-order sensitivities of the dispatch outputs from the sorted stack, without building a new bidStack:
+            'd_' + metric + '_d_demand' : local slope of the Full total curve of each total metric (e.g. kg of co2 per MW of extra demand)
+            'd_gen_cost_tot_d_' + fuel + '_price' : derivative of the total generation cost with respect to a multiplier on the fuel's prices ($ per 1.0 of multiplier), 
+                which is the fuel cost of the fuel's online generators while the merit order keeps its order
+            'd_gen_cost_marg_d_' + fuel + '_price' : derivative of the marginal generation cost with respect to the same multiplier ($/MWh), i.e. the fuel cost of the marginal generator if it burns the fuel
+            fuel + '_price_reorder_margin' : smallest change of the fuel's price multiplier (e.g. 0.05 for 5%) at which the marginal generator swaps places with one of its neighbours in the merit order, 
+                from their gen_cost gap and their fuel costs. The derivatives of this function are only valid for smaller changes (the other outputs, e.g. co2_tot or coal_mix, do not change until then)
+            'd_gen_cost_tot_d_' + e + '_price', 'd_gen_cost_marg_d_' + e + '_price' : the same derivatives for the emissions prices ($ per $/kg and $/MWh per $/kg), for e in 'co2', 'so2', 'nox'
+        The cost derivatives use the cumulative merit order without the minimum output adjustment of the Full model
+        ---
+        demand : array of demand [MW] (e.g. the demand of every hour of a week)
+        metrics : list of total dispatch metrics (e.g. ['gen_cost_tot', 'co2_tot', 'coal_mix', 'mmbtu_gas'])
+        fuels : tuple (or list) of fuel types with price multipliers
+        returns : dictionary of sensitivity name : numpy array of the same length as demand
+        """
+        demand = numpy.asarray(demand, dtype='float64')
+        df = self.df
+        t = str(self.time)
+        xp = df.demand.values.astype('float64')
+        results = {}
+        #slopes of the Full total curves, with one position search
+        j = numpy.clip(numpy.searchsorted(xp, demand, side='right') - 1, 0, len(xp)-2) # xp[j] <= demand < xp[j+1]
+        with numpy.errstate(all='ignore'):
+            for m in metrics:
+                f = self.fullTotalFunction(m)
+                k = j if len(f.x) == len(xp) else numpy.clip(numpy.searchsorted(f.x, demand, side='right') - 1, 0, len(f.x)-2) # own search if the function is compressed
+                slope = (f.y[k+1] - f.y[k]) / (f.x[k+1] - f.x[k])
+                results['d_' + m + '_d_demand'] = numpy.where(numpy.isfinite(slope), slope, 0.0)
+        #marginal generator and its neighbours in the merit order
+        pos = numpy.minimum(numpy.searchsorted(self.marg_demand, demand, side='right') - 1, len(df)-2) + 1 # position of the marginal generator
+        below, above = numpy.maximum(pos-1, 0), numpy.minimum(pos+1, len(df)-1)
+        gen_cost = df.gen_cost.values.astype('float64')
+        mw = df['mw' + t].values.astype('float64')
+        #cost derivatives
+        names, curves = [], []
+        for fuel in fuels:
+            fuel_cost = (df.fuel_cost * df['is_' + fuel]).values.astype('float64') # fuel cost of the fuel's generators [$/MWh]
+            names.append(fuel)
+            curves.append(numpy.nancumsum(mw * fuel_cost))
+            results['d_gen_cost_marg_d_' + fuel + '_price'] = fuel_cost[pos]
+            #multiplier change at which the marginal generator's gen_cost meets a neighbour's: gen_cost_m + x*fuel_cost_m = gen_cost_n + x*fuel_cost_n
+            with numpy.errstate(all='ignore'):
+                margin = numpy.fmin(numpy.abs((gen_cost[below] - gen_cost[pos]) / (fuel_cost[pos] - fuel_cost[below])), 
+                                    numpy.abs((gen_cost[above] - gen_cost[pos]) / (fuel_cost[pos] - fuel_cost[above])))
+            results[fuel + '_price_reorder_margin'] = numpy.where(numpy.isnan(margin), numpy.inf, margin)
+        for e in ['co2', 'so2', 'nox']:
+            rate = df[e + t].values.astype('float64') # [kg/MWh]
+            names.append(e)
+            curves.append(numpy.nancumsum(mw * rate))
+            results['d_gen_cost_marg_d_' + e + '_price'] = rate[pos]
+        for name, y in zip(names, self.interpShared(xp, demand, curves)):
+            results['d_gen_cost_tot_d_' + name + '_price'] = y
+        return results
+    
+    
+    def returnBatchMarginal(self, batch, demand, names):
+        """ The batched version of returnMarginalGenerator for numeric columns: interpolates the piecewise merit order (see createMarginalPiecewise) of each merit order of a batch
+        ---
+        batch : dictionary from batchMeritOrders
+        demand : 2-d array of demand [MW], with one column per merit order or a single column shared by all of them
+        names : list of numeric column headers (see batchColumn)
+        returns : list of 2-d arrays, one per name
+        """
+        return self.interpColumns(batch['piecewise'], demand, [numpy.repeat(self.batchColumn(batch, name).astype('float64'), 2, axis=0) for name in names])
+    
+    
+    def returnBatchMetrics(self, batch, demand, metrics):
+        """ The batched version of returnDispatchMetrics: given an array of demand, returns the dispatch metrics of every merit order of a batch, 
+        with one position search for all of the (demand, merit order) pairs of each lookup
+        ---
+        batch : dictionary from batchMeritOrders
+        demand : array of demand [MW] (e.g. the demand of every hour of a week), the same for all of the merit orders
+        metrics : list of metric names, see returnDispatchMetrics
+        returns : dictionary of metric name : 2-d array with one row per demand value and one column per merit order
+        """
+        demand = numpy.asarray(demand, dtype='float64')[:, None]
+        #sort the metrics into the lookups they need
+        marginal, categorical, totals, totals_subset = {}, {}, {}, {}
+        for m in metrics:
+            if m.endswith('_tot_subset') and not m.startswith('marg_gen_'):
+                totals_subset[m] = m[:-len('_tot_subset')]
+                continue
+            if m == 'gen_cost_marg':
+                name = 'gen_cost'
+            elif m.startswith('marg_gen_'):
+                name = m[len('marg_gen_'):]
+            elif m.endswith('_marg'):
+                name = 'full_' + m
+            else:
+                totals[m] = self.outputFamilies([m])[0]
+                continue
+            if self.batchColumn(batch, name).dtype.kind in 'fiub': # interpolation will only work for numbers
+                marginal[m] = name
+            else:
+                categorical[m] = self.batchColumn(batch, name)
+        results = dict(zip(marginal.keys(), self.returnBatchMarginal(batch, demand, list(marginal.values()))))
+        if categorical:
+            count = self.searchColumns(batch['demand'], demand)
+            ind = numpy.minimum(count - 1, len(batch['demand'])-2) # last generator with cumulative demand <= demand
+            for m, values in categorical.items():
+                results[m] = numpy.take_along_axis(values, ind+1, axis=0)
+        if totals:
+            results.update(zip(totals.keys(), self.interpTotals(batch, demand, [batch['full'][family] for family in totals.values()])))
+        #Full totals of the subset states: out of bounds demand takes the highest value
+        if totals_subset and self.subset_state_totals: # the sum of the per-state curves of the subset states, as in createTotalInterpolationFunctionsFull
+            states = self.returnBatchStates(batch, demand[:, 0], list(totals_subset.values()), {'subset': self.states_to_subset})['subset']
+            results.update({m: states[e] for m, e in totals_subset.items()})
+        elif totals_subset:
+            subset = batch['subset']
+            x, n = subset['x'], subset['n']
+            last = (n-1, numpy.arange(len(n)))
+            out_of_bounds = (demand < x[0]) | (demand > x[last])
+            for m, y in zip(totals_subset.keys(), self.interpColumns(x, demand, [subset['y'][e] for e in totals_subset.values()], n=n)):
+                results[m] = numpy.where(out_of_bounds, subset['y'][totals_subset[m]][last], y)
+        return {m: results[m] for m in metrics}
+    
+    
+    def returnBatchStates(self, batch, demand, emissions, state_groups):
+        """ The batched version of returnFullTotalValueStates: returns the Full total emissions of several groups of states for every merit order of a batch
+        ---
+        batch : dictionary from batchMeritOrders
+        demand : array of demand [MW], the same for all of the merit orders
+        emissions, state_groups : see returnFullTotalValueStates
+        returns : dictionary of group name : dictionary of emissions type : 2-d array with one row per demand value and one column per merit order
+        """
+        demand = numpy.asarray(demand, dtype='float64')[:, None]
+        xp = batch['demand']
+        curves, state_curves = {}, {}
+        for name, states in state_groups.items():
+            rows = batch['state_index'].get_indexer(list(states))
+            rows = rows[rows >= 0]
+            for e in emissions:
+                curve = numpy.zeros(xp.shape)
+                for r in rows: # the per-state curves of createStateTotals, added up in the order of the group
+                    if (e, r) not in state_curves:
+                        state_curves[(e, r)] = numpy.cumsum(numpy.where(batch['state_codes'] == r, batch['state_increase'][e], 0.0), axis=0)
+                    curve = curve + state_curves[(e, r)]
+                curves[(name, e)] = curve
+        out_of_bounds = (demand < xp[0]) | (demand > xp[-1])
+        results = {name: {} for name in state_groups}
+        for (name, e), y in zip(curves.keys(), self.interpColumns(xp, demand, list(curves.values()))):
+            results[name][e] = numpy.where(out_of_bounds, curves[(name, e)][-1], y)
+        return results
+    
+    
+    def returnBatchSensitivities(self, batch, demand, metrics, fuels=('gas', 'coal', 'oil')):
+        """ The batched version of returnSensitivities: returns the first-order sensitivities of every merit order of a batch
+        ---
+        batch : dictionary from batchMeritOrders
+        demand : array of demand [MW], the same for all of the merit orders
+        metrics, fuels : see returnSensitivities
+        returns : dictionary of sensitivity name : 2-d array with one row per demand value and one column per merit order
+        """
+        demand = numpy.asarray(demand, dtype='float64')[:, None]
+        xp = batch['demand']
+        n = len(xp)
+        def take(values, ind):
+            return numpy.take_along_axis(values, ind, axis=0)
+        results = {}
+        #slopes of the Full total curves, with one position search
+        count = self.searchColumns(xp, demand)
+        j = numpy.clip(count - 1, 0, n-2) # xp[j] <= demand < xp[j+1]
+        with numpy.errstate(all='ignore'):
+            for m in metrics:
+                y = batch['full'][self.outputFamilies([m])[0]]
+                slope = (take(y, j+1) - take(y, j)) / (take(xp, j+1) - take(xp, j))
+                results['d_' + m + '_d_demand'] = numpy.where(numpy.isfinite(slope), slope, 0.0)
+        #marginal generator and its neighbours in the merit order
+        pos = numpy.minimum(count - 1, n-2) + 1 # position of the marginal generator
+        below, above = numpy.maximum(pos-1, 0), numpy.minimum(pos+1, n-1)
+        gen_cost = self.batchColumn(batch, 'gen_cost')
+        mw = self.batchColumn(batch, 'mw')
+        #cost derivatives
+        names, curves = [], []
+        for fuel in fuels:
+            fuel_cost = self.batchColumn(batch, 'fuel_cost') * self.batchColumn(batch, 'is_' + fuel) # fuel cost of the fuel's generators [$/MWh]
+            names.append(fuel)
+            curves.append(numpy.nancumsum(mw * fuel_cost, axis=0))
+            results['d_gen_cost_marg_d_' + fuel + '_price'] = take(fuel_cost, pos)
+            with numpy.errstate(all='ignore'):
+                margin = numpy.fmin(numpy.abs((take(gen_cost, below) - take(gen_cost, pos)) / (take(fuel_cost, pos) - take(fuel_cost, below))), 
+                                    numpy.abs((take(gen_cost, above) - take(gen_cost, pos)) / (take(fuel_cost, pos) - take(fuel_cost, above))))
+            results[fuel + '_price_reorder_margin'] = numpy.where(numpy.isnan(margin), numpy.inf, margin)
+        for e in ['co2', 'so2', 'nox']:
+            rate = self.batchColumn(batch, e) # [kg/MWh]
+            names.append(e)
+            curves.append(numpy.nancumsum(mw * rate, axis=0))
+            results['d_gen_cost_marg_d_' + e + '_price'] = take(rate, pos)
+        for name, y in zip(names, self.interpColumns(xp, demand, curves)):
+            results['d_gen_cost_tot_d_' + name + '_price'] = y
+        return results
     
     
     def plotBidStack(self, df_column, plot_type, fig_dim = (4,4), production_cost_only=True):
@@ -2211,7 +3345,8 @@ class bidStack(object):
     
 
 class dispatch(object):
-    def __init__(self, bid_stack_object, demand_df,  states_to_subset = [], time_array=0):
+    def __init__(self, bid_stack_object, demand_df,  states_to_subset = [], time_array=0, outputs=None, state_groups=None, sensitivities=False, result_dtype='float64', 
+                 unique_demand=False, demand_resolution=None, time_step=None):
         """ Read in bid stack object and the demand data. Solve the dispatch by projecting the bid stack onto the demand time series,
             updating the bid stack object regularly according to the time_array
         ---
@@ -2220,75 +3355,466 @@ class dispatch(object):
         bid_stack_object : a bid stack object defined by class bidStack
         demand_df : a dataframe with the demand data 
         time_array : a scipy array containing the time intervals that we are changing fuel price etc. 
-        for. E.g. if we are doing weeks, then time_array=numpy.arange(52) + 1 to get an array of (1, 2, 3, ..., 51, 52)
+        for. E.g. if we are doing weeks, then time_array=numpy.arange(52) + 1 to get an array of (1, 2, 3, ..., 51, 52). bid_stack_object.calendar.periods is the whole year 
+        at the resolution of the generator data (e.g. 365 days)
+        outputs : list of result columns to calculate (e.g. ['co2_tot', 'co2_marg', 'gen_cost_marg', 'coal_mix']). None uses the outputs of bid_stack_object, 
+        which calculates all of the result columns if it has no outputs either
+        state_groups : dictionary of group name : list of 2-letter capital state abbreviations (e.g. {'GA': ['GA'], 'GA_AL_TN': ['GA', 'AL', 'TN'], 'NY_CT': ['NY', 'CT']}). 
+        The total emissions of each group are calculated in the same run from the per-state tables of the bidStack and saved in self.df_state_groups
+        sensitivities : if True, the first-order sensitivities of the results to demand, fuel prices, and emissions prices are calculated for each time period 
+        from its merit order (see bidStack.returnSensitivities) and saved in self.df_sensitivity
+        result_dtype : numpy dtype of the numeric result columns ('float64', or 'float32' to halve their memory)
+        unique_demand : if True, calcDispatchSlice evaluates each unique demand value of a slice once and broadcasts the results back to the hours (same results, 
+        fewer lookups when demand repeats, e.g. whole MW of CEMS gross load)
+        demand_resolution : if not None, calcDispatchSlice rounds demand to multiples of this resolution [MW] (e.g. 10.0) before evaluating the unique values. 
+        The realised demand error and a bound on the error of each total result column are saved in self.quantization_error (see quantizationError)
+        time_step : hours per row of demand_df (e.g. 1.0 for hourly data, 5/60. for 5-minute load traces). None infers it from the datetime column. 
+        The time periods and minimum downtime events are found by timestamp, and the total result columns (e.g. 'co2_tot', 'gen_cost_tot', 'coal_mix') 
+        are the totals over each row's time step (e.g. kg of co2 in 5 minutes), so they add up to the same units over a week as hourly data
         """
         self.bs = bid_stack_object
-        self.df = demand_df
+        self.df_input = demand_df # demand data. The results are kept in typed arrays (self.results) and self.df joins them to the demand data when it is read
+        self.result_dtype = result_dtype
         self.time_array = time_array
         self.states_to_subset = states_to_subset
+        self.state_groups = state_groups
+        self.outputs = outputs if outputs is not None else self.bs.outputs
+        #check that the bid stack calculated the merit order columns these outputs need
+        missing = [family for family in self.bs.outputFamilies(self.outputs) if family not in self.bs.output_families]
+        if missing != []:
+            raise ValueError('the bidStack object was not created with the outputs for ' + ', '.join(missing))
+        self.sensitivities = sensitivities
+        self.marginal_index = [] # (rows of self.df, bidStack.marginal_intervals) of each calcDispatchSlice call, in order, for returnMarginalHours
+        self.write_log = None # in the worker processes of calcDispatchAll, the list of slices calculated by calcDispatchSlice, which the main process writes
+        self.df_sensitivity = pandas.DataFrame() # one row of summed sensitivities per time period
+        self.compression_error = {} # time period : realised error of the compressed Full total interpolation functions of self.bs (if it has a compress_tolerance)
+        self.stream = None # output settings and progress of a streaming calcDispatchAll run (see openStream)
+        self.mdt_bidstacks = (None, {}) # (bs.processed_state, {demand_threshold : minimum downtime bidStack}) of the last processed merit order, see calcDispatchTimePeriod
+        self.unique_demand = unique_demand
+        self.demand_resolution = demand_resolution
+        self.quantization_error = {} # 'demand' : largest demand rounding error [MW], total result column : bound on its error, over all of the slices (if demand_resolution is not None)
+        if time_step is None: # median step of the datetime column [hours], 1.0 for hourly data
+            time_step = float(self.df_input.datetime.sort_values().diff().median() / pandas.Timedelta(hours=1)) if len(self.df_input) > 1 else 1.0
+        self.time_step = time_step
         self.addDFColumns() # adds columns to demand df to hold results
+        self.calcRowRanges() # rows of each time period and minimum downtime event
         
                
     def addDFColumns(self):
-        """ Add additional columns to self.df to hold the results of the dispatch. New cells initially filled with zeros
+        """ Allocates the result columns of the dispatch as typed arrays by position (self.results), initially filled with zeros: numeric columns are self.result_dtype 
+        and the marginal generator columns (e.g. 'marg_gen_fuel_type') are integer codes of their values. calcDispatchSlice writes its slices into them in place, 
+        and self.df, self.df_subset, and self.df_state_groups are built from them (once) when they are read
         ---
         """
-        indx = self.df.index
-        cols = scipy.array(('gen_cost_marg', 'gen_cost_tot', 'co2_marg', 'co2_tot', 'so2_marg', 'so2_tot', 'nox_marg', 
-                            'nox_tot', 'biomass_mix', 'coal_mix', 'gas_mix', 'geothermal_mix', 'hydro_mix', 'nuclear_mix',
-                            'oil_mix', 'marg_gen', 'coal_mix_marg', 'marg_gen_fuel_type', 'mmbtu_coal', 'mmbtu_gas', 'mmbtu_oil'))
-        dfExtension = pandas.DataFrame(index=indx, columns=cols).fillna(0)
-        self.df = pandas.concat([self.df, dfExtension], axis=1)
-        
-        if self.states_to_subset != []: # if there are states to subset, create miniature dataframe for subset results
-            self.df_subset = self.df[['datetime', 'demand', 'co2_tot', 'so2_tot', 'nox_tot']].copy(deep=True)
+        if self.outputs is None:
+            cols = numpy.array(('gen_cost_marg', 'gen_cost_tot', 'co2_marg', 'co2_tot', 'so2_marg', 'so2_tot', 'nox_marg', 
+                                'nox_tot', 'biomass_mix', 'coal_mix', 'gas_mix', 'geothermal_mix', 'hydro_mix', 'nuclear_mix',
+                                'oil_mix', 'marg_gen', 'coal_mix_marg', 'marg_gen_fuel_type', 'mmbtu_coal', 'mmbtu_gas', 'mmbtu_oil'))
+        else:
+            cols = numpy.array(self.outputs)
+        self.result_columns = list(cols)
+        #result columns filled by calcDispatchSlice ('marg_gen' is a placeholder that stays 0)
+        self.metrics = [c for c in cols if c != 'marg_gen']
+        self.total_metrics = [m for m in self.metrics if m == 'gen_cost_tot' or m.endswith('_tot') or m.endswith('_mix') or m.startswith('mmbtu_')] # totals of the Full model
+        self.emissions_subset = [e for e in ['co2', 'so2', 'nox'] if e + '_tot' in cols] # total emissions being calculated
+        self.result_codes = {c: {} for c in self.result_columns if c.startswith('marg_gen_')} # marginal generator column : dictionary of value : integer code
+        self.results = None # result column : numpy array with one value (or code) per row of the demand data, allocated when it is first used (see resultRows)
+        self.window = None # (lo, hi) positions of self.sorted_datetimes that the result arrays hold in a streaming run of calcDispatchAll (see moveWindow), None for all of the rows
+        self.results_built = False # whether self.df, self.df_subset, and self.df_state_groups hold the current results
+    
+    
+    def newResults(self, n):
+        """ Returns empty result arrays for n rows: zeros, and -1 for the integer codes of the marginal generator columns (rows that have not been dispatched)
+        ---
+        n : number of rows
+        returns : (dictionary of result column : array, dictionary of subset column : array or None, dictionary of group name : dictionary of column : array or None)
+        """
+        results = {}
+        for c in self.result_columns:
+            if c == 'marg_gen':
+                results[c] = numpy.zeros(n, dtype='int64')
+            elif c in self.result_codes:
+                results[c] = numpy.full(n, -1, dtype='int32')
+            else:
+                results[c] = numpy.zeros(n, dtype=self.result_dtype)
+        results_subset, results_state_groups = None, None
+        if self.states_to_subset != []: # if there are states to subset, create miniature results for subset emissions
+            results_subset = {e + '_tot': numpy.zeros(n, dtype=self.result_dtype) for e in self.emissions_subset}
+        if self.state_groups is not None: # one miniature set of results for each group of states
+            results_state_groups = {name: {e + '_tot': numpy.zeros(n, dtype=self.result_dtype) for e in self.emissions_subset} for name in self.state_groups}
+        return results, results_subset, results_state_groups
+    
+    
+    def resultRows(self, rows):
+        """ Converts rows of the demand data into positions of the result arrays. Outside of a streaming run the result arrays hold every row of the demand data 
+        (and are allocated the first time they are used); in a streaming run of calcDispatchAll they only hold the positions of self.sorted_datetimes in self.window
+        ---
+        rows : rows of the demand data (a slice or an array of positions)
+        returns : slice or array of positions of the result arrays
+        """
+        if self.window is None:
+            if self.results is None:
+                self.results, self.results_subset, self.results_state_groups = self.newResults(len(self.df_input))
+            return rows
+        lo, hi = self.window
+        positions = self.sortedPositions(rows, lo)
+        if isinstance(positions, slice):
+            first, last = positions.start, positions.stop
+        else:
+            first, last = (positions.min(), positions.max() + 1) if len(positions) > 0 else (0, 0)
+        if first < 0 or last > hi - lo:
+            raise ValueError('rows outside of the time periods that the streaming run still holds')
+        return positions
+    
+    
+    def moveWindow(self, lo, hi):
+        """ Moves the result arrays of a streaming run to the positions [lo, hi) of self.sorted_datetimes, keeping the results of the positions in both windows. 
+        The positions before lo have been written by writeStream (or are never dispatched), so their results are released
+        ---
+        lo, hi : first and last (excluded) positions of the new window
+        """
+        new = self.newResults(hi - lo)
+        if self.window is not None:
+            a, b = max(lo, self.window[0]), min(hi, self.window[1]) # positions in both windows
+            if a < b:
+                old = [(self.results, new[0])]
+                if new[1] is not None:
+                    old.append((self.results_subset, new[1]))
+                if new[2] is not None:
+                    old += [(self.results_state_groups[name], new[2][name]) for name in new[2]]
+                for old_arrays, new_arrays in old:
+                    for c, values in old_arrays.items():
+                        new_arrays[c][a-lo:b-lo] = values[a-self.window[0]:b-self.window[0]]
+        self.results, self.results_subset, self.results_state_groups = new
+        self.window = (lo, hi)
+        self.results_built = False
+    
+    
+    def writeResults(self, col, rows, values):
+        """ Writes the values of a result column into self.results in place by position. Values of the marginal generator columns are stored as integer codes
+        ---
+        col : result column (e.g. 'co2_tot' or 'marg_gen_fuel_type')
+        rows : rows of the demand data (a slice or an array of positions)
+        values : numpy array of values, one per row
+        """
+        rows = self.resultRows(rows)
+        self.results_built = False
+        if col in self.result_codes:
+            if values.dtype.kind in 'fiub': # a numeric marginal generator column (e.g. 'marg_gen_mw') is stored like the other numeric columns
+                del self.result_codes[col]
+                self.results[col] = numpy.zeros(len(self.results[col]), dtype=self.result_dtype)
+            else:
+                codes = self.result_codes[col]
+                local_codes, uniques = pandas.factorize(values) # nan values are coded as -1
+                for value in uniques:
+                    codes.setdefault(value, len(codes))
+                if None not in codes and (local_codes == -1).any():
+                    codes[None] = len(codes) # key for nan values (factorize never returns None as a value), decoded back to nan
+                lookup = numpy.array([codes[value] for value in uniques] + [codes.get(None, -1)], dtype='int32')
+                self.results[col][rows] = lookup[local_codes]
+                return
+        self.results[col][rows] = values
+    
+    
+    def buildResultFrames(self):
+        """ Joins the typed result arrays to the demand data to build self.df (and self.df_subset and self.df_state_groups), decoding the marginal generator columns. 
+        Rows that have not been dispatched are 0, as before
+        ---
+        """
+        if self.window is not None:
+            raise ValueError('the results of a streaming calcDispatchAll run are not kept in memory, read them from its stream_dir dataset or stream_csv files')
+        self._df, self._df_subset, self._df_state_groups = self.resultFrames()
+        self.results_built = True
+    
+    
+    def resultFrames(self, rows=None):
+        """ Joins the typed result arrays of some rows to the demand data, decoding the marginal generator columns
+        ---
+        rows : rows of the demand data (a slice or an array of positions). None uses all of the rows
+        returns : (dispatch dataframe, subset dataframe or None, dictionary of group name : state group dataframe or None)
+        """
+        rows = slice(None) if rows is None else rows
+        demand = self.df_input.iloc[rows]
+        positions = self.resultRows(rows)
+        columns = {}
+        for c in self.result_columns:
+            if c in self.result_codes:
+                uniques = numpy.empty(len(self.result_codes[c]) + 1, dtype=object)
+                uniques[:-1] = [numpy.nan if k is None else k for k in self.result_codes[c]]
+                uniques[-1] = 0 # code -1
+                columns[c] = uniques[self.results[c][positions]]
+            else:
+                columns[c] = self.results[c][positions]
+        df = pandas.concat([demand, pandas.DataFrame(columns, index=demand.index)], axis=1)
+        df_subset, df_state_groups = None, None
+        if self.states_to_subset != []:
+            df_subset = pandas.concat([demand[['datetime', 'demand']], pandas.DataFrame({c: v[positions] for c, v in self.results_subset.items()}, index=demand.index)], axis=1)
+        if self.state_groups is not None:
+            df_state_groups = {name: pandas.concat([demand[['datetime', 'demand']], pandas.DataFrame({c: v[positions] for c, v in results.items()}, index=demand.index)], axis=1) 
+                               for name, results in self.results_state_groups.items()}
+        return df, df_subset, df_state_groups
+    
+    
+    @property
+    def df(self):
+        """ demand data with the dispatch results, built from self.results when read """
+        if not self.results_built:
+            self.buildResultFrames()
+        return self._df
+    
+    
+    @property
+    def df_subset(self):
+        """ datetime, demand, and total emissions of the units in self.states_to_subset, built from self.results_subset when read """
+        if not self.results_built:
+            self.buildResultFrames()
+        return self._df_subset
+    
+    
+    @property
+    def df_state_groups(self):
+        """ dictionary of group name : datetime, demand, and total emissions of the group's units, built from self.results_state_groups when read """
+        if not self.results_built:
+            self.buildResultFrames()
+        return self._df_state_groups
 
 
-    def calcDispatchSlice(self, bstack, start_date=0, end_date=0):
+    def calcRowRanges(self):
+        """ Finds the rows of self.df in each time period of self.time_array and in each coal minimum downtime event of self.bs.mdt_coal_events once, 
+        with searchsorted on the sorted datetime column, so that calcDispatchSlice can address its slices by position instead of comparing every datetime
+        ---
+        """
+        datetimes = self.df_input.datetime.values
+        self.datetime_order = None if self.df_input.datetime.is_monotonic_increasing else numpy.argsort(datetimes, kind='stable') # positions of self.df in datetime order
+        self.sorted_datetimes = datetimes if self.datetime_order is None else datetimes[self.datetime_order]
+        if self.datetime_order is not None: # position of each row of self.df in self.sorted_datetimes
+            self.sorted_positions = numpy.empty(len(self.datetime_order), dtype='int64')
+            self.sorted_positions[self.datetime_order] = numpy.arange(len(self.datetime_order))
+        #start and end dates and rows of each time period
+        self.period_dates = {} # time period : (start date, end date)
+        self.period_rows = {} # time period : rows of self.df
+        self.period_positions = {} # time period : (lo, hi) range of positions in self.sorted_datetimes
+        if numpy.ndim(self.time_array) != 0:
+            for t in self.time_array:
+                self.period_dates[t] = self.periodDates(t)
+                self.period_positions[t] = self.slicePositions(*self.period_dates[t])
+                self.period_rows[t] = self.rowsFromPositions(*self.period_positions[t])
+        #rows of each coal minimum downtime event, by the event's index label
+        self.mdt_event_rows = {}
+        events = self.bs.mdt_coal_events
+        if events is not None and len(events) > 0 and events.index.is_unique:
+            lo = numpy.searchsorted(self.sorted_datetimes, pandas.to_datetime(events.start).values, side='left')
+            hi = numpy.searchsorted(self.sorted_datetimes, pandas.to_datetime(events.end).values, side='left')
+            self.mdt_event_rows = {i: self.rowsFromPositions(a, b) for i, a, b in zip(events.index, lo, hi)}
+    
+    
+    def periodDates(self, t):
+        """ Returns the start and end dates of time period t (e.g. week 15) of the year
+        ---
+        t : time period of self.time_array
+        returns : (start, end) strings of format 'yyyy-mm-dd'. The time period includes start and excludes end
+        """
+        return self.bs.calendar.periodDates(t)
+    
+    
+    def sliceRows(self, start_date=0, end_date=0):
+        """ Returns the rows of self.df with start_date <= datetime < end_date
+        ---
+        start_date : string of format '2014-01-31' i.e. 'yyyy-mm-dd' (or a datetime). If argument == 0, uses start date of demand time series
+        end_date : string of format '2014-01-31' i.e. 'yyyy-mm-dd' (or a datetime). If argument == 0, uses end date of demand time series
+        returns : slice of the positions of self.df if the datetime column is sorted, otherwise an array of positions
+        """
+        return self.rowsFromPositions(*self.slicePositions(start_date, end_date))
+    
+    
+    def slicePositions(self, start_date=0, end_date=0):
+        """ Returns the range [lo, hi) of positions in self.sorted_datetimes with start_date <= datetime < end_date (arguments as in sliceRows)
+        ---
+        """
+        start_date = self.df_input.datetime.min() if start_date==0 else pandas.Timestamp(start_date)
+        end_date = self.df_input.datetime.max() if end_date==0 else pandas.Timestamp(end_date)
+        lo, hi = numpy.searchsorted(self.sorted_datetimes, numpy.array([start_date, end_date], dtype=self.sorted_datetimes.dtype), side='left')
+        return int(lo), int(hi)
+    
+    
+    def rowsFromPositions(self, lo, hi):
+        """ Converts a range [lo, hi) of positions in self.sorted_datetimes into rows of self.df
+        ---
+        """
+        return slice(int(lo), int(hi)) if self.datetime_order is None else self.datetime_order[lo:hi]
+    
+    
+    def sortedPositions(self, rows, offset=0):
+        """ Converts rows of self.df into positions in self.sorted_datetimes (the inverse of rowsFromPositions)
+        ---
+        rows : rows of self.df (a slice or an array of positions)
+        offset : subtracted from the positions (e.g. the first position of a window of them)
+        returns : slice or array of positions
+        """
+        if isinstance(rows, slice): # a slice of rows is a slice of self.sorted_datetimes (see rowsFromPositions)
+            return slice(rows.start - offset, rows.stop - offset)
+        return (numpy.asarray(rows) if self.datetime_order is None else self.sorted_positions[rows]) - offset
+    
+    
+    def calcDispatchSlice(self, bstack, start_date=0, end_date=0, rows=None):
         """ For each datum in demand time series (e.g. each hour) between start_date and end_date calculate the dispatch
         ---
         bstack: an object created using the simple_dispatch.bidStack class
         start_datetime : string of format '2014-01-31' i.e. 'yyyy-mm-dd'. If argument == 0, uses start date of demand time series
         end_datetime : string of format '2014-01-31' i.e. 'yyyy-mm-dd'. If argument == 0, uses end date of demand time series
+        rows : rows of self.df to dispatch (e.g. self.period_rows[t] or self.mdt_event_rows[i]), which replace start_date and end_date
         """
-        if start_date==0:
-            start_date = self.df.datetime.min()
-        else:
-            start_date = pandas._libs.tslib.Timestamp(start_date)
-        if end_date==0:
-            end_date = self.df.datetime.max()
-        else:
-            end_date = pandas._libs.tslib.Timestamp(end_date)
-        #slice of self.df within the desired dates    
-        df_slice = self.df[(self.df.datetime >= pandas._libs.tslib.Timestamp(start_date)) & 
-                           (self.df.datetime < pandas._libs.tslib.Timestamp(end_date))].copy(deep=True)
-        #calculate the dispatch for the slice by applying the return###### functions of the bstack object
-        df_slice['gen_cost_marg'] = df_slice.demand.apply(bstack.returnMarginalGenerator, args=('gen_cost',)) #generation cost of the marginal generator ($/MWh)
-        df_slice['gen_cost_tot'] = df_slice.demand.apply(bstack.returnFullTotalValue, args=('gen_cost_tot',)) #generation cost of the total generation fleet ($)
-        for e in ['co2', 'so2', 'nox']:
-            df_slice[e + '_marg'] = df_slice.demand.apply(bstack.returnFullMarginalValue, args=(e,)) #emissions rate (kg/MWh) of marginal generators
-            df_slice[e + '_tot'] = df_slice.demand.apply(bstack.returnFullTotalValue, args=(e,)) #total emissions (kg) of online generators
-        # df_slice['dmg_easiur'] = df_slice.demand.apply(bstack.returnFullTotalValue, args=('dmg_easiur',)) #total easiur damages ($)
-        for f in ['gas', 'oil', 'coal', 'nuclear', 'biomass', 'geothermal', 'hydro']:
-            df_slice[f + '_mix'] = df_slice.demand.apply(bstack.returnFullTotalValue, args=(f+'_mix',))
-        df_slice['coal_mix_marg'] = df_slice.demand.apply(bstack.returnFullMarginalValue, args=('coal_mix',))
-        df_slice['marg_gen_fuel_type'] = df_slice.demand.apply(bstack.returnMarginalGenerator, args=('fuel_type',))
-        df_slice['mmbtu_coal'] = df_slice.demand.apply(bstack.returnFullTotalValue, args=('coal_consumption',)) #total coal mmBtu
-        df_slice['mmbtu_gas'] = df_slice.demand.apply(bstack.returnFullTotalValue, args=('gas_consumption',)) #total gas mmBtu        
-        df_slice['mmbtu_oil'] = df_slice.demand.apply(bstack.returnFullTotalValue, args=('oil_consumption',)) #total oil mmBtu
-        self.df[(self.df.datetime >= pandas._libs.tslib.Timestamp(start_date)) & (self.df.datetime < pandas._libs.tslib.Timestamp(end_date))] = df_slice
-        
+        if rows is None:
+            rows = self.sliceRows(start_date, end_date)
+        demand = self.df_input.demand.values[rows]
+        #evaluate each unique (optionally rounded) demand value once; inverse maps the hours back to their unique values
+        inverse, quantization_error = None, None
+        if self.unique_demand or self.demand_resolution is not None:
+            demand_eval = demand if self.demand_resolution is None else numpy.round(demand / self.demand_resolution) * self.demand_resolution
+            if self.demand_resolution is not None:
+                quantization_error = self.quantizationError(bstack, demand, demand_eval)
+            demand, inverse = numpy.unique(demand_eval, return_inverse=True)
+        #calculate the dispatch for the slice with one vectorized query of the bstack object for the result columns in self.metrics
+        #gen_cost_marg : generation cost of the marginal generator ($/MWh); gen_cost_tot : generation cost of the total generation fleet ($)
+        #xxx_marg : emissions rate (kg/MWh) of marginal generators; xxx_tot : total emissions (kg) of online generators; mmbtu_xxx : total fuel consumption (mmBtu)
+        values = bstack.returnDispatchMetrics(demand, self.metrics)
+        values_subset, values_state_groups = None, None
         if self.states_to_subset != []: # if there are states to subset, repeat for emissions
-            #slice of self.df within the desired dates    
-            df_slice = self.df_subset[(self.df_subset.datetime >= pandas._libs.tslib.Timestamp(start_date)) & 
-                               (self.df_subset.datetime < pandas._libs.tslib.Timestamp(end_date))].copy(deep=True)
-            for e in ['co2', 'so2', 'nox']:
-                df_slice[e + '_tot'] = df_slice.demand.apply(bstack.returnFullTotalValueSubset, args=(e,)) #total emissions (kg) of subsetted online generators 
-            # replace df slice in relevant period
-            self.df_subset[(self.df_subset.datetime >= pandas._libs.tslib.Timestamp(start_date)) 
-                           & (self.df_subset.datetime < pandas._libs.tslib.Timestamp(end_date))] = df_slice
-  
+            values_subset = bstack.returnDispatchMetrics(demand, [e + '_tot_subset' for e in self.emissions_subset])
+        if self.state_groups is not None: # if there are groups of states, repeat for their emissions with one query for all of the groups
+            values_state_groups = bstack.returnFullTotalValueStates(demand, self.emissions_subset, self.state_groups)
+        if self.time_step != 1.0: # the Full total curves are per hour, the total result columns are per time step
+            values.update({c: values[c] * self.time_step for c in self.total_metrics})
+            if values_subset is not None:
+                values_subset = {c: v * self.time_step for c, v in values_subset.items()}
+            if values_state_groups is not None:
+                values_state_groups = {name: {e: v * self.time_step for e, v in group.items()} for name, group in values_state_groups.items()}
+        if inverse is not None: # broadcast the unique values back to the hours
+            values = {c: v[inverse] for c, v in values.items()}
+            if values_subset is not None:
+                values_subset = {c: v[inverse] for c, v in values_subset.items()}
+            if values_state_groups is not None:
+                values_state_groups = {name: {e: v[inverse] for e, v in group.items()} for name, group in values_state_groups.items()}
+        self.writeSlice(rows, bstack.marginal_intervals, values, values_subset, values_state_groups, quantization_error)
+    
+    
+    def quantizationError(self, bstack, demand, demand_eval):
+        """ Returns the error of evaluating a slice at rounded demand: the largest demand rounding error, and for each total result column (e.g. 'co2_tot', 'coal_mix') 
+        a bound on its error, which is the largest demand error times the steepest slope of the column's Full total curve over the slice's demand range. 
+        The marginal result columns (e.g. 'co2_marg', 'marg_gen_fuel_type') are steps along the merit order, so rounding can change them by a whole generator and they have no bound
+        ---
+        bstack : bidStack object that dispatches the slice
+        demand : numpy array of demand [MW]
+        demand_eval : numpy array of rounded demand [MW]
+        returns : dictionary of 'demand' or result column : error
+        """
+        error = numpy.abs(demand - demand_eval)
+        if len(error) == 0 or numpy.isnan(error).all():
+            return {}
+        bounds = {'demand': numpy.nanmax(error)}
+        lo, hi = numpy.nanmin(numpy.minimum(demand, demand_eval)), numpy.nanmax(numpy.maximum(demand, demand_eval))
+        for m in self.total_metrics:
+            f = bstack.fullTotalFunction(m)
+            i0 = max(numpy.searchsorted(f.x, lo, side='right') - 1, 0)
+            i1 = min(numpy.searchsorted(f.x, hi, side='left'), len(f.x) - 1)
+            with numpy.errstate(all='ignore'):
+                slope = numpy.abs(numpy.diff(f.y[i0:i1+1]) / numpy.diff(f.x[i0:i1+1])) # a step at a repeated demand value is an infinite slope
+            slope = slope[~numpy.isnan(slope)]
+            bounds[m] = bounds['demand'] * slope.max() * self.time_step if len(slope) > 0 else 0.0
+        return bounds
+    
+    
+    def writeSlice(self, rows, marginal_intervals, values, values_subset=None, values_state_groups=None, quantization_error=None):
+        """ Writes the results of one slice calculated by calcDispatchSlice into the result arrays. In a worker process of calcDispatchAll, 
+        the slice is added to self.write_log instead, and the main process writes it in the same order as a serial run would
+        ---
+        rows : rows of self.df of the slice
+        marginal_intervals : bidStack.marginal_intervals of the bidStack that dispatched the slice, for returnMarginalHours
+        values : dictionary of result column : numpy array
+        values_subset : dictionary of emissions type + '_tot_subset' : numpy array for self.states_to_subset
+        values_state_groups : dictionary of group name : dictionary of emissions type : numpy array for self.state_groups
+        quantization_error : dictionary from quantizationError, kept as the largest error of each column in self.quantization_error
+        """
+        if self.write_log is not None:
+            self.write_log.append((rows, marginal_intervals, values, values_subset, values_state_groups, quantization_error))
+            return
+        if quantization_error is not None:
+            for c, error in quantization_error.items():
+                self.quantization_error[c] = max(self.quantization_error.get(c, 0.0), error)
+        self.marginal_index.append((rows, marginal_intervals))
+        for col, v in values.items():
+            self.writeResults(col, rows, v)
+        positions = self.resultRows(rows)
+        if values_subset is not None:
+            for e in self.emissions_subset:
+                self.results_subset[e + '_tot'][positions] = values_subset[e + '_tot_subset'] #total emissions (kg) of subsetted online generators 
+        if values_state_groups is not None:
+            for name, results in self.results_state_groups.items():
+                for e in self.emissions_subset:
+                    results[e + '_tot'][positions] = values_state_groups[name][e] #total emissions (kg) of the group's online generators
 
+
+    def returnMarginalHours(self, units):
+        """ Returns the hours in which each of the given generators was the marginal generator, without re-dispatching. The [s, f) marginal demand interval 
+        of each generator in the merit order of each dispatched slice (including the minimum downtime re-dispatch, which overrides the hours it covers) is joined 
+        against the slice's sorted hourly demand
+        ---
+        units : list of orispl_units
+        returns : dataframe with one row per (orispl_unit, hour) holding the orispl_unit, the datetime and demand of the hour, and the generator's marginal demand interval s and f [MW], 
+        indexed by the hour's index in self.df
+        """
+        datetimes = self.df_input.datetime.values
+        demand = self.df_input.demand.values.astype('float64')
+        #the last slice that dispatched each hour
+        source = numpy.full(len(self.df_input), -1)
+        for i, (rows, intervals) in enumerate(self.marginal_index):
+            source[rows] = i
+        tables = []
+        for i, (rows, intervals) in enumerate(self.marginal_index):
+            hours = numpy.flatnonzero(source == i)
+            units_i = intervals[intervals.index.isin(units)]
+            if len(hours) == 0 or len(units_i) == 0:
+                continue
+            order = numpy.argsort(demand[hours], kind='stable')
+            sorted_demand = demand[hours][order]
+            lo = numpy.searchsorted(sorted_demand, units_i.s.values, side='left') # first hour with demand >= s
+            counts = numpy.searchsorted(sorted_demand, units_i.f.values, side='left') - lo # hours with s <= demand < f
+            #positions in sorted_demand of each unit's hours, lo, lo+1, ..., lo+count-1 for each unit
+            ind = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + numpy.repeat(lo, counts)
+            rows = hours[order[ind]]
+            tables.append(pandas.DataFrame({'orispl_unit': numpy.repeat(units_i.index.values, counts), 'datetime': datetimes[rows], 'demand': demand[rows], 
+                                            's': numpy.repeat(units_i.s.values, counts), 'f': numpy.repeat(units_i.f.values, counts)}, index=self.df_input.index[rows]))
+        if tables == []:
+            return pandas.DataFrame(columns=['orispl_unit', 'datetime', 'demand', 's', 'f'])
+        return pandas.concat(tables, axis=0).sort_values(['orispl_unit', 'datetime'], kind='mergesort')
+    
+    
+    def calcSensitivitySlice(self, bstack, start_date=0, end_date=0, t=0, rows=None):
+        """ Calculates the sensitivities of the dispatch results (see bidStack.returnSensitivities) for each datum in demand time series between start_date and end_date 
+        and adds them up into one row of self.df_sensitivity for time period t. Derivatives of totals and the demand are summed over the slice 
+        (e.g. 'd_co2_tot_d_demand' is the change of the slice's total co2 [kg] for 1 MW more demand in every hour), derivatives of the marginal generation cost are averaged, 
+        and the reorder margins are the smallest of the slice. The minimum downtime re-dispatch of calcDispatchTimePeriod is not included
+        ---
+        bstack: an object created using the simple_dispatch.bidStack class
+        start_date, end_date : same as calcDispatchSlice
+        t : time period (e.g. week 15), the index of the row of self.df_sensitivity
+        rows : rows of self.df (e.g. self.period_rows[t]), which replace start_date and end_date
+        """
+        if rows is None:
+            rows = self.sliceRows(start_date, end_date)
+        demand = self.df_input.demand.values[rows]
+        #sums over the slice are weighted by the time step, so they are per hour of the slice whatever the time step of the demand data
+        row = {'hours': len(demand) * self.time_step, 'demand': demand.sum() * self.time_step}
+        for name, values in bstack.returnSensitivities(demand, self.total_metrics).items():
+            if name.startswith('d_gen_cost_marg'):
+                row[name] = values.mean() if len(values) > 0 else numpy.nan
+            elif name.endswith('_reorder_margin'):
+                row[name] = values.min() if len(values) > 0 else numpy.nan
+            else:
+                row[name] = values.sum() * self.time_step
+        self.df_sensitivity = pandas.concat([self.df_sensitivity.drop(t, axis=0, errors='ignore'), pandas.DataFrame(row, index=[t])], axis=0)
+    
+    
     def createDfMdtCoal(self, demand_threshold, time_t):
         """ For a given demand threshold, creates a new version of the generator data that approximates the minimum down time constraint for coal plants
         ---
@@ -2373,7 +3899,7 @@ class dispatch(object):
         return mdt_coal_events_t
     
               
-    def calcDispatchAll(self):
+    def calcDispatchAll(self, workers=1, stream_dir=None, stream_region=None, stream_csv=None, checkpoint_dir=None):
         """ Runs calcDispatchSlice for each time slice in the fuel_prices_over_time dataframe, NOTE: this description looks really old
         creating a new bidstack each time. So, fuel_prices_over_time contains multipliers (e.g. 0.95 or 1.14) for each 
         fuel type (e.g. ng, lig, nuc) for different slices of time (e.g. start_date = '2014-01-07' and end_date = '2014-01-14'). 
@@ -2385,46 +3911,693 @@ class dispatch(object):
         Right now the only thing changing per chunk of time is the fuel prices based on trends in national commodity prices. 
         Future versions might try and do regional price trends and add things like maintenance downtime or other seasonal factors.
         ---
+        workers : number of processes that calculate the time periods in parallel. Each worker process gets a copy of this dispatch object (and its bidStack) once, 
+        then calculates whole time periods (updateTime, the dispatch, and the minimum downtime re-dispatch). The main process writes their slices in time period order, 
+        so the results are the same as with workers=1
+        stream_dir : if not None, each time period is written as soon as it is final (after its own minimum downtime re-dispatch and those of any later time period that reaches back into it) 
+        to a partitioned parquet dataset in this folder: stream_dir/table/region=.../year=.../week=.../part-0.parquet (day=... or month=... for other calendars), where table is 'dispatch' (self.df), 'subset' (self.df_subset), 
+        or 'state_groups' (self.df_state_groups, with a state_group column). Downstream readers (e.g. pandas.read_parquet(stream_dir + '/dispatch')) can start on the early weeks 
+        while the run continues. The result arrays only hold the rows of the time periods that are not final yet (see moveWindow), so a streaming run never holds a whole year of results, 
+        and self.df, self.df_subset, and self.df_state_groups are not available after it. See writeStream
+        stream_region : region partition of the dataset. None uses the nerc region of self.bs
+        stream_csv : dictionary of table name (as above) : csv file name, to also append each time period to csv files in the same format as self.df.to_csv(fn, index=False)
+        checkpoint_dir : if not None, the slices of each completed time period are saved in checkpoint_dir/fingerprint/ (see fingerprint and saveCheckpoint). 
+        Calling calcDispatchAll again (e.g. after a failure) on a dispatch object with the same inputs and options replays the saved time periods 
+        instead of calculating them and goes straight to the remaining ones, so the results are the same as an uninterrupted run
         fills in the self.df dataframe one time slice at a time
         """
+        if stream_dir is not None or stream_csv is not None:
+            self.openStream(stream_dir, stream_region, stream_csv)
+        elif self.window is not None: # the results of an earlier streaming run have been released, so start again with result arrays for all of the rows
+            self.results, self.window = None, None
         #run the whole solution if self.fuel_prices_over_time isn't being used
-        if scipy.shape(self.time_array) == (): #might be a more robust way to do this. Would like to say if ### == 0, but doing that when ### is a dataframe gives an error
+        if numpy.ndim(self.time_array) == 0: # a scalar time_array (e.g. 0)
             self.calcDispatchSlice(self.bs)
+            if self.sensitivities:
+                self.calcSensitivitySlice(self.bs)
         #otherwise, run the dispatch in time slices, updating the bid stack each slice
-        else:
-            for t in self.time_array:
+        elif workers == 1 and checkpoint_dir is None:
+            for k, t in enumerate(self.time_array):
                 #update the bidStack object to the current week - reprocesses merit order for current week's fuel prices
                 self.bs.updateTime(t)
-                #calculate the dispatch for the time slice over which the updated fuel prices are relevant
-                start = (datetime.datetime.strptime(str(self.bs.year) + '-01-01', '%Y-%m-%d') + datetime.timedelta(days=7.05*(t-1)-1)).strftime('%Y-%m-%d') 
-                end = (datetime.datetime.strptime(str(self.bs.year) + '-01-01', '%Y-%m-%d') + datetime.timedelta(days=7.05*(t)-1)).strftime('%Y-%m-%d')
-                if (self.bs.year % 4 == 0) & (t == 52): # account for leap years, add in extra day in last week
-                    end = (datetime.datetime.strptime(str(self.bs.year) + '-01-01', '%Y-%m-%d') + datetime.timedelta(days=7.05*(t))).strftime('%Y-%m-%d') 
-                #note that calcDispatchSlice updates self.df, so there is no need to do it in this calcDispatchAll function
-                self.calcDispatchSlice(self.bs, start_date=start ,end_date=end)
-                #coal minimum downtime
-                #recalculate the dispatch for times when generatorData pre-processing estimates that the minimum downtime constraint for coal plants would trigger
-                #define the coal merit order
-                coal_merit_order = self.bs.df[(self.bs.df.fuel_type == 'coal')][['orispl_unit', 'demand']]
-                #slice and bin the coal minimum downtime events
-                events_mdt_coal_t = self.calcMdtCoalEventsT(start, end, coal_merit_order)  
-                #create a dictionary for holding the updated bidStacks, which change depending on the demand_threshold                
-                bs_mdt_dict = {}
-                #for each unique demand_threshold
-                for dt in events_mdt_coal_t.demand_threshold.unique():
-                    #create an updated version of gd.df
-                    gd_df_mdt_temp = self.bs.df_0.copy()
-                    gd_df_mdt_temp.update(self.createDfMdtCoal(dt, t))
-                    #use that updated gd.df to create an updated bidStack object, and store it in the bs_mdt_dict
-                    bs_temp = copy.deepcopy(self.bs)
-                    bs_temp.coal_mdt_demand_threshold = dt
-                    bs_temp.updateDf(gd_df_mdt_temp)
-                    bs_mdt_dict.update({dt:bs_temp})
-                #for each minimum downtime event, recalculate the dispatch by inputting the bs_mdt_dict bidStacks into calcDispatchSlice to override the existing dp.df results dataframe
-                for i, e in events_mdt_coal_t.iterrows():
-                    self.calcDispatchSlice(bs_mdt_dict[e.demand_threshold], start_date=e.start ,end_date=e.end)
+                self.extendStream(k)
+                self.calcDispatchTimePeriod(t)
+                self.flushStream(k)
                 print(str(round(t/float(len(self.time_array)),3)*100) + '% Complete')
-                
+        #or calculate the time periods that have not been checkpointed (in worker processes, or here) and write their slices here, in time period order
+        else:
+            completed = self.openCheckpoint(checkpoint_dir) if checkpoint_dir is not None else set()
+            pending = [t for t in self.time_array if t not in completed]
+            pool = multiprocessing.Pool(workers, initializer=_initDispatchWorker, initargs=(self,)) if (workers > 1) & (pending != []) else None
+            try:
+                calculated = pool.imap(_calcDispatchWorkerTimePeriod, pending) if pool is not None else (self.calcDispatchTimePeriodLog(t) for t in pending)
+                for k, t in enumerate(self.time_array):
+                    if t in completed:
+                        period = self.loadCheckpoint(t)
+                    else:
+                        period = next(calculated)
+                        if checkpoint_dir is not None:
+                            self.saveCheckpoint(period)
+                    self.extendStream(k)
+                    self.writeTimePeriod(*period)
+                    self.flushStream(k)
+                    print(str(round(t/float(len(self.time_array)),3)*100) + '% Complete')
+            finally:
+                if pool is not None:
+                    pool.terminate()
+            if (pool is not None) | (pending[-1:] != [self.time_array[-1]]):
+                self.bs.updateTime(self.time_array[-1]) # leave the bidStack object at the last time period, as the serial run does
+        self.flushStream(None) # write the time periods that are still open (the last ones, or the whole run) and release their results
+        self.stream = None
+    
+    
+    def calcDispatchTimePeriodLog(self, t):
+        """ Updates self.bs to time period t and calculates the time period like calcDispatchAll, but keeps its slices instead of writing them (see writeSlice)
+        ---
+        t : time period (e.g. week 15)
+        returns : (t, slices calculated by calcDispatchSlice in order, row of df_sensitivity or None, bs.compression_error or None), which writeTimePeriod writes
+        """
+        self.write_log = []
+        try:
+            self.bs.updateTime(t)
+            self.calcDispatchTimePeriod(t)
+            sensitivity = self.df_sensitivity.loc[[t]] if self.sensitivities else None
+            return t, self.write_log, sensitivity, self.compression_error.get(t)
+        finally:
+            self.write_log = None
+    
+    
+    def writeTimePeriod(self, t, write_log, sensitivity=None, compression_error=None):
+        """ Writes a time period returned by calcDispatchTimePeriodLog (in a worker process, or from a checkpoint) into the results, in the same order as a serial run
+        ---
+        """
+        for entry in write_log:
+            self.writeSlice(*entry)
+        if sensitivity is not None:
+            self.df_sensitivity = pandas.concat([self.df_sensitivity.drop(t, axis=0, errors='ignore'), sensitivity], axis=0)
+        if compression_error is not None:
+            self.compression_error[t] = compression_error
+    
+    
+    def fingerprint(self):
+        """ Returns a hash of the inputs and options that determine the results of calcDispatchAll: the generator data, minimum downtime events, and options of self.bs, 
+        and the demand data and options of this dispatch object. It keys the checkpoints of calcDispatchAll, so that a checkpoint is never replayed into a different run
+        ---
+        returns : hexadecimal string
+        """
+        h = hashlib.sha256()
+        for frame in [self.bs.df_0, self.bs.mdt_coal_events, self.df_input]:
+            if frame is None:
+                h.update(b'None')
+            else:
+                h.update(repr((list(frame.columns), frame.shape)).encode())
+                h.update(pandas.util.hash_pandas_object(frame, index=True).values.tobytes())
+        options = [self.bs.year, self.bs.nerc, self.bs.states_to_subset, self.bs.co2_dol_per_kg, self.bs.so2_dol_per_kg, self.bs.nox_dol_per_kg, 
+                   self.bs.coal_dol_per_mmbtu, self.bs.coal_capacity_derate, self.bs.include_min_output, self.bs.coal_mdt_demand_threshold, self.bs.mdt_weight, 
+                   self.bs.outputs, self.bs.compress_tolerance, self.bs.compress_relative, self.bs.subset_state_totals, 
+                   list(self.time_array), self.outputs, self.states_to_subset, self.state_groups, self.sensitivities, self.result_dtype, self.demand_resolution, self.time_step]
+        h.update(repr(options).encode())
+        return h.hexdigest()
+    
+    
+    def openCheckpoint(self, checkpoint_dir):
+        """ Creates the checkpoint folder of this run (checkpoint_dir/fingerprint) and finds the time periods that have already been completed in it
+        ---
+        checkpoint_dir : folder of the checkpoints
+        returns : set of completed time periods
+        """
+        self.checkpoint_folder = os.path.join(checkpoint_dir, self.fingerprint()[:20])
+        os.makedirs(self.checkpoint_folder, exist_ok=True)
+        saved = set(os.listdir(self.checkpoint_folder))
+        return set(t for t in self.time_array if 'period_' + str(t) + '.pkl' in saved)
+    
+    
+    def saveCheckpoint(self, period):
+        """ Saves a time period returned by calcDispatchTimePeriodLog in the checkpoint folder. The file is written under a temporary name and then renamed, 
+        so a run that fails while saving never leaves a partial checkpoint
+        ---
+        period : (t, write_log, sensitivity, compression_error)
+        """
+        fn = os.path.join(self.checkpoint_folder, 'period_' + str(period[0]) + '.pkl')
+        with open(fn + '.tmp', 'wb') as f:
+            pickle.dump(period, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(fn + '.tmp', fn)
+    
+    
+    def loadCheckpoint(self, t):
+        """ Loads time period t from the checkpoint folder
+        ---
+        returns : (t, write_log, sensitivity, compression_error)
+        """
+        with open(os.path.join(self.checkpoint_folder, 'period_' + str(t) + '.pkl'), 'rb') as f:
+            return pickle.load(f)
+    
+    
+    def openStream(self, stream_dir=None, stream_region=None, stream_csv=None):
+        """ Sets up the streaming output of calcDispatchAll (see its stream_dir, stream_region, and stream_csv arguments). 
+        A time period is final once no later time period can write its rows: for each time period, the first position (in self.sorted_datetimes) that it or one of the 
+        coal minimum downtime events that calcMdtCoalEventsT selects for it can write is found once (see periodReach), and the minimum over the later time periods is kept in self.stream['limit']. 
+        Likewise, the last position that each time period can write is kept in self.stream['reach'], and the result arrays are allocated for the window of positions 
+        from the first row that is not final yet to the reach of the time periods calculated so far (see extendStream and flushStream)
+        ---
+        """
+        self.stream = dict(dir=stream_dir, region=self.bs.nerc if stream_region is None else stream_region, csv=stream_csv if stream_csv is not None else {}, 
+                           csv_started=set(), written=set(), limit=[], reach=[])
+        self.results, self.window = None, None
+        if numpy.ndim(self.time_array) == 0: # the whole run is one time period, which keeps result arrays for all of the rows
+            return
+        first, self.stream['reach'] = self.periodReach()
+        #limit[k] : the first position that the time periods after the k-th one can write
+        self.stream['limit'] = list(numpy.minimum.accumulate(numpy.array(first[1:] + [len(self.sorted_datetimes)])[::-1])[::-1])
+        self.moveWindow(min(first), min(first))
+    
+    
+    def periodReach(self):
+        """ Finds the first and last (excluded) positions in self.sorted_datetimes that each time period of self.time_array, or one of the coal minimum downtime events 
+        that calcMdtCoalEventsT selects for it, can write
+        ---
+        returns : (list of first positions, list of last positions), one per time period
+        """
+        events = self.bs.mdt_coal_events
+        if events is not None and len(events) > 0:
+            event_start, event_end = pandas.to_datetime(events.start).values, pandas.to_datetime(events.end).values
+            event_lo = numpy.searchsorted(self.sorted_datetimes, event_start.astype(self.sorted_datetimes.dtype), side='left')
+            event_hi = numpy.searchsorted(self.sorted_datetimes, event_end.astype(self.sorted_datetimes.dtype), side='left')
+        first, reach = [], []
+        for t in self.time_array:
+            if t not in self.period_positions:
+                self.period_dates[t] = self.periodDates(t)
+                self.period_positions[t] = self.slicePositions(*self.period_dates[t])
+                self.period_rows[t] = self.rowsFromPositions(*self.period_positions[t])
+            lo, hi = self.period_positions[t]
+            if events is not None and len(events) > 0:
+                start, end = (numpy.datetime64(pandas.Timestamp(d)) for d in self.period_dates[t])
+                selected = (event_end >= start) & (event_start <= end) # as in calcMdtCoalEventsT
+                if selected.any():
+                    lo = min(lo, int(event_lo[selected].min()))
+                    hi = max(hi, int(event_hi[selected].max()))
+            first.append(lo)
+            reach.append(hi)
+        return first, reach
+    
+    
+    def extendStream(self, k):
+        """ Extends the result arrays of a streaming run to the last position that the k-th time period of self.time_array can write, before it is calculated or written
+        ---
+        k : index of the time period in self.time_array
+        """
+        if getattr(self, 'stream', None) is None or self.window is None:
+            return
+        if self.stream['reach'][k] > self.window[1]:
+            self.moveWindow(self.window[0], self.stream['reach'][k])
+    
+    
+    def flushStream(self, k):
+        """ Writes the time periods that are final after the k-th time period of self.time_array has been calculated, in time period order, 
+        and releases the results of the rows that no time period can write any more
+        ---
+        k : index of the last calculated time period in self.time_array. None writes all of the time periods that have not been written yet and releases all of the results
+        """
+        if getattr(self, 'stream', None) is None:
+            return
+        n = len(self.sorted_datetimes)
+        if numpy.ndim(self.time_array) == 0:
+            if k is None:
+                self.writeStream(0, slice(0, len(self.df_input))) # the whole run is one partition, week=0
+                self.moveWindow(n, n)
+            return
+        limit = n if k is None else self.stream['limit'][k]
+        done = self.time_array if k is None else self.time_array[:k+1]
+        for t in done:
+            if t not in self.stream['written'] and self.period_positions[t][1] <= limit:
+                self.writeStream(t, self.period_rows[t])
+        #the rows before the first row of the calculated time periods that have not been written, and before the first row that the later time periods can write, are final
+        lo = min([limit] + [self.period_positions[t][0] for t in done if t not in self.stream['written']])
+        if lo > self.window[0]:
+            self.moveWindow(lo, max(lo, self.window[1]))
+    
+    
+    def writeStream(self, t, rows):
+        """ Writes the results of the rows of time period t to the partitioned parquet dataset and the csv files of self.stream. 
+        Each parquet file is written under a hidden temporary name and then renamed, so readers of the dataset never see a partial week
+        ---
+        t : time period (e.g. week 15)
+        rows : rows of the demand data in time period t
+        """
+        df, df_subset, df_state_groups = self.resultFrames(rows)
+        tables = {'dispatch': df}
+        if df_subset is not None:
+            tables['subset'] = df_subset
+        if df_state_groups is not None:
+            tables['state_groups'] = pandas.concat([frame.assign(state_group=name)[['state_group'] + list(frame.columns)] for name, frame in df_state_groups.items()], axis=0)
+        for table, frame in tables.items():
+            if self.stream['dir'] is not None:
+                folder = os.path.join(self.stream['dir'], table, 'region=' + str(self.stream['region']), 'year=' + str(self.bs.year), self.bs.calendar.resolution + '=' + str(t)) # e.g. week=15
+                os.makedirs(folder, exist_ok=True)
+                frame.to_parquet(os.path.join(folder, '.part-0.parquet.tmp'), index=False)
+                os.replace(os.path.join(folder, '.part-0.parquet.tmp'), os.path.join(folder, 'part-0.parquet'))
+            if table in self.stream['csv']:
+                started = table in self.stream['csv_started']
+                frame.to_csv(self.stream['csv'][table], index=False, mode='a' if started else 'w', header=not started)
+                self.stream['csv_started'].add(table)
+        self.stream['written'].add(t)
+    
+    
+    def calcDispatchTimePeriod(self, t):
+        """ Calculates the dispatch for one time period of self.time_array (e.g. week t) with self.bs, which must already be processed for time t, 
+        then recalculates the dispatch for the coal minimum downtime events of the time period
+        ---
+        t : time period (e.g. week 15)
+        fills in the time period's rows of the self.df dataframe
+        """
+        #calculate the dispatch for the time slice over which the updated fuel prices are relevant (dates and rows found once by calcRowRanges)
+        if t not in self.period_rows:
+            self.period_dates[t] = self.periodDates(t)
+            self.period_positions[t] = self.slicePositions(*self.period_dates[t])
+            self.period_rows[t] = self.rowsFromPositions(*self.period_positions[t])
+        start, end = self.period_dates[t]
+        #note that calcDispatchSlice updates self.df, so there is no need to do it in this function
+        self.calcDispatchSlice(self.bs, rows=self.period_rows[t])
+        if self.sensitivities:
+            self.calcSensitivitySlice(self.bs, t=t, rows=self.period_rows[t])
+        if self.bs.compress_tolerance is not None:
+            self.compression_error[t] = self.bs.compression_error
+        #coal minimum downtime
+        #recalculate the dispatch for times when generatorData pre-processing estimates that the minimum downtime constraint for coal plants would trigger
+        #define the coal merit order
+        coal_merit_order = self.bs.df[(self.bs.df.fuel_type == 'coal')][['orispl_unit', 'demand']]
+        #slice and bin the coal minimum downtime events
+        events_mdt_coal_t = self.calcMdtCoalEventsT(start, end, coal_merit_order)  
+        #create a dictionary for holding the updated bidStacks, which change depending on the demand_threshold. If self.bs was relabelled instead of processed 
+        #for this time period (see bidStack.updateTime), the bidStacks of the earlier time periods with the same merit order are relabelled and reused
+        if self.mdt_bidstacks[0] is not self.bs.processed_state:
+            self.mdt_bidstacks = (self.bs.processed_state, {})
+        bs_mdt_dict = self.mdt_bidstacks[1]
+        #for each unique demand_threshold
+        for dt in events_mdt_coal_t.demand_threshold.unique():
+            if dt in bs_mdt_dict:
+                bs_mdt_dict[dt].relabelTime(t)
+                continue
+            #create an updated version of gd.df, with only the columns of time period t
+            gd_df_mdt_temp = self.bs.df_0[self.bs.unitColumns(t)].copy()
+            gd_df_mdt_temp.update(self.createDfMdtCoal(dt, t))
+            #use that updated gd.df to create an updated bidStack object (a shallow copy of self.bs), and store it in the bs_mdt_dict
+            bs_temp = copy.copy(self.bs)
+            bs_temp.coal_mdt_demand_threshold = dt
+            bs_temp.updateDf(gd_df_mdt_temp)
+            bs_mdt_dict.update({dt:bs_temp})
+        #for each minimum downtime event, recalculate the dispatch by inputting the bs_mdt_dict bidStacks into calcDispatchSlice to override the existing dp.df results dataframe. 
+        #later events override earlier ones, so each hour takes the bidStack of the last event that covers it, and the hours of each demand_threshold are dispatched with one call
+        for dt, rows in self.mdtThresholdRows(events_mdt_coal_t).items():
+            self.calcDispatchSlice(bs_mdt_dict[dt], rows=rows)
+    
+    
+    def mdtThresholdRows(self, events_mdt_coal_t):
+        """ Groups the hours of the coal minimum downtime events by the demand_threshold of the last event (in the order of events_mdt_coal_t) that covers each hour, 
+        which is the event whose re-dispatch the hour keeps when the events are re-dispatched one at a time
+        ---
+        events_mdt_coal_t : dataframe of events from calcMdtCoalEventsT
+        returns : dictionary of demand_threshold : array of rows of self.df, in the order of the thresholds' first events
+        """
+        positions, event_number = [], []
+        for k, (i, e) in enumerate(events_mdt_coal_t.iterrows()):
+            rows = self.mdt_event_rows.get(i)
+            if rows is None:
+                rows = self.sliceRows(e.start, e.end)
+            rows = numpy.arange(rows.start, rows.stop) if isinstance(rows, slice) else numpy.asarray(rows)
+            positions.append(rows)
+            event_number.append(numpy.full(len(rows), k))
+        if positions == []:
+            return {}
+        positions, event_number = numpy.concatenate(positions), numpy.concatenate(event_number)
+        #last event covering each hour: the first occurrence of each position when the events are read backwards
+        rows, first = numpy.unique(positions[::-1], return_index=True)
+        owner = event_number[::-1][first]
+        thresholds = events_mdt_coal_t.demand_threshold.values
+        return {dt: rows[thresholds[owner] == dt] for dt in events_mdt_coal_t.demand_threshold.unique() if (thresholds[owner] == dt).any()}
+    
+    
+    def calcDispatchSweep(self, co2_dol_per_kg=None, so2_dol_per_kg=None, nox_dol_per_kg=None, coal_dol_per_mmbtu=None, coal_capacity_derate=None):
+        """ Calculates the dispatch of the demand data for each scenario of a sweep of emissions prices, coal taxes, and coal capacity derates 
+        (e.g. 50 carbon prices, or a grid of coal taxes and derates), the same way as calcDispatchAll. For each time period, the merit orders of all of the scenarios 
+        are built together as (units x scenarios) arrays by bidStack.batchMeritOrders, and each result column is looked up for all of the (hour, scenario) pairs 
+        with one batched search (see calcBatchTimePeriod)
+        ---
+        co2_dol_per_kg, so2_dol_per_kg, nox_dol_per_kg, coal_dol_per_mmbtu, coal_capacity_derate : arrays (or scalars) broadcast together by bidStack.sweepParameters. 
+        None uses the value of self.bs. E.g. coal_dol_per_mmbtu=taxes[:, None] and coal_capacity_derate=derates[None, :] run every (tax, derate) pair
+        returns : tidy dataframe with one row per (scenario, demand datum) holding the scenario number, the scenario parameters, the demand data, and the result columns. 
+        It is also saved as self.df_sweep, the scenario parameters are saved as self.sweep_scenarios, and the subset, state group, and sensitivity results are saved as self.df_subset_sweep, 
+        self.df_state_groups_sweep, and self.df_sensitivity_sweep in the same format
+        """
+        self.sweep_scenarios = self.bs.sweepParameters(co2_dol_per_kg, so2_dol_per_kg, nox_dol_per_kg, coal_dol_per_mmbtu, coal_capacity_derate)
+        params = {c: self.sweep_scenarios[c].values for c in self.sweep_scenarios.columns}
+        k = len(self.sweep_scenarios)
+        results, results_subset, results_state_groups = self.newBatchResults(k)
+        sensitivity = {} # time period : dictionary of sensitivity : array with one value per scenario, in the order of self.df_sensitivity
+        #run the whole solution if self.time_array isn't being used
+        if numpy.ndim(self.time_array) == 0:
+            periods = [None]
+        #otherwise, run the dispatch in time slices, creating the merit orders of all the scenarios each slice
+        else:
+            periods = self.time_array
+        for t in periods:
+            slices, row = self.calcBatchTimePeriod(t, self.bs.batchUnits(time=t, dummy_rows=self.bs.initialization), params)
+            for rows, values, values_subset, values_state_groups in slices:
+                for c, v in values.items():
+                    if results[c].dtype == object and v.dtype.kind in 'fiub': # a numeric marginal generator column (e.g. 'marg_gen_mw') is stored like the other numeric columns
+                        results[c] = numpy.zeros(results[c].shape, dtype=self.result_dtype)
+                    results[c][rows] = v
+                if values_subset is not None:
+                    for e in self.emissions_subset:
+                        results_subset[e + '_tot'][rows] = values_subset[e + '_tot_subset']
+                if values_state_groups is not None:
+                    for name, group in results_state_groups.items():
+                        for e in self.emissions_subset:
+                            group[e + '_tot'][rows] = values_state_groups[name][e]
+            if row is not None:
+                sensitivity.pop(0 if t is None else t, None)
+                sensitivity[0 if t is None else t] = row
+            if t is not None:
+                print(str(round(t/float(len(self.time_array)),3)*100) + '% Complete')
+        #stack the results of the scenarios: one block of rows per scenario with the scenario number and parameters, the rows of frame, and the scenario's column of each result array
+        def tidy(frame, columns):
+            m = len(frame)
+            head = pandas.DataFrame(dict(scenario=numpy.repeat(numpy.arange(k), m), **{c: numpy.repeat(v, m) for c, v in params.items()}))
+            body = frame.iloc[numpy.tile(numpy.arange(m), k)].reset_index(drop=True)
+            return pandas.concat([head, body, pandas.DataFrame({c: v.T.ravel() for c, v in columns.items()})], axis=1)
+        self.df_sweep = tidy(self.df_input, results)
+        if self.states_to_subset != []:
+            self.df_subset_sweep = tidy(self.df_input[['datetime', 'demand']], results_subset)
+        if self.state_groups is not None:
+            self.df_state_groups_sweep = {name: tidy(self.df_input[['datetime', 'demand']], group) for name, group in results_state_groups.items()}
+        if self.sensitivities:
+            names = list(next(iter(sensitivity.values())).keys())
+            self.df_sensitivity_sweep = tidy(pandas.DataFrame({'time': list(sensitivity.keys())}), {c: numpy.array([row[c] for row in sensitivity.values()]) for c in names})
+        return self.df_sweep
+    
+    
+    def newBatchResults(self, k):
+        """ Returns empty result arrays for a batch of k scenarios, like newResults with one column per scenario. The marginal generator columns (e.g. 'marg_gen_fuel_type') 
+        hold their values, with 0 for the rows that have not been dispatched
+        ---
+        k : number of scenarios
+        returns : (dictionary of result column : array, dictionary of subset column : array or None, dictionary of group name : dictionary of column : array or None)
+        """
+        n = len(self.df_input)
+        results = {}
+        for c in self.result_columns:
+            if c == 'marg_gen':
+                results[c] = numpy.zeros((n, k), dtype='int64')
+            elif c.startswith('marg_gen_'):
+                results[c] = numpy.zeros((n, k), dtype=object)
+            else:
+                results[c] = numpy.zeros((n, k), dtype=self.result_dtype)
+        results_subset, results_state_groups = None, None
+        if self.states_to_subset != []:
+            results_subset = {e + '_tot': numpy.zeros((n, k), dtype=self.result_dtype) for e in self.emissions_subset}
+        if self.state_groups is not None:
+            results_state_groups = {name: {e + '_tot': numpy.zeros((n, k), dtype=self.result_dtype) for e in self.emissions_subset} for name in self.state_groups}
+        return results, results_subset, results_state_groups
+    
+    
+    def calcBatchTimePeriod(self, t, units, params):
+        """ The batched version of calcDispatchTimePeriod: dispatches one time period against every merit order of a batch of scenarios or ensemble members 
+        (see bidStack.batchMeritOrders), then re-dispatches the coal minimum downtime events of the time period. The events, and so the hours that each demand threshold 
+        re-dispatches, are the same for all of the merit orders, and the hours of each demand threshold are re-dispatched with one batch of minimum downtime merit orders, 
+        each built from its own coal merit order (see createMdtCoalUnits)
+        ---
+        t : time period (e.g. week 15), or None for the whole demand data (without the minimum downtime re-dispatch, as in calcDispatchAll)
+        units : dictionary from bidStack.batchUnits for time period t
+        params : dictionary of parameter : array with one value per merit order (see bidStack.batchMeritOrders)
+        returns : (list of slices from calcBatchSlice, in the order in which they override each other, 
+            dictionary of sensitivity : array with one value per merit order (see calcSensitivitySlice) if self.sensitivities, otherwise None)
+        """
+        families = self.bs.outputFamilies(self.metrics)
+        batch = self.bs.batchMeritOrders(units, params, families=families)
+        if t is None:
+            rows = self.sliceRows()
+        else:
+            if t not in self.period_rows:
+                self.period_dates[t] = self.periodDates(t)
+                self.period_positions[t] = self.slicePositions(*self.period_dates[t])
+                self.period_rows[t] = self.rowsFromPositions(*self.period_positions[t])
+            rows = self.period_rows[t]
+        slices = [self.calcBatchSlice(batch, rows)]
+        sensitivity = self.calcBatchSensitivity(batch, rows) if self.sensitivities else None
+        if t is None:
+            return slices, sensitivity
+        #coal minimum downtime events of the time period, as in calcMdtCoalEventsT. Each hour takes the demand threshold of the last event that covers it
+        start, end = self.period_dates[t]
+        events = self.bs.mdt_coal_events
+        events = events[(events.end >= start) & (events.start <= end)]
+        for threshold, rows in self.mdtThresholdRows(events).items():
+            demand_threshold = self.batchMdtThreshold(batch, threshold)
+            batch_mdt = self.bs.batchMeritOrders(self.createMdtCoalUnits(batch, demand_threshold), params, coal_mdt_demand_threshold=demand_threshold, families=families)
+            slices.append(self.calcBatchSlice(batch_mdt, rows))
+        return slices, sensitivity
+    
+    
+    def calcBatchSlice(self, batch, rows):
+        """ The batched version of calcDispatchSlice: dispatches some rows of the demand data against every merit order of a batch at once. 
+        The quantization error of demand_resolution is not calculated
+        ---
+        batch : dictionary from bidStack.batchMeritOrders
+        rows : rows of self.df to dispatch (e.g. self.period_rows[t])
+        returns : (rows, values, values_subset, values_state_groups) as in writeSlice, where each array has one row per row of the slice and one column per merit order
+        """
+        demand = self.df_input.demand.values[rows]
+        inverse = None
+        if self.unique_demand or self.demand_resolution is not None: # evaluate each unique (optionally rounded) demand value once
+            demand_eval = demand if self.demand_resolution is None else numpy.round(demand / self.demand_resolution) * self.demand_resolution
+            demand, inverse = numpy.unique(demand_eval, return_inverse=True)
+        values = self.bs.returnBatchMetrics(batch, demand, self.metrics)
+        values_subset, values_state_groups = None, None
+        if self.states_to_subset != []:
+            values_subset = self.bs.returnBatchMetrics(batch, demand, [e + '_tot_subset' for e in self.emissions_subset])
+        if self.state_groups is not None:
+            values_state_groups = self.bs.returnBatchStates(batch, demand, self.emissions_subset, self.state_groups)
+        if self.time_step != 1.0: # the Full total curves are per hour, the total result columns are per time step
+            values.update({c: values[c] * self.time_step for c in self.total_metrics})
+            if values_subset is not None:
+                values_subset = {c: v * self.time_step for c, v in values_subset.items()}
+            if values_state_groups is not None:
+                values_state_groups = {name: {e: v * self.time_step for e, v in group.items()} for name, group in values_state_groups.items()}
+        if inverse is not None: # broadcast the unique values back to the hours
+            values = {c: v[inverse] for c, v in values.items()}
+            if values_subset is not None:
+                values_subset = {c: v[inverse] for c, v in values_subset.items()}
+            if values_state_groups is not None:
+                values_state_groups = {name: {e: v[inverse] for e, v in group.items()} for name, group in values_state_groups.items()}
+        return rows, values, values_subset, values_state_groups
+    
+    
+    def calcBatchSensitivity(self, batch, rows):
+        """ The batched version of calcSensitivitySlice: adds up the sensitivities of some rows of the demand data for every merit order of a batch
+        ---
+        batch : dictionary from bidStack.batchMeritOrders
+        rows : rows of self.df (e.g. self.period_rows[t])
+        returns : dictionary of column of self.df_sensitivity : array with one value per merit order
+        """
+        demand = self.df_input.demand.values[rows]
+        k = batch['demand'].shape[1]
+        row = {'hours': numpy.full(k, len(demand) * self.time_step), 'demand': numpy.full(k, demand.sum() * self.time_step)}
+        for name, values in self.bs.returnBatchSensitivities(batch, demand, self.total_metrics).items():
+            values = numpy.ascontiguousarray(values.T) # one row per merit order, so each one is summed over the hours the same way as calcSensitivitySlice
+            if name.startswith('d_gen_cost_marg'):
+                row[name] = values.mean(axis=1) if len(demand) > 0 else numpy.full(k, numpy.nan)
+            elif name.endswith('_reorder_margin'):
+                row[name] = values.min(axis=1) if len(demand) > 0 else numpy.full(k, numpy.nan)
+            else:
+                row[name] = values.sum(axis=1) * self.time_step
+        return row
+    
+    
+    def batchMdtThreshold(self, batch, demand_threshold):
+        """ The batched version of the demand threshold translation of calcMdtCoalEventsT: the cumulative demand of the first coal unit of each merit order of a batch 
+        at or above the demand threshold, or of its last coal unit if there is none
+        ---
+        batch : dictionary from bidStack.batchMeritOrders
+        demand_threshold : demand threshold of a coal minimum downtime event [MW]
+        returns : array with the translated demand threshold of each merit order
+        """
+        coal = self.bs.batchColumn(batch, 'fuel_type') == 'coal'
+        demand = batch['demand']
+        k = demand.shape[1]
+        coal_rows = numpy.argsort(~coal, axis=0, kind='stable') # positions of the coal units of each merit order first, in merit order
+        ind = numpy.minimum((coal & (demand < demand_threshold)).sum(axis=0), coal.sum(axis=0) - 1) # bisect_left in the coal merit order
+        return demand[coal_rows[ind, numpy.arange(k)], numpy.arange(k)]
+    
+    
+    def createMdtCoalUnits(self, batch, demand_threshold):
+        """ The batched version of createDfMdtCoal and the update of the generator data in calcDispatchTimePeriod: for each merit order of a batch, the coal generators 
+        up to its demand threshold have their capacities reduced by their minimum output and their minimum output changed to zero, and coal_0 takes the sum of their minimum outputs 
+        as its capacity and the weighted average of their heat rates, emissions rates, etc. The sums are calculated the same way as createDfMdtCoal
+        ---
+        batch : dictionary from bidStack.batchMeritOrders
+        demand_threshold : array with the demand threshold of each merit order (e.g. from batchMdtThreshold)
+        returns : dictionary of generator data like bidStack.batchUnits, with one column per merit order
+        """
+        units = batch['units']
+        df = units['df']
+        shape = (len(df), len(demand_threshold))
+        #generators (rows of df) that are coal units of each merit order with a cumulative demand up to its threshold
+        below = (self.bs.batchColumn(batch, 'fuel_type') == 'coal') & (batch['demand'] <= demand_threshold)
+        position, column = numpy.nonzero(below)
+        selected = numpy.zeros(shape, dtype=bool)
+        selected[batch['order'][position, column], column] = True
+        coal_0 = (df.orispl_unit == 'coal_0').values[:, None]
+        others = selected & ~coal_0
+        if not (others.any(axis=0) & selected[coal_0[:, 0]].all(axis=0)).all():
+            raise ValueError('the minimum downtime demand threshold must select coal_0 and at least one other coal generator (see createDfMdtCoal)')
+        #the capacity of coal_0 is the sum of the minimum outputs of the other coal units (1 MW if they add up to 0), and its attributes are their weighted averages
+        mw_min_out = units['mw'] * units['min_out_multiplier']
+        total = self.sumSelected(mw_min_out, others)
+        divisor = numpy.where(total == 0, 1.0, total)
+        mdt_units = dict(units)
+        for c in ['vom', 'co2', 'so2', 'nox', 'heat_rate', 'fuel_price']:
+            weighted = self.sumSelected(units[c] * mw_min_out / divisor, others)
+            mdt_units[c] = numpy.where(coal_0 & ~numpy.isnan(weighted), weighted, units[c])
+        #reduce the capacity of the other coal units by their minimum outputs, and change the minimum output of the coal units to 0.0
+        reduced = units['mw'] * (1 - units['min_out_multiplier'])
+        mdt_units['mw'] = numpy.where(coal_0, divisor, numpy.where(others & ~numpy.isnan(reduced), reduced, units['mw']))
+        for c in ['min_out_multiplier', 'min_out']:
+            mdt_units[c] = numpy.where(others | coal_0, 0.0, units[c])
+        return mdt_units
+    
+    
+    def sumSelected(self, values, selected):
+        """ Sums the selected rows of each column, in row order and with the same pairwise summation as pandas' sum of a column of the selected rows (nan values are skipped)
+        ---
+        values : 2-d array, or a single column for all of the columns of selected
+        selected : 2-d boolean array
+        returns : array with one sum per column
+        """
+        values = numpy.broadcast_to(values, selected.shape)
+        counts = selected.sum(axis=0)
+        values = numpy.take_along_axis(values, numpy.argsort(~selected, axis=0, kind='stable'), axis=0) # the selected rows of each column first
+        values = numpy.where(numpy.isnan(values), 0.0, values)
+        sums = numpy.zeros(selected.shape[1])
+        for count in numpy.unique(counts): # columns with the same number of selected rows are summed together
+            columns = numpy.flatnonzero(counts == count)
+            sums[columns] = numpy.ascontiguousarray(values[:count, columns].T).sum(axis=1)
+        return sums
+    
+    
+    def calcDispatchEnsemble(self, n_members, seed=0, fuel_price_sd=0.10, heat_rate_sd=0.02, emissions_sd=0.05, vom_sd=0.20, quantiles=(0.05, 0.5, 0.95), workers=1):
+        """ Dispatches the demand data against a Monte Carlo ensemble of perturbed fuel prices, heat rates, emissions rates, and VOM (see bidStack.ensembleMultipliers), 
+        and keeps per-hour quantiles of the members instead of a dataframe per member. For each time period, the merit orders of all of the members are built together 
+        by bidStack.batchMeritOrders, and each member is dispatched like calcDispatchAll, including the coal minimum downtime re-dispatch with its own coal merit order 
+        (see calcEnsembleTimePeriod). The members of an hour are reduced to their quantiles once no later time period can write the hour, so with zero standard deviations 
+        every quantile equals the result column of self.df
+        ---
+        n_members : number of ensemble members (e.g. 500)
+        seed, fuel_price_sd, heat_rate_sd, emissions_sd, vom_sd : see bidStack.ensembleMultipliers
+        quantiles : quantiles of the members to keep for each hour
+        workers : number of processes that calculate the time periods in parallel (as in calcDispatchAll). The samples are drawn once here, so the results don't depend on workers
+        returns : dataframe with the datetime and demand of each hour and one column per (metric, quantile), e.g. 'co2_tot_q05', 'co2_marg_q50'. 
+        It is also saved as self.df_ensemble. The metrics are the total and marginal cost and emissions columns of self.metrics (e.g. 'gen_cost_marg', 'co2_tot', 'nox_marg'). 
+        Totals are per time step, as in self.df
+        """
+        candidates = ['gen_cost_marg', 'gen_cost_tot'] + [e + k for e in ['co2', 'so2', 'nox'] for k in ['_marg', '_tot']]
+        self.ensemble_metrics = [m for m in candidates if m in self.metrics]
+        if self.ensemble_metrics == []:
+            raise ValueError('the dispatch object has none of the outputs of the ensemble: ' + ', '.join(candidates))
+        self.ensemble_multipliers = self.bs.ensembleMultipliers(n_members, seed, fuel_price_sd, heat_rate_sd, emissions_sd, vom_sd)
+        self.ensemble_quantiles = numpy.asarray(quantiles, dtype='float64')
+        names = {m: [m + '_q' + ('%g' % (100*q)).zfill(2) for q in self.ensemble_quantiles] for m in self.ensemble_metrics} # e.g. co2_tot_q05
+        results = {c: numpy.full(len(self.df_input), numpy.nan) for m in self.ensemble_metrics for c in names[m]}
+        #the whole demand data at once if self.time_array isn't being used, otherwise one time period at a time
+        n = len(self.sorted_datetimes)
+        if numpy.ndim(self.time_array) == 0:
+            periods, first, reach = [None], [0], [n]
+        else:
+            periods = list(self.time_array)
+            first, reach = self.periodReach()
+        limit = list(numpy.minimum.accumulate(numpy.array(first[1:] + [n])[::-1])[::-1]) # the first position that the time periods after the k-th one can write
+        #values of the members at the positions [lo, lo + len) of self.sorted_datetimes that are not final yet
+        lo = min(first)
+        members = {m: numpy.full((0, n_members), numpy.nan) for m in self.ensemble_metrics}
+        if workers == 1:
+            calculated = (self.calcEnsembleTimePeriod(t) for t in periods)
+        else:
+            pool = multiprocessing.Pool(workers, initializer=_initDispatchWorker, initargs=(self,))
+            calculated = pool.imap(_calcEnsembleWorkerTimePeriod, periods)
+        try:
+            for k, (t, slices) in enumerate(calculated):
+                size = len(members[self.ensemble_metrics[0]])
+                if reach[k] - lo > size:
+                    members = {m: numpy.vstack([v, numpy.full((reach[k] - lo - size, n_members), numpy.nan)]) for m, v in members.items()}
+                #write the slices of all of the members in the order that calcDispatchTimePeriod writes them, so later slices override earlier ones as in self.df
+                for rows, values in slices:
+                    positions = self.sortedPositions(rows, lo)
+                    for m in self.ensemble_metrics:
+                        members[m][positions, :] = values[m]
+                #reduce the final positions to their quantiles
+                final = min(limit[k] - lo, len(members[self.ensemble_metrics[0]]))
+                if final > 0:
+                    rows = self.rowsFromPositions(lo, lo + final)
+                    for m in self.ensemble_metrics:
+                        for c, v_q in zip(names[m], numpy.quantile(members[m][:final], self.ensemble_quantiles, axis=1)):
+                            results[c][rows] = v_q
+                        members[m] = members[m][final:]
+                lo = lo + final
+                if limit[k] > lo: # positions that no time period writes
+                    members = {m: v[limit[k] - lo:] for m, v in members.items()}
+                    lo = limit[k]
+        finally:
+            if workers != 1:
+                pool.terminate()
+        self.df_ensemble = pandas.concat([self.df_input[['datetime', 'demand']], pandas.DataFrame(results, index=self.df_input.index)], axis=1)
+        return self.df_ensemble
+    
+    
+    def calcEnsembleTimePeriod(self, t):
+        """ Dispatches every member of the ensemble of calcDispatchEnsemble in time period t like calcDispatchTimePeriod, including the coal minimum downtime re-dispatch 
+        with each member's own coal merit order. The merit orders of all of the members are built together by bidStack.batchMeritOrders (see calcBatchTimePeriod)
+        ---
+        t : time period (e.g. week 15), or None for the whole demand data
+        returns : (t, list of (rows of self.df, dictionary of metric : array with one row per row of the slice and one column per member), in the order that the slices override each other)
+        """
+        dp = copy.copy(self)
+        dp.metrics = self.ensemble_metrics
+        dp.total_metrics = [m for m in self.total_metrics if m in self.ensemble_metrics]
+        dp.states_to_subset, dp.state_groups, dp.sensitivities = [], None, False
+        #the members share the parameters of self.bs, and have the dummy rows if its processed merit order has them (see calcUnitCosts)
+        n = self.ensemble_multipliers['vom'].shape[1]
+        params = {k: numpy.full(n, getattr(self.bs, k), dtype='float64') for k in ['co2_dol_per_kg', 'so2_dol_per_kg', 'nox_dol_per_kg', 'coal_dol_per_mmbtu', 'coal_capacity_derate']}
+        units = self.bs.batchUnits(time=t, multipliers=self.ensemble_multipliers, dummy_rows=self.bs.dummy_rows if t is None else self.bs.initialization)
+        slices, sensitivity = dp.calcBatchTimePeriod(t, units, params)
+        return t, [(rows, values) for rows, values, values_subset, values_state_groups in slices]
+
+_dispatch_worker = None # copy of the dispatch object in a worker process of dispatch.calcDispatchAll
+
+
+def _initDispatchWorker(dp):
+    """ Keeps the copy of the dispatch object (and its generator data) that a worker process of dispatch.calcDispatchAll gets once when it starts
+    ---
+    dp : dispatch object
+    """
+    global _dispatch_worker
+    _dispatch_worker = dp
+
+
+def _calcDispatchWorkerTimePeriod(t):
+    """ Calculates time period t in a worker process of dispatch.calcDispatchAll
+    ---
+    t : time period (e.g. week 15)
+    returns : (t, slices calculated by calcDispatchSlice in order, row of df_sensitivity or None, bs.compression_error or None)
+    """
+    return _dispatch_worker.calcDispatchTimePeriodLog(t)
+
+
+def _calcEnsembleWorkerTimePeriod(t):
+    """ Dispatches the ensemble members of time period t in a worker process of dispatch.calcDispatchEnsemble
+    ---
+    t : time period (e.g. week 15), or None for the whole demand data
+    returns : see dispatch.calcEnsembleTimePeriod
+    """
+    return _dispatch_worker.calcEnsembleTimePeriod(t)
+
 
 if __name__ == '__main__': 
     print('nothing')
\ No newline at end of file
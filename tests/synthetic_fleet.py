@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Small synthetic generator fleet and demand data in the format of the shortened generatorData dictionary (gd_short) of the driver scripts,
+so that the tests can run bidStack and dispatch without eGRID, EIA 923, CEMS, or FERC 714 data. Everything is seeded, so the tests are deterministic.
+Also has the dispatch objects and result columns that the tests share
+"""
+
+import os
+import sys
+import numpy
+import pandas
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # code directory
+import simple_dispatch
+
+
+def generatorFrame(n=40, year=2017, resolution='week', seed=0, states=('GA', 'AL', 'TN', 'FL')):
+    """ Creates n random gas, coal, and oil generators with one column per time period of the calendar for each attribute (e.g. 'mw1' to 'mw52'),
+    plus the coal_0 and ngcc_0 dummy generators of generatorData.addDummies
+    ---
+    n : number of generators
+    year : year of the calendar
+    resolution : 'week', 'day', or 'month' (see simple_dispatch.periodCalendar)
+    seed : seed of the random generator
+    states : states of the generators
+    returns : dataframe in the format of gd.df
+    """
+    rng = numpy.random.default_rng(seed)
+    fuel = rng.choice(['ng', 'sub', 'bit', 'rfo'], size=n, p=[0.5, 0.25, 0.15, 0.1])
+    fuel_type = numpy.where(fuel == 'ng', 'gas', numpy.where(fuel == 'rfo', 'oil', 'coal'))
+    df = pandas.DataFrame({'orispl_unit': ['%i_%i' % (i, i % 3) for i in range(n)], 'orispl': numpy.arange(n), 'state': rng.choice(states, size=n),
+                           'ba': 'SOCO', 'nerc': 'SERC', 'egrid': 'SRSO', 'fuel': fuel, 'fuel_type': fuel_type,
+                           'prime_mover': numpy.where(fuel_type == 'gas', rng.choice(['ct', 'gt', 'st'], size=n), 'st'), 'year_online': 2000.0})
+    mw = rng.uniform(50, 800, n)
+    heat_rate = numpy.where(fuel_type == 'coal', rng.uniform(9, 12, n), rng.uniform(6.5, 12, n))
+    co2 = numpy.where(fuel_type == 'coal', rng.uniform(900, 1100, n), rng.uniform(350, 650, n))
+    cols = {}
+    for t in simple_dispatch.periodCalendar(year, resolution).periods:
+        cols['heat_rate%i' % t] = heat_rate * rng.uniform(0.97, 1.03, n)
+        cols['co2%i' % t] = co2 * rng.uniform(0.97, 1.03, n)
+        cols['so2%i' % t] = numpy.where(fuel_type == 'coal', rng.uniform(0.5, 3, n), rng.uniform(0, 0.01, n))
+        cols['nox%i' % t] = rng.uniform(0.05, 1, n)
+        cols['mw%i' % t] = mw * rng.uniform(0.8, 1.0, n)
+        cols['fuel_price%i' % t] = numpy.where(fuel_type == 'coal', rng.uniform(1.5, 2.5, n), numpy.where(fuel_type == 'oil', rng.uniform(10, 14, n), rng.uniform(2.5, 4, n)))
+    df = pandas.concat([df, pandas.DataFrame(cols)], axis=1)
+    df['mw'] = mw
+    fuels = ['gas', 'coal', 'oil', 'nuclear', 'hydro', 'geothermal', 'biomass']
+    for f in fuels:
+        df['is_' + f] = (df.fuel_type == f).astype(int)
+    df['vom'] = rng.uniform(0.5, 4, n)
+    df['min_out_multiplier'] = numpy.where(fuel_type == 'coal', 0.4, 0.5)
+    df['min_out'] = df.mw * df.min_out_multiplier
+    #zero capacity coal_0 and ngcc_0 generators, as in generatorData.addDummies
+    for name, fuel, fuel_type, prime_mover in [('coal_0', 'sub', 'coal', 'st'), ('ngcc_0', 'ng', 'gas', 'ct')]:
+        row = df.loc[0].copy()
+        for c in df.columns.drop(['ba', 'nerc', 'egrid']):
+            if numpy.issubdtype(type(row[c]), numpy.number):
+                row[c] = row[c] * 0
+        row[['orispl', 'orispl_unit', 'fuel', 'fuel_type', 'prime_mover']] = [name, name, fuel, fuel_type, prime_mover]
+        row['is_' + fuel_type] = 1
+        df.loc[len(df)] = row
+    return df
+
+
+def demandData(mw_total, year=2017, seed=0, freq='h'):
+    """ Creates a year of demand with daily and seasonal cycles, scaled to the capacity of the fleet
+    ---
+    mw_total : total capacity of the fleet [MW]
+    freq : time step of the datetime column (e.g. 'h', or '5min' to hold each hour's demand for 12 steps)
+    returns : dataframe with 'datetime' and 'demand' columns
+    """
+    rng = numpy.random.default_rng(seed)
+    hours = pandas.date_range('%i-01-01' % year, '%i-12-31 23:00' % year, freq='h')
+    x = numpy.arange(len(hours))
+    demand = numpy.round((30000 + 8000*numpy.sin(x*2*numpy.pi/24) + 5000*numpy.sin(x*2*numpy.pi/(24*365))) * rng.uniform(0.9, 1.1, len(hours)) * mw_total/60000)
+    if freq == 'h':
+        return pandas.DataFrame({'datetime': hours, 'demand': demand})
+    steps = int(pandas.Timedelta(hours=1) / pandas.Timedelta(freq))
+    return pandas.DataFrame({'datetime': pandas.date_range(hours[0], periods=len(hours)*steps, freq=freq), 'demand': numpy.repeat(demand, steps)})
+
+
+def mdtCoalEvents(demand_data, coal_min_downtime=12):
+    """ Finds the coal minimum downtime events of the demand data with generatorData.calcMdtCoalEvents
+    ---
+    returns : dataframe with 'start', 'end', and 'demand_threshold' columns
+    """
+    gd = object.__new__(simple_dispatch.generatorData)
+    gd.demand_data = demand_data
+    gd.coal_min_downtime = coal_min_downtime
+    gd.calcMdtCoalEvents()
+    return gd.mdt_coal_events
+
+
+def generatorDataShort(n=40, year=2017, resolution='week', seed=0, freq='h'):
+    """ Creates the shortened generatorData dictionary of the driver scripts (gd_short) for a synthetic fleet
+    ---
+    n, year, resolution, seed : see generatorFrame
+    freq : time step of the demand data (see demandData)
+    returns : dictionary with 'year', 'nerc', 'hist_dispatch', 'demand_data', 'mdt_coal_events', 'df', and 'period_resolution'
+    """
+    df = generatorFrame(n, year, resolution, seed)
+    demand_data = demandData(df.mw.sum(), year, seed, freq)
+    return {'year': year, 'nerc': 'SERC', 'hist_dispatch': demand_data.copy(), 'demand_data': demand_data,
+            'mdt_coal_events': mdtCoalEvents(demand_data), 'df': df, 'period_resolution': resolution}
+
+
+def overlappingEvents(gd_short):
+    """ Adds a copy of each coal minimum downtime event of the first three weeks that starts 6 hours later with a lower demand_threshold, right after the event it overlaps
+    ---
+    gd_short : dictionary from generatorDataShort
+    returns : dataframe in the format of gd_short['mdt_coal_events'], with unique index labels
+    """
+    events = gd_short['mdt_coal_events']
+    events = events[events.start < '2017-01-22']
+    shifted = events.copy()
+    shifted['start'] = shifted.start + pandas.DateOffset(hours=6)
+    shifted['end'] = shifted.end + pandas.DateOffset(hours=6)
+    shifted['demand_threshold'] = shifted.demand_threshold * 0.6
+    shifted.index = shifted.index + 0.5
+    return pandas.concat([events, shifted]).sort_index()
+
+
+outputs = ['gen_cost_marg', 'co2_tot', 'co2_marg', 'coal_mix', 'marg_gen_fuel_type'] # dispatch result columns that the tests compare
+
+
+def createDispatch(gd_short, demand_data=None, n_periods=3, bid_stack_options={}, **dispatch_options):
+    """ Creates the bidStack of the first time period of a synthetic fleet and a dispatch object for its first n_periods time periods
+    ---
+    gd_short : dictionary from generatorDataShort
+    demand_data : demand data to dispatch (e.g. a shuffled copy of gd_short['demand_data']), None for a copy of gd_short['demand_data']
+    n_periods : number of time periods of the time array
+    bid_stack_options : other bidStack options (e.g. {'co2_dol_per_kg': 0.02}). The states_to_subset of dispatch_options are passed to the bidStack too
+    dispatch_options : other dispatch options (e.g. outputs=outputs, state_groups={'GA_AL': ['GA', 'AL']})
+    returns : dispatch object
+    """
+    if demand_data is None:
+        demand_data = gd_short['demand_data'].copy()
+    bs = simple_dispatch.bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5, states_to_subset=dispatch_options.get('states_to_subset', []), **bid_stack_options)
+    return simple_dispatch.dispatch(bs, demand_data, time_array=numpy.arange(n_periods)+1, **dispatch_options)
+
+
+def dispatchedRows(dp):
+    """ Returns a boolean array that is True for the rows of dp.df in the time periods of dp.time_array (the other rows are not dispatched)
+    """
+    dispatched = numpy.zeros(len(dp.df_input), dtype=bool)
+    for rows in dp.period_rows.values():
+        dispatched[rows] = True
+    return dispatched
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that a dispatch.calcDispatchAll run that fails part way through resumes from its checkpoints
+and gives the same results as an uninterrupted run, serially and with workers
+"""
+
+import tempfile
+
+from synthetic_fleet import generatorDataShort, createDispatch, outputs
+
+
+def failAndResume(gd_short, checkpoint_dir, workers):
+    """ Runs calcDispatchAll until it fails at the fifth week, after the first four are checkpointed, and then resumes it with workers
+    returns : (resumed dispatch object, time periods that the resumed run dispatched)
+    """
+    dp_fail = createDispatch(gd_short, n_periods=8, state_groups={'GA_AL': ['GA', 'AL']}, sensitivities=True, outputs=outputs)
+    calc_dispatch_time_period = dp_fail.calcDispatchTimePeriod
+    def calcDispatchTimePeriod(t):
+        if t == 5:
+            raise RuntimeError('failed at time period 5')
+        calc_dispatch_time_period(t)
+    dp_fail.calcDispatchTimePeriod = calcDispatchTimePeriod
+    try:
+        dp_fail.calcDispatchAll(checkpoint_dir=checkpoint_dir)
+    except RuntimeError:
+        pass
+    dp_resume = createDispatch(gd_short, n_periods=8, state_groups={'GA_AL': ['GA', 'AL']}, sensitivities=True, outputs=outputs)
+    calls = []
+    calc_dispatch_time_period = dp_resume.calcDispatchTimePeriod
+    dp_resume.calcDispatchTimePeriod = lambda t: (calls.append(t), calc_dispatch_time_period(t))
+    dp_resume.calcDispatchAll(checkpoint_dir=checkpoint_dir, workers=workers)
+    return dp_resume, calls
+
+
+def test_resume_equals_uninterrupted_run():
+    gd_short = generatorDataShort()
+    dp = createDispatch(gd_short, n_periods=8, state_groups={'GA_AL': ['GA', 'AL']}, sensitivities=True, outputs=outputs)
+    dp.calcDispatchAll()
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        dp_resume, calls = failAndResume(gd_short, checkpoint_dir, workers=1)
+    assert calls == [5, 6, 7, 8] # the checkpointed weeks are loaded, not dispatched again
+    assert dp_resume.df.equals(dp.df)
+    assert dp_resume.df_state_groups['GA_AL'].equals(dp.df_state_groups['GA_AL'])
+    assert dp_resume.df_sensitivity.equals(dp.df_sensitivity)
+
+
+def test_resume_with_workers_equals_uninterrupted_run():
+    gd_short = generatorDataShort()
+    dp = createDispatch(gd_short, n_periods=8, state_groups={'GA_AL': ['GA', 'AL']}, sensitivities=True, outputs=outputs)
+    dp.calcDispatchAll()
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        dp_resume, calls = failAndResume(gd_short, checkpoint_dir, workers=2)
+    assert dp_resume.df.equals(dp.df)
+    assert dp_resume.df_state_groups['GA_AL'].equals(dp.df_state_groups['GA_AL'])
+    assert dp_resume.df_sensitivity.equals(dp.df_sensitivity)
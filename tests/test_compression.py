@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the compressed Full total interpolation functions of bidStack(compress_tolerance=...) stay within the tolerance of the exact functions,
+for absolute and relative tolerances, and that bs.compression_error reports the realised error
+"""
+
+import numpy
+
+from synthetic_fleet import generatorDataShort
+from simple_dispatch import bidStack
+
+outputs = ['co2_tot', 'gen_cost_tot'] # only the families in the tolerance, because a family without a tolerance keeps all of the shared breakpoints
+
+
+def realisedErrors(bs, bs_exact, demand):
+    """ Returns the largest absolute difference between the compressed and exact Full total functions at demand, for each output family (and subset family) """
+    errors = {}
+    for functions, functions_exact, suffix in [(bs.f_totalFull, bs_exact.f_totalFull, ''), (getattr(bs, 'f_totalFull_subset', {}), getattr(bs_exact, 'f_totalFull_subset', {}), '_subset')]:
+        for f in functions:
+            errors[f + suffix] = numpy.nanmax(numpy.abs(functions[f](demand) - functions_exact[f](demand)))
+    return errors
+
+
+def test_compressed_error_within_absolute_tolerance():
+    gd_short = generatorDataShort()
+    tolerance = {'co2': 2e5, 'gen_cost_tot': 5e3} # [kg] and [$]
+    bs_exact = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5, states_to_subset=['GA'], outputs=outputs)
+    bs = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5, states_to_subset=['GA'], outputs=outputs, compress_tolerance=tolerance)
+    demand = numpy.random.default_rng(0).uniform(0, bs_exact.df.demand.values[-2], 20000)
+    for family, error in realisedErrors(bs, bs_exact, demand).items():
+        limit = tolerance[family.replace('_subset', '')]
+        assert error <= limit * (1 + 1e-9) + 1e-6, family
+        assert bs.compression_error.max_abs_error[family] <= limit * (1 + 1e-9) + 1e-6, family
+        assert error <= bs.compression_error.max_abs_error[family] * (1 + 1e-9) + 1e-6, family # the report covers the realised error
+    assert (bs.compression_error.breakpoints < bs.compression_error.exact_breakpoints).all()
+
+
+def test_compressed_error_within_relative_tolerance():
+    gd_short = generatorDataShort()
+    bs_exact = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5, outputs=outputs)
+    bs = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5, outputs=outputs, compress_tolerance=0.01, compress_relative=True)
+    assert (bs.compression_error.breakpoints < bs.compression_error.exact_breakpoints).all()
+    assert (bs.compression_error.max_rel_error <= 0.01 * (1 + 1e-9)).all()
+    demand = numpy.random.default_rng(1).uniform(0, bs_exact.df.demand.values[-2], 20000)
+    for family, error in realisedErrors(bs, bs_exact, demand).items():
+        scale = numpy.nanmax(numpy.abs(bs_exact.f_totalFull[family].y[:-1]))
+        assert error <= 0.01 * scale * (1 + 1e-9) + 1e-6, family
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that generatorData.calcCounterfactualFuelPrices, which scales the fuel price columns of gd.df by the monthly factors of shiftFuelPrices,
+gives the same fuel prices as shifting the monthly prices and converting them to time periods with weeklyFuelPrices, and returns only the fuel price columns
+"""
+
+import numpy
+import pandas
+import pytest
+
+from synthetic_fleet import simple_dispatch
+
+scenarios = [{}, {'ng': {'C': 4.0, 'S': 6.0, 'other': 7.0}, 'bit': 3.0, 'rfo': 12.0}]
+
+
+def generatorDataPrices(resolution, n=60, year=2017, seed=0):
+    """ Creates a generatorData with random monthly fuel prices (self.orispl_prices), CPI deflators, and the fuel price columns of calcFuelPrices in self.df,
+    including a fuel without EIA923 prices (lignite, filled with commodity prices) and a dummy generator
+    """
+    rng = numpy.random.default_rng(seed)
+    gd = object.__new__(simple_dispatch.generatorData)
+    gd.year, gd.nerc, gd.ba_code, gd.avg_price_fuel_type = year, 'SERC', '', {}
+    gd.calendar = simple_dispatch.periodCalendar(year, resolution)
+    orispl_prices = pandas.DataFrame({'orispl_unit': ['%i_0' % i for i in range(n)], 'orispl': numpy.arange(n), 'fuel': rng.choice(['ng', 'sub', 'bit', 'rfo', 'lig'], n)})
+    for m in range(1, 13):
+        orispl_prices[m] = rng.uniform(1, 10, n)
+    orispl_prices.loc[orispl_prices.fuel == 'lig', list(range(1, 13))] = numpy.nan
+    orispl_prices['quantity'] = 1.0
+    orispl_prices['purchase_type'] = rng.choice(['C', 'S', 'T'], n)
+    gd.orispl_prices = orispl_prices
+    gd.fuel_commodity_prices = pandas.DataFrame({'lig': numpy.linspace(1, 2, 53)})
+    gd.CPI_deflator = pandas.DataFrame([rng.uniform(1.1, 1.3, 12)], index=[year], columns=list(range(1, 13)))
+    fuel_prices = gd.weeklyFuelPrices(orispl_prices)
+    gd.df = pandas.concat([pandas.DataFrame({'orispl_unit': orispl_prices.orispl_unit}).merge(fuel_prices, on='orispl_unit', how='left'),
+                           pandas.DataFrame({'orispl_unit': ['coal_0'], **{c: [0.0] for c in fuel_prices.columns.drop('orispl_unit')}})], ignore_index=True)
+    return gd
+
+
+@pytest.mark.parametrize('resolution', ['week', 'month'])
+def test_scaled_prices_equal_shifted_monthly_prices(resolution):
+    gd = generatorDataPrices(resolution)
+    fuel_price_cols = ['fuel_price' + str(c) for c in gd.calendar.periods]
+    (actual, metrics_actual), (fuel_prices, metrics) = gd.calcCounterfactualFuelPrices(scenarios)
+    assert list(fuel_prices.columns) == ['orispl_unit'] + fuel_price_cols and fuel_prices.index.equals(gd.df.index)
+    assert metrics_actual is None and actual.equals(gd.df[['orispl_unit'] + fuel_price_cols])
+    scale, _ = gd.shiftFuelPrices(gd.orispl_prices, scenarios[1])
+    shifted = gd.orispl_prices.copy()
+    shifted[list(range(1, 13))] = shifted[list(range(1, 13))].values * scale.values
+    expected = gd.weeklyFuelPrices(shifted).set_index('orispl_unit').reindex(gd.df.orispl_unit).fillna(0.0) # the dummy generator keeps its 0 prices
+    assert numpy.allclose(fuel_prices[fuel_price_cols].values, expected[fuel_price_cols].values, rtol=1e-12)
+    assert not numpy.allclose(fuel_prices[fuel_price_cols].values, gd.df[fuel_price_cols].values)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that a dispatch.calcDispatchEnsemble run with no spread in the generator attributes gives quantiles equal to the results of dispatch.calcDispatchAll,
+and that the quantiles are ordered when there is spread
+"""
+
+import numpy
+
+from synthetic_fleet import generatorDataShort, createDispatch
+
+taxes = {'co2_dol_per_kg': 0.02, 'coal_dol_per_mmbtu': 0.3} # bidStack options of the ensemble's base merit order
+
+
+def test_zero_spread_ensemble_equals_dispatch():
+    gd_short = generatorDataShort()
+    dp = createDispatch(gd_short, bid_stack_options=taxes)
+    dp.calcDispatchAll()
+    for demand_data in [gd_short['demand_data'].copy(), gd_short['demand_data'].sample(frac=1, random_state=0)]: # sorted and unsorted datetimes
+        dp_ensemble = createDispatch(gd_short, demand_data, bid_stack_options=taxes)
+        df_ensemble = dp_ensemble.calcDispatchEnsemble(3, seed=1, fuel_price_sd=0, heat_rate_sd=0, emissions_sd=0, vom_sd=0)
+        expected = dp.df.set_index('datetime').loc[df_ensemble.datetime]
+        dispatched = df_ensemble.co2_tot_q50.notna().values # rows of the dispatched weeks, the others are NaN
+        assert ((expected.co2_tot.values != 0) <= dispatched).all()
+        for m in dp_ensemble.ensemble_metrics:
+            for q in ['_q05', '_q50', '_q95']:
+                assert numpy.array_equal(df_ensemble[m+q].values[dispatched], expected[m].values[dispatched], equal_nan=True), m+q
+
+
+def test_ensemble_quantiles_are_ordered():
+    gd_short = generatorDataShort()
+    dp = createDispatch(gd_short, bid_stack_options=taxes)
+    df_ensemble = dp.calcDispatchEnsemble(8, seed=3).dropna()
+    assert len(df_ensemble) > 0
+    assert (df_ensemble.co2_tot_q05 <= df_ensemble.co2_tot_q50).all() and (df_ensemble.co2_tot_q50 <= df_ensemble.co2_tot_q95).all()
+    assert (df_ensemble.co2_tot_q05 < df_ensemble.co2_tot_q95).any()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that dispatch.returnMarginalHours returns the marginal generator of every dispatched hour: the generator of bidStack.returnMarginalGenerator
+of the time period's merit order, overridden in the hours of the coal minimum downtime re-dispatch by the merit order of the last overlapping event
+"""
+
+import numpy
+
+from synthetic_fleet import generatorDataShort, createDispatch, outputs, overlappingEvents
+
+
+def test_marginal_hours_match_marginal_generator():
+    gd_short = generatorDataShort()
+    gd_short['mdt_coal_events'] = overlappingEvents(gd_short)
+    dp = createDispatch(gd_short, n_periods=1, outputs=outputs)
+    dp.calcDispatchAll()
+    df_hours = dp.returnMarginalHours(list(dp.bs.df.orispl_unit))
+    #expected marginal generator of each dispatched hour: the time period's merit order, then the minimum downtime bidStack of the last event that covers the hour
+    demand = dp.df.demand.values
+    expected = numpy.full(len(dp.df), None, dtype=object)
+    period = numpy.arange(len(dp.df))[dp.period_rows[1]]
+    expected[period] = dp.bs.returnMarginalGenerator(demand[period], 'orispl_unit')
+    coal_merit_order = dp.bs.df[dp.bs.df.fuel_type == 'coal'][['orispl_unit', 'demand']]
+    mdt_rows = dp.mdtThresholdRows(dp.calcMdtCoalEventsT(*dp.period_dates[1], coal_merit_order))
+    assert len(mdt_rows) > 1
+    for dt, rows in mdt_rows.items():
+        expected[rows] = dp.mdt_bidstacks[1][dt].returnMarginalGenerator(demand[rows], 'orispl_unit')
+    overridden = numpy.flatnonzero(expected[period] != dp.bs.returnMarginalGenerator(demand[period], 'orispl_unit'))
+    assert len(overridden) > 0 # the re-dispatch changes the marginal generator of some hours
+    #one row per dispatched hour, holding its marginal generator
+    dispatched = numpy.flatnonzero(expected != None)
+    assert df_hours.index.is_unique and set(df_hours.index) == set(dp.df.index[dispatched])
+    df_hours = df_hours.loc[dp.df.index[dispatched]]
+    assert (df_hours.orispl_unit.values == expected[dispatched]).all()
+    assert numpy.array_equal(df_hours.demand.values, demand[dispatched])
+    assert ((df_hours.s <= df_hours.demand) & (df_hours.demand < df_hours.f)).all()
+    #and its fuel type is the dispatched marg_gen_fuel_type
+    fuel_type = dict(zip(dp.bs.df.orispl_unit, dp.bs.df.fuel_type))
+    assert (df_hours.orispl_unit.map(fuel_type).values == dp.df.marg_gen_fuel_type.values[dispatched]).all()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the coal minimum downtime re-dispatch, which gathers the hours of each demand_threshold and dispatches them with one call,
+gives the same results as re-dispatching the events one at a time in order, when overlapping events with different thresholds override each other
+"""
+
+from synthetic_fleet import generatorDataShort, createDispatch, outputs, overlappingEvents
+
+
+def oneEventAtATime(dp, reverse=False):
+    """ Replaces the grouping of dp by re-dispatching each event of the time period in order (or in reverse order), so that later events override earlier ones """
+    def mdtThresholdRows(events_mdt_coal_t):
+        for i, e in (events_mdt_coal_t[::-1] if reverse else events_mdt_coal_t).iterrows():
+            dp.calcDispatchSlice(dp.mdt_bidstacks[1][e.demand_threshold], rows=dp.sliceRows(e.start, e.end))
+        return {}
+    dp.mdtThresholdRows = mdtThresholdRows
+
+
+def test_grouped_thresholds_keep_override_order():
+    gd_short = generatorDataShort()
+    gd_short['mdt_coal_events'] = overlappingEvents(gd_short)
+    dp = createDispatch(gd_short, n_periods=2, states_to_subset=['GA'], outputs=outputs)
+    dp.calcDispatchAll()
+    dp_events = createDispatch(gd_short, n_periods=2, states_to_subset=['GA'], outputs=outputs)
+    oneEventAtATime(dp_events)
+    dp_events.calcDispatchAll()
+    dp_no_events = createDispatch(dict(gd_short, mdt_coal_events=gd_short['mdt_coal_events'].iloc[:0]), n_periods=2, states_to_subset=['GA'], outputs=outputs)
+    dp_no_events.calcDispatchAll()
+    dp_reverse = createDispatch(gd_short, n_periods=2, states_to_subset=['GA'], outputs=outputs)
+    oneEventAtATime(dp_reverse, reverse=True)
+    dp_reverse.calcDispatchAll()
+    assert not dp.df.equals(dp_no_events.df) # the events change the results
+    assert not dp.df.equals(dp_reverse.df) # and the overlapping events override each other
+    assert dp.df.equals(dp_events.df)
+    assert dp.df_subset.equals(dp_events.df_subset)
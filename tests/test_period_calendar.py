@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the daily and monthly calendars of periodCalendar cover each day of the year exactly once, in common and leap years, 
+and that dispatch assigns each row of a year of demand data to exactly one of their time periods
+"""
+
+import datetime
+import numpy
+import pandas
+
+from synthetic_fleet import generatorDataShort
+from simple_dispatch import periodCalendar, bidStack, dispatch
+
+
+def test_calendars_cover_each_day_once():
+    for year in [2017, 2020]:
+        days = pandas.date_range('%i-01-01' % year, '%i-12-31' % year, freq='D')
+        for resolution, n_periods in [('day', len(days)), ('month', 12)]:
+            calendar = periodCalendar(year, resolution)
+            assert calendar.n_periods == n_periods
+            counts = numpy.zeros(len(days), dtype=int)
+            for t in calendar.periods:
+                start, end = calendar.periodDates(t)
+                counts += (days >= start) & (days < end)
+            assert (counts == 1).all(), (year, resolution)
+            #periodOf agrees with periodDates
+            periods = calendar.periodOf([float(d.strftime('%Y%m%d')) for d in days])
+            assert all(calendar.periodDates(t)[0] <= d.strftime('%Y-%m-%d') < calendar.periodDates(t)[1] for t, d in zip(periods, days)), (year, resolution)
+            if resolution == 'day':
+                assert numpy.array_equal(periods, calendar.periods)
+            else:
+                assert numpy.array_equal(periods, [d.month for d in days])
+    assert periodCalendar.inferResolution(['mw%i' % t for t in range(1, 13)]) == 'month'
+    assert periodCalendar.inferResolution(['mw%i' % t for t in range(1, 367)]) == 'day'
+
+
+def test_dispatch_rows_in_one_time_period():
+    for resolution in ['day', 'month']:
+        gd_short = generatorDataShort(n=20, resolution=resolution)
+        bs = bidStack(gd_short, time=1, dropNucHydroGeo=True)
+        assert bs.calendar.resolution == resolution
+        dp = dispatch(bs, gd_short['demand_data'].copy(), time_array=bs.calendar.periods)
+        counts = numpy.zeros(len(dp.df_input), dtype=int)
+        for rows in dp.period_rows.values():
+            counts[rows] += 1
+        assert (counts == 1).all(), resolution
+        assert dp.df_input.datetime.iloc[dp.period_rows[bs.calendar.periods[-1]]].max() == datetime.datetime(2017, 12, 31, 23)
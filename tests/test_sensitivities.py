@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Checks the fuel price derivatives of bidStack.returnSensitivities against finite differences: a bidStack rebuilt with the gas prices scaled by 1+eps
+"""
+
+import numpy
+
+from synthetic_fleet import generatorDataShort
+from simple_dispatch import bidStack
+
+eps = 1e-6
+
+
+def test_gas_price_derivatives_equal_finite_differences():
+    gd_short = generatorDataShort()
+    bs = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5)
+    df = gd_short['df'].copy()
+    df.loc[df.fuel_type == 'gas', 'fuel_price1'] = df.loc[df.fuel_type == 'gas', 'fuel_price1'] * (1 + eps)
+    bs_eps = bidStack(dict(gd_short, df=df), time=1, dropNucHydroGeo=True, mdt_weight=0.5)
+    demand = numpy.linspace(gd_short['demand_data'].demand.min(), gd_short['demand_data'].demand.max(), 500)
+    sensitivities = bs.returnSensitivities(demand, ['gen_cost_tot'])
+    assert (sensitivities['gas_price_reorder_margin'] > eps).all() # the merit order keeps its order
+    assert list(bs_eps.df.orispl_unit) == list(bs.df.orispl_unit)
+    d_gen_cost_tot = (bs_eps.returnTotalCost(demand) - bs.returnTotalCost(demand)) / eps
+    d_gen_cost_marg = (bs_eps.returnMarginalGenerator(demand, 'gen_cost') - bs.returnMarginalGenerator(demand, 'gen_cost')) / eps
+    assert (sensitivities['d_gen_cost_tot_d_gas_price'] > 0).any() and (sensitivities['d_gen_cost_marg_d_gas_price'] > 0).any()
+    assert numpy.allclose(d_gen_cost_tot, sensitivities['d_gen_cost_tot_d_gas_price'], rtol=1e-6)
+    assert numpy.allclose(d_gen_cost_marg, sensitivities['d_gen_cost_marg_d_gas_price'], rtol=1e-6, atol=1e-6)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Checks the total emissions of bidStack states_to_subset: the step construction of bs.df_subset (the default) also works when subset generators are among
+the first rows of the merit order, subset_state_totals=True gives the sum of the per-state curves of bs.state_totals, and the two constructions differ
+"""
+
+import numpy
+
+from synthetic_fleet import generatorDataShort, createDispatch
+from simple_dispatch import bidStack
+
+emissions = ['co2', 'so2', 'nox']
+smallest_difference = {'co2': 0.02, 'so2': 0.25, 'nox': 0.02} # smallest difference between the two GA subset constructions over the demand range, as a fraction of the step construction
+
+
+def demandRange(gd_short, n=2000):
+    """ Returns n demand values over the range of the demand data [MW] """
+    return numpy.linspace(gd_short['demand_data'].demand.min(), gd_short['demand_data'].demand.max(), n)
+
+
+def test_step_subset_with_subset_units_at_start():
+    gd_short = generatorDataShort()
+    #the coal_0 and ngcc_0 dummy generators of the synthetic fleet are in TN, so TN units are the first rows of the merit order
+    dp = createDispatch(gd_short, n_periods=2, states_to_subset=['AL', 'TN'])
+    assert dp.bs.df.state.values[1] == 'TN'
+    assert dp.bs.df_subset.index.is_unique
+    dp.calcDispatchAll()
+    df_sweep = dp.calcDispatchSweep(co2_dol_per_kg=numpy.array([0.0])) # the batched step construction
+    for e in emissions:
+        assert (dp.df_subset[e + '_tot'] > 0).any(), e
+        assert numpy.allclose(dp.df_subset_sweep[e + '_tot'].values, dp.df_subset[e + '_tot'].values, rtol=1e-9, atol=1e-6), e
+
+
+def test_state_totals_subset_equals_state_totals():
+    gd_short = generatorDataShort()
+    demand = demandRange(gd_short)
+    for states in [['GA'], ['GA', 'AL'], ['AL', 'TN']]:
+        bs = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5, states_to_subset=states, subset_state_totals=True)
+        groups = bs.returnFullTotalValueStates(demand, emissions, {'subset': states, 'others': [s for s in bs.state_totals_index if s not in states]})
+        for e in emissions:
+            subset = bs.returnFullTotalValueSubset(demand, e)
+            assert numpy.array_equal(subset, groups['subset'][e]), e
+            assert numpy.allclose(subset + groups['others'][e], bs.returnFullTotalValue(demand, e)), e # the states (and the '' of the dummy rows) add up to the whole region
+
+
+def test_state_totals_subset_differs_from_step_subset():
+    gd_short = generatorDataShort()
+    demand = demandRange(gd_short)
+    bs = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5, states_to_subset=['GA'])
+    bs_states = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5, states_to_subset=['GA'], subset_state_totals=True)
+    for e in emissions:
+        step, states, region = bs.returnFullTotalValueSubset(demand, e), bs_states.returnFullTotalValueSubset(demand, e), bs.returnFullTotalValue(demand, e)
+        assert (step > 0).all() and (step <= region).all() and (states > 0).all() and (states <= region).all(), e
+        #the step construction gives each increase of the base emissions to the generator before it, so the totals differ by a share of the subset's emissions
+        assert (numpy.abs(states - step) / step).min() > smallest_difference[e], e
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that a streaming dispatch.calcDispatchAll run writes the same results as an uninterrupted run that keeps them in memory,
+and that it only holds the rows of the time periods that are not final yet
+"""
+
+import os
+import tempfile
+import numpy
+import pandas
+
+from synthetic_fleet import generatorDataShort, createDispatch, dispatchedRows, outputs
+
+
+def test_stream_equals_uninterrupted_run():
+    gd_short = generatorDataShort()
+    dp = createDispatch(gd_short, n_periods=12, states_to_subset=['GA'], outputs=outputs)
+    dp.calcDispatchAll()
+    expected = dp.df[dispatchedRows(dp)].reset_index(drop=True)
+    for demand_data in [gd_short['demand_data'].copy(), gd_short['demand_data'].sample(frac=1, random_state=0)]: # sorted and unsorted datetimes
+        with tempfile.TemporaryDirectory() as stream_dir:
+            dp_stream = createDispatch(gd_short, demand_data, n_periods=12, states_to_subset=['GA'], outputs=outputs)
+            dp_stream.calcDispatchAll(stream_dir=stream_dir, stream_csv={'dispatch': os.path.join(stream_dir, 'dispatch.csv')})
+            streamed = pandas.read_parquet(os.path.join(stream_dir, 'dispatch')).sort_values('datetime').reset_index(drop=True)
+            streamed_subset = pandas.read_parquet(os.path.join(stream_dir, 'subset')).sort_values('datetime').reset_index(drop=True)
+            streamed_csv = pandas.read_csv(os.path.join(stream_dir, 'dispatch.csv'))
+        for c in outputs:
+            assert (streamed[c].astype(str).values == expected[c].astype(str).values).all(), c
+        assert numpy.array_equal(streamed_subset.co2_tot.values, dp.df_subset[dispatchedRows(dp)].co2_tot.values)
+        assert len(streamed_csv) == len(expected)
+
+
+def test_stream_holds_open_time_periods():
+    gd_short = generatorDataShort()
+    with tempfile.TemporaryDirectory() as stream_dir:
+        dp = createDispatch(gd_short, n_periods=12, outputs=outputs)
+        window = []
+        write_stream = dp.writeStream
+        def writeStream(t, rows): # records the rows held in memory when each time period is written
+            window.append(dp.window[1] - dp.window[0])
+            write_stream(t, rows)
+        dp.writeStream = writeStream
+        dp.calcDispatchAll(stream_dir=stream_dir)
+    assert len(window) == 12
+    assert max(window) < len(gd_short['demand_data']) / 6 # about two of the twelve weeks at a time
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that a 5-minute demand trace, holding each hour's demand for 12 time steps, aggregates back to the results of the hourly trace:
+the total result columns are per time step, so their weekly sums match the hourly run. The minimum downtime events of the 5-minute trace
+can start and end within the hour, so the match is close rather than exact
+"""
+
+import numpy
+
+from synthetic_fleet import generatorDataShort, createDispatch, dispatchedRows
+
+
+def calcDispatch(gd_short):
+    dp = createDispatch(gd_short, n_periods=4, sensitivities=True)
+    dp.calcDispatchAll()
+    return dp
+
+
+def weeklyTotals(dp, col):
+    df = dp.df[dispatchedRows(dp)]
+    return df.groupby(df.datetime.dt.isocalendar().week)[col].sum()
+
+
+def test_five_minute_trace_aggregates_to_hourly():
+    dp_hourly = calcDispatch(generatorDataShort())
+    dp_5min = calcDispatch(generatorDataShort(freq='5min'))
+    assert dp_hourly.time_step == 1.0 and abs(dp_5min.time_step - 5/60.) < 1e-12
+    assert len(dp_5min.df) == 12 * len(dp_hourly.df)
+    for col in ['co2_tot', 'gen_cost_tot', 'coal_mix']:
+        hourly, five_minute = weeklyTotals(dp_hourly, col), weeklyTotals(dp_5min, col)
+        assert len(hourly) >= 4 and (hourly != 0).all(), col
+        assert ((five_minute - hourly).abs() / hourly.abs()).max() < 0.01, col
+    assert numpy.array_equal(dp_5min.df_sensitivity.hours.values, dp_hourly.df_sensitivity.hours.values)
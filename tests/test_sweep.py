@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that dispatch.calcDispatchSweep, which dispatches the batched merit orders of all of its scenarios together, gives each scenario
+the same results as a separate bidStack and dispatch.calcDispatchAll run, including the states_to_subset and state_groups results
+"""
+
+import numpy
+
+from synthetic_fleet import generatorDataShort, createDispatch, outputs
+
+state_groups = {'GA': ['GA'], 'TN_FL': ['TN', 'FL']}
+
+
+def assertSameResults(got, expected):
+    """ Compares the rows of a scenario of a sweep table with the results of its separate run """
+    assert len(got) == len(expected)
+    for c in expected.columns.drop('datetime'):
+        if expected[c].dtype == object:
+            assert (got[c].astype(str).values == expected[c].astype(str).values).all(), c
+        else:
+            assert numpy.allclose(got[c].values.astype(float), expected[c].values.astype(float), rtol=1e-9, atol=1e-6, equal_nan=True), c
+
+
+def assertSweepEqualsSeparateRuns(gd_short, **sweep):
+    dp = createDispatch(gd_short, n_periods=2, states_to_subset=['GA', 'AL'], state_groups=state_groups, outputs=outputs + ['so2_tot'])
+    df_sweep = dp.calcDispatchSweep(**sweep)
+    assert len(dp.sweep_scenarios) == df_sweep.scenario.nunique()
+    for scenario, parameters in dp.sweep_scenarios.iterrows():
+        dp_run = createDispatch(gd_short, n_periods=2, bid_stack_options=parameters.to_dict(), states_to_subset=['GA', 'AL'], state_groups=state_groups, outputs=outputs + ['so2_tot'])
+        dp_run.calcDispatchAll()
+        assertSameResults(df_sweep[df_sweep.scenario == scenario], dp_run.df)
+        assertSameResults(dp.df_subset_sweep[dp.df_subset_sweep.scenario == scenario], dp_run.df_subset)
+        for name in state_groups:
+            df_group = dp.df_state_groups_sweep[name]
+            assertSameResults(df_group[df_group.scenario == scenario], dp_run.df_state_groups[name])
+
+
+def test_co2_sweep_equals_separate_runs():
+    assertSweepEqualsSeparateRuns(generatorDataShort(), co2_dol_per_kg=numpy.array([0.0, 0.01, 0.05]))
+
+
+def test_tax_derate_co2_grid_equals_separate_runs():
+    assertSweepEqualsSeparateRuns(generatorDataShort(), co2_dol_per_kg=numpy.array([0.0, 0.03])[:, None, None], 
+                                  coal_dol_per_mmbtu=numpy.array([0.0, 0.5])[None, :, None], coal_capacity_derate=numpy.array([0.0, 0.2])[None, None, :])
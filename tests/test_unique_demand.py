@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that dispatch(unique_demand=True) gives the same results as evaluating every hour, and that the total result columns of dispatch(demand_resolution=...)
+stay within the error bounds that it reports in dp.quantization_error
+"""
+
+import numpy
+
+from synthetic_fleet import generatorDataShort, createDispatch, outputs
+
+totals = ['co2_tot', 'gen_cost_tot', 'coal_mix']
+
+
+def test_unique_demand_equals_every_hour():
+    gd_short = generatorDataShort()
+    dp = createDispatch(gd_short, states_to_subset=['GA'], outputs=outputs)
+    dp.calcDispatchAll()
+    dp_unique = createDispatch(gd_short, states_to_subset=['GA'], outputs=outputs, unique_demand=True)
+    dp_unique.calcDispatchAll()
+    assert dp_unique.df.equals(dp.df)
+    assert dp_unique.df_subset.equals(dp.df_subset)
+    assert dp_unique.quantization_error == {}
+
+
+def test_demand_resolution_within_bound():
+    gd_short = generatorDataShort()
+    dp = createDispatch(gd_short, outputs=outputs + ['gen_cost_tot'])
+    dp.calcDispatchAll()
+    dp_rounded = createDispatch(gd_short, outputs=outputs + ['gen_cost_tot'], demand_resolution=50.0)
+    dp_rounded.calcDispatchAll()
+    assert 0 < dp_rounded.quantization_error['demand'] <= 25.0
+    for c in totals:
+        error = numpy.abs(dp_rounded.df[c].values - dp.df[c].values).max()
+        assert 0 < error <= dp_rounded.quantization_error[c] * (1 + 1e-9) + 1e-6, c
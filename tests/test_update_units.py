@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that bidStack.updateUnits gives the same merit order and Full totals as a bidStack built from scratch with the updated generator data,
+both when it splices the changes into the merit order and when a tie in gen_cost makes it sort the whole fleet again
+"""
+
+import numpy
+
+from synthetic_fleet import generatorDataShort
+from simple_dispatch import bidStack
+
+metrics = ['gen_cost_marg', 'gen_cost_tot', 'co2_tot', 'co2_marg', 'coal_mix_marg']
+
+
+def assertSameMeritOrder(bs, gd_short):
+    """ Compares bs with a bidStack built from scratch with its updated generator data (bs.df_0) """
+    fresh = bidStack(dict(gd_short, df=bs.df_0), time=1, dropNucHydroGeo=True, mdt_weight=0.5)
+    assert list(bs.df.orispl_unit) == list(fresh.df.orispl_unit)
+    for c in ['gen_cost', 'demand', 's', 'a', 'full_co2_base', 'full_co2_marg', 'full_gen_cost_tot_base']:
+        assert numpy.allclose(bs.df[c].values, fresh.df[c].values, rtol=1e-12, atol=1e-9, equal_nan=True), c
+    demand = numpy.linspace(0, fresh.df.demand.values[-2], 500)
+    expected = fresh.returnDispatchMetrics(demand, metrics)
+    for m, values in bs.returnDispatchMetrics(demand, metrics).items():
+        assert numpy.allclose(values, expected[m], rtol=1e-12, atol=1e-6, equal_nan=True), m
+
+
+def test_spliced_units_equal_fresh_bidstack():
+    gd_short = generatorDataShort()
+    bs = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5)
+    units = list(bs.df.orispl_unit.iloc[10:30:5]) # a few units in the middle of the merit order
+    changed = bs.df_0.loc[bs.df_0.orispl_unit.isin(units[:2]), ['orispl_unit', 'fuel_price1']].copy()
+    changed['fuel_price1'] = changed.fuel_price1 * 1.37
+    added = bs.df_0[bs.df_0.orispl_unit == units[2]].copy()
+    added['orispl_unit'] = 'new_0'
+    added['fuel_price1'] = added.fuel_price1 * 0.71
+    assert bs.updateUnits(changed=changed, added=added, removed=[units[3]])
+    assertSameMeritOrder(bs, gd_short)
+
+
+def test_tie_falls_back_to_fresh_sort():
+    gd_short = generatorDataShort()
+    bs = bidStack(gd_short, time=1, dropNucHydroGeo=True, mdt_weight=0.5)
+    unit, twin = bs.df.orispl_unit.iloc[12], bs.df.orispl_unit.iloc[20]
+    #give unit the cost attributes of twin, so that their gen_costs tie
+    cols = ['fuel_price1', 'heat_rate1', 'co21', 'so21', 'nox1', 'vom']
+    changed = bs.df_0.loc[bs.df_0.orispl_unit == twin, cols].copy()
+    changed['orispl_unit'] = unit
+    assert not bs.updateUnits(changed=changed)
+    gen_cost = bs.df.set_index('orispl_unit').gen_cost
+    assert gen_cost[unit] == gen_cost[twin]
+    assertSameMeritOrder(bs, gd_short)
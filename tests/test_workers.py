@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that dispatch.calcDispatchAll(workers=2), which calculates the time periods in a process pool, gives the same results as the serial run
+"""
+
+from synthetic_fleet import generatorDataShort, createDispatch, outputs
+
+
+def test_workers_equal_serial_run():
+    gd_short = generatorDataShort()
+    dp = createDispatch(gd_short, n_periods=4, states_to_subset=['GA'], state_groups={'TN_FL': ['TN', 'FL']}, outputs=outputs)
+    dp.calcDispatchAll()
+    dp_workers = createDispatch(gd_short, n_periods=4, states_to_subset=['GA'], state_groups={'TN_FL': ['TN', 'FL']}, outputs=outputs)
+    dp_workers.calcDispatchAll(workers=2)
+    assert dp_workers.df.equals(dp.df)
+    assert dp_workers.df_subset.equals(dp.df_subset)
+    assert dp_workers.df_state_groups['TN_FL'].equals(dp.df_state_groups['TN_FL'])